@@ -1,18 +1,33 @@
 import os
+import sys
+import time
 import streamlit as st
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-google_api_key = os.getenv("GOOGLE_API_KEY")
-
-# Configure API key
-genai.configure(api_key=google_api_key)
-
-# Initialize the LLM (using the free version - "gemini-1.5-flash")
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+# Make the shared studyplanner package importable when run with `streamlit run`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from studyplanner.streaming import iter_text
+from studyplanner.history_view import HistoryView
+from studyplanner.cache import ResponseCache
+from studyplanner.prompts import STUDY_ASSISTANT_INSTRUCTIONS, build_assistant_prompt
+from studyplanner import core
+from studyplanner.sessions import get_conversation_id, submitted_text
+from studyplanner.instrumentation import get_metrics
+from studyplanner.debug_panel import render_debug_panel
+
+# Start of this rerun, for the debug panel's rerun timing
+RUN_STARTED = time.perf_counter()
+
+# Initialize the LLM, shared by all sessions, built once per process (.env loaded,
+# key configured) and routed through the rate-limited, retrying gateway. The
+# cascade answers quick questions with "gemini-1.5-flash" and sends study plans
+# and schedules to a stronger model, failing over if one of them is struggling
+MODEL_NAME = core.CASCADE
+llm = core.get_llm(MODEL_NAME)
+
+# Answers to repeated questions are served from disk without an API call
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
 
 # Streamlit UI Layout
 st.title("Agentic Study Plan Chatbot (Powered by Google GenAI)")
@@ -29,49 +44,77 @@ Simply tell me about your study goals, subjects, or any other preferences, and I
 Let's get started by asking your study-related questions or describing your needs!
 """)
 
+# Stream the reply as it is generated instead of waiting for the whole answer
+stream_responses = st.sidebar.checkbox("Stream responses", value=True)
+
 # Create two columns: one for chat history and one for user input
 col1, col2 = st.columns([1, 3])  # Adjusting column width (1:3 ratio)
 
-# Initialize chat history as an empty list
-if 'history' not in st.session_state:
-    st.session_state['history'] = []
+# Chat history lives in the shared conversation store (durable, and visible to
+# every worker process), keyed by this browser's conversation id
+store = core.get_store()
+conversation_id = get_conversation_id()
 
 # Define instructions for the model to follow
 def generate_instructions():
-    return """
-    You are an educational assistant. You can act as a teacher, study planner, or student counselor.
-    Assume the user is a middle schooler unless the user provides other context related to their education or study plan.
-    Always be patient, clear, and supportive in your responses. 
-    When offering study plans or suggestions, keep in mind that the user might not be familiar with advanced terminology.
-    """
-
-# Display chat history in the left column
+    return STUDY_ASSISTANT_INSTRUCTIONS
+
+# Format one history entry (each message is formatted once and cached by the view)
+def format_message(turn):
+    if turn.role == 'user':
+        return f"**You**: {turn.content}"
+    return f"**Bot**: {turn.content}"
+
+# Chat history in the left column, filled after this turn is processed
 with col1:
     st.header("Chat History")
-    for message in st.session_state['history']:
-        if message['role'] == 'user':
-            st.markdown(f"**You**: {message['content']}")
-        else:
-            st.markdown(f"**Bot**: {message['content']}")
+    history_pane = st.container()
 
 # Get user input in the right column
 with col2:
-    user_input = st.text_input("Ask your question or describe your study needs:")
+    user_input = submitted_text("Ask your question or describe your study needs:")
     if user_input:
         # Add instruction context at the beginning of the conversation
         instructions = generate_instructions()
         
-        # Append user message to chat history
-        st.session_state['history'].append({'role': 'user', 'content': user_input})
+        # The instructions are the same on every turn, so they are registered
+        # once as a cached prefix; when Gemini holds them only the message is sent
+        prefix = core.get_prefix_cache().register("assistant-instructions", MODEL_NAME, instructions)
 
         # Combine instructions with user input for context
-        full_message = f"{instructions}\nUser: {user_input}"
-
-        # Send message to the model and get response
-        response = llm.invoke(full_message)
-
-        # Append bot response to chat history
-        st.session_state['history'].append({'role': 'bot', 'content': response.content})
-
-        # Display the model's response
-        st.text(response.content)
+        full_message = build_assistant_prompt(user_input, instructions, prefix)
+
+        # Reuse the answer to an identical or near-identical earlier question
+        cache = get_response_cache()
+        with get_metrics().span("response_cache", "cache") as span:
+            reply = cache.get(MODEL_NAME, instructions, user_input)
+            span.cache_hit = reply is not None
+        if reply is not None:
+            st.text(reply)
+        elif core.service_url():
+            # The planner service runs (and caches) the same prompt flow for every app instance
+            reply = st.write_stream(core.get_planner_client().ask(user_input))
+            cache.set(MODEL_NAME, instructions, user_input, reply)
+        else:
+            # Send message to the model and display the response
+            if stream_responses:
+                # Route on the student's question, not on the long instructions
+                reply = st.write_stream(iter_text(llm.stream(full_message, query=user_input, **prefix.kwargs())))
+            else:
+                reply = llm.invoke(full_message, query=user_input, **prefix.kwargs()).content
+                st.text(reply)
+            cache.set(MODEL_NAME, instructions, user_input, reply)
+
+        # Record the exchange in the conversation store (one batched write)
+        store.extend(conversation_id, [('user', user_input), ('bot', reply)])
+
+# Show the newest messages, including this turn's exchange
+with history_pane:
+    HistoryView("history_view", format_message).render_conversation(store, conversation_id)
+
+# Response cache counters
+stats = get_response_cache().stats()
+st.sidebar.caption(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+# Rerun timing and the optional debug panel
+render_debug_panel(RUN_STARTED)
@@ -1,18 +1,24 @@
 import os
+import sys
+import time
 import streamlit as st
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-google_api_key = os.getenv("GOOGLE_API_KEY")
+# Make the shared studyplanner package importable when run with `streamlit run`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from studyplanner.streaming import iter_text
+from studyplanner.history_view import HistoryView
+from studyplanner import core
+from studyplanner.sessions import get_conversation_id, submitted_text
+from studyplanner.debug_panel import render_debug_panel
 
-# Configure API key
-genai.configure(api_key=google_api_key)
+# Start of this rerun, for the debug panel's rerun timing
+RUN_STARTED = time.perf_counter()
 
-# Initialize the LLM (using the free version - "gemini-1.5-flash")
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+# Initialize the LLM, shared by all sessions, built once per process (.env loaded,
+# key configured) and routed through the rate-limited, retrying gateway. The
+# cascade answers quick questions with "gemini-1.5-flash" and sends study plans
+# and schedules to a stronger model, failing over if one of them is struggling
+llm = core.get_llm(core.CASCADE)
 
 # Streamlit UI Layout
 st.title("Agentic Study Plan Chatbot (Powered by Google GenAI)")
@@ -29,34 +35,47 @@ Simply tell me about your study goals, subjects, or any other preferences, and I
 Let's get started by asking your study-related questions or describing your needs!
 """)
 
+# Stream the reply as it is generated instead of waiting for the whole answer
+stream_responses = st.sidebar.checkbox("Stream responses", value=True)
+
 # Create two columns: one for chat history and one for user input
 col1, col2 = st.columns([1, 3])  # Adjusting column width (1:3 ratio)
 
-# Initialize chat history as an empty list
-if 'history' not in st.session_state:
-    st.session_state['history'] = [{'role': 'user', 'content':'Act as a teacher or a study planner or a student counselor. Assume the user is a middle schooler if the user does not provide any context when asking questions related to education or study plan.'}]
+# Chat history lives in the shared conversation store (durable, and visible to
+# every worker process), keyed by this browser's conversation id
+store = core.get_store()
+conversation_id = get_conversation_id()
+if store.count(conversation_id) == 0:
+    store.append(conversation_id, 'user', 'Act as a teacher or a study planner or a student counselor. Assume the user is a middle schooler if the user does not provide any context when asking questions related to education or study plan.')
+
+# Format one history entry (each message is formatted once and cached by the view)
+def format_message(turn):
+    if turn.role == 'user':
+        return f"**You**: {turn.content}"
+    return f"**Bot**: {turn.content}"
 
-# Display chat history in the left column
+# Chat history in the left column, filled after this turn is processed
 with col1:
     st.header("Chat History")
-    for message in st.session_state['history']:
-        if message['role'] == 'user':
-            st.markdown(f"**You**: {message['content']}")
-        else:
-            st.markdown(f"**Bot**: {message['content']}")
+    history_pane = st.container()
 
 # Get user input in the right column
 with col2:
-    user_input = st.text_input("Ask your question or describe your study needs:")
+    user_input = submitted_text("Ask your question or describe your study needs:")
     if user_input:
-        # Append user message to chat history
-        st.session_state['history'].append({'role': 'user', 'content': user_input})
+        # Send message to the model and display the response
+        if stream_responses:
+            reply = st.write_stream(iter_text(llm.stream(user_input)))
+        else:
+            reply = llm.invoke(user_input).content
+            st.text(reply)
 
-        # Send message to the model and get response
-        response = llm.invoke(user_input)
+        # Record the exchange in the conversation store (one batched write)
+        store.extend(conversation_id, [('user', user_input), ('bot', reply)])
 
-        # Append bot response to chat history
-        st.session_state['history'].append({'role': 'bot', 'content': response.content})
+# Show the newest messages, including this turn's exchange
+with history_pane:
+    HistoryView("history_view", format_message).render_conversation(store, conversation_id)
 
-        # Display the model's response
-        st.text(response.content)
+# Rerun timing and the optional debug panel
+render_debug_panel(RUN_STARTED)
@@ -1,29 +1,41 @@
 import os
+import sys
+import time
+import datetime
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-google_api_key = os.getenv("GOOGLE_API_KEY")
+# Make the shared studyplanner package importable when run with `streamlit run`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from studyplanner.sessions import ChatSessionManager, get_session_id, submitted_text
+from studyplanner.streaming import iter_text
+from studyplanner.schedule import plan_study_schedule
+from studyplanner import core
+from studyplanner.debug_panel import render_debug_panel
 
-# Authenticate with Google Generative AI
-genai.configure(api_key=google_api_key)
+# Start of this rerun, for the debug panel's rerun timing
+RUN_STARTED = time.perf_counter()
+
+# Keep one model client per process and one chat session per browser session
+@st.cache_resource
+def get_session_manager():
+    return ChatSessionManager(
+        "gemini-1.5-flash",  # using the latest "gemini-1.5-flash"
+        history=[
+            {"role": "user", "parts": "Hello!"},
+            {"role": "model", "parts": "Hi there! How can I assist you today?"}
+        ],
+        # Calls go through the shared gateway (rate limit, retries on 429/5xx)
+        model_factory=core.get_generative_model,
+        # Long chats are trimmed to the model's window before each turn
+        packer=core.get_packer("gemini-1.5-flash")
+    )
 
 # Function to handle chat with GenAI
 def chat_with_genai(user_input):
     """Interact with Google Generative AI for a conversation."""
     try:
-        # Initialize the model (using the latest "gemini-1.5-flash")
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        # Start a chat session (using a basic history)
-        chat = model.start_chat(
-            history=[
-                {"role": "user", "parts": "Hello!"},
-                {"role": "model", "parts": "Hi there! How can I assist you today?"}
-            ]
-        )
+        # Reuse this user's chat session instead of starting a new one every turn
+        chat = get_session_manager().get_chat(get_session_id())
         
         # Send the user's message and get the response
         response = chat.send_message(user_input)
@@ -32,32 +44,87 @@ def chat_with_genai(user_input):
     except Exception as e:
         return f"Error communicating with Google GenAI: {str(e)}"
 
-# Function to generate a study plan
-def generate_study_plan(subjects, hours_per_day, exam_dates):
+# Streaming variant of chat_with_genai: yields the reply piece by piece
+def stream_chat_with_genai(user_input):
+    """Stream the reply from Google Generative AI as it is generated."""
+    try:
+        chat = get_session_manager().get_chat(get_session_id())
+
+        # The chat session records the turn once the stream is fully consumed
+        yield from iter_text(chat.send_message(user_input, stream=True))
+
+    except Exception as e:
+        yield f"Error communicating with Google GenAI: {str(e)}"
+
+# Function to generate a study plan locally (no LLM call needed for the timetable)
+def generate_study_plan(subjects, hours_per_day, exam_dates, weights=None):
+    schedule = plan_study_schedule(subjects, exam_dates, hours_per_day, weights=weights)
     plan = "Study Plan:\n"
     plan += f"Subjects: {', '.join(subjects)}\n"
     plan += f"Hours per day: {hours_per_day}\n"
-    plan += f"Exam in: {exam_dates}\n\n"
-    for day in range(1, len(subjects) + 1):
-        plan += f"Day {day}: Focus on {subjects[day - 1]} for {hours_per_day // len(subjects)} hours.\n"
+    plan += f"Exams: {', '.join(f'{name} on {date}' for name, date in zip(subjects, exam_dates))}\n\n"
+    plan += schedule.to_text() + "\n\n"
+    plan += "Total hours: " + ", ".join(f"{name} {hours:g}h" for name, hours in schedule.totals().items()) + "\n"
     return plan
 
 # Streamlit UI
 st.title("Agentic Study Plan Chatbot (Powered by Google GenAI)")
 st.sidebar.header("Chatbot Options")
+# Stream the reply as it is generated instead of waiting for the whole answer
+stream_responses = st.sidebar.checkbox("Stream responses", value=True)
 
-# Get user input
-user_input = st.text_input("Ask your question or describe your study needs:")
+# Get user input; the question is kept so the study plan form survives its own
+# reruns, but a question is only sent to the model on the run it was submitted
+submitted = submitted_text("Ask your question or describe your study needs:")
+if submitted:
+    st.session_state["question"] = submitted
+    st.session_state["last_reply"] = None
+user_input = st.session_state.get("question", "")
 
 if user_input:
     # Process the conversation
     if "study plan" in user_input.lower():
         st.write("Generating a study plan...")
-        subjects = st.text_input("Enter subjects (comma separated):").split(',')
-        hours_per_day = int(st.text_input("Enter hours per day:"))
-        exam_dates = st.text_input("Enter exam date(s) or time frame:")
-        study_plan = generate_study_plan(subjects, hours_per_day, exam_dates)
-        st.text(study_plan)
-    else:
-        response = chat_with_genai(user_input)
-        st.text(response)
+        subjects = [s.strip() for s in st.text_input("Enter subjects (comma separated):").split(',') if s.strip()]
+        weights_text = st.text_input("Enter how important each subject is, 1-3 (comma separated, optional):")
+        hours_per_day = st.number_input("Enter hours per day:", min_value=0.5, max_value=16.0, value=2.0, step=0.5)
+        default_date = datetime.date.today() + datetime.timedelta(days=14)
+        # One exam date per subject, so each gets its own deadline in the plan
+        exam_dates = [
+            st.date_input(f"Enter exam date for {subject}:", value=default_date, key=f"exam_date_{i}")
+            for i, subject in enumerate(subjects)
+        ]
+        past = [subject for subject, date in zip(subjects, exam_dates) if date <= datetime.date.today()]
+        if past:
+            st.warning(f"Please pick an exam date after today for: {', '.join(past)}.")
+        elif subjects:
+            try:
+                weights = [float(w) for w in weights_text.split(',')] if weights_text.strip() else None
+            except ValueError:
+                st.warning("Importance values must be numbers; using equal weights.")
+                weights = None
+            if weights is not None and len(weights) != len(subjects):
+                st.warning("Please give one importance value per subject; using equal weights.")
+                weights = None
+            study_plan = generate_study_plan(subjects, hours_per_day, exam_dates, weights)
+            st.text(study_plan)
+
+            # The timetable is computed locally; the model is only asked to explain it
+            if st.button("Explain this plan"):
+                explain_prompt = f"Briefly explain this study plan to the student and give two tips for following it:\n\n{study_plan}"
+                if stream_responses:
+                    st.write_stream(stream_chat_with_genai(explain_prompt))
+                else:
+                    st.text(chat_with_genai(explain_prompt))
+    elif submitted:
+        if stream_responses:
+            st.session_state["last_reply"] = st.write_stream(stream_chat_with_genai(user_input))
+        else:
+            st.session_state["last_reply"] = chat_with_genai(user_input)
+            st.text(st.session_state["last_reply"])
+    elif st.session_state.get("last_reply"):
+        # Other widgets (e.g. the stream toggle) rerun the script; don't ask again
+        st.markdown(st.session_state["last_reply"])
+
+# Rerun timing and the optional debug panel
+render_debug_panel(RUN_STARTED)
@@ -1,16 +1,20 @@
 import os
+import sys
+import time
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-google_api_key = os.getenv("GOOGLE_API_KEY")
+# Make the shared studyplanner package importable when run with `streamlit run`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from studyplanner.sessions import ChatSessionManager, get_conversation_id, submitted_text
+from studyplanner.streaming import iter_text
+from studyplanner.history_view import HistoryView
+from studyplanner import core
+from studyplanner.debug_panel import render_debug_panel
 
-# Authenticate with Google Generative AI
-genai.configure(api_key=google_api_key)
+# Start of this rerun, for the debug panel's rerun timing
+RUN_STARTED = time.perf_counter()
 
-# Initialize chat history as a list of messages
+# Opening messages every chat session starts from
 chat_history = [
     {"role": "user", "parts": "Hello, act like a education counselor and study planner and teacher during this conversation."},
     {"role": "model", "parts": "Great to meet you. What would you like to know?"},
@@ -18,28 +22,51 @@ chat_history = [
     
 
 ]
-# Function to handle chat with GenAI using manual chat history
+# Keep one model client per process and one chat session per conversation,
+# seeded with the counselor instructions above (a cached prefix where Gemini can
+# hold them, so they aren't re-sent every turn); calls go through the shared gateway.
+# Turns are recorded in the shared conversation store, so a restarted server or
+# another worker process picks the conversation up where it left off
+@st.cache_resource
+def get_session_manager():
+    return ChatSessionManager("gemini-1.5-flash", history=chat_history, model_factory=core.get_generative_model,
+                              prefix_cache=core.get_prefix_cache(),
+                              packer=core.get_packer("gemini-1.5-flash"), store=core.get_store())
+
+conversation_id = get_conversation_id()
+
+# Function to handle chat with GenAI using a per-user chat session
 def chat_with_genai(user_input):
-    """Interact with Google Generative AI using chat history stored in a list."""
+    """Interact with Google Generative AI using this user's cached chat session."""
     try:
-        # Initialize the model (using "gemini-1.5-flash")
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        # Start chat with the history (no memory buffer, just the list)
-        chat = model.start_chat(history=chat_history)
+        # Reuse the chat session; it already holds the history of earlier turns
+        chat = get_session_manager().get_chat(conversation_id)
         
         # Send the user's message and get the response
         response = chat.send_message(user_input)
-        
-        # Store the user input and model response in chat history
-        chat_history.append({"role": "user", "parts": user_input})
-        chat_history.append({"role": "model", "parts": response.text})
+        get_session_manager().record(conversation_id, user_input, response.text)
         
         return response.text
 
     except Exception as e:
         return f"Error communicating with Google GenAI: {str(e)}"
 
+# Streaming variant of chat_with_genai: yields the reply piece by piece
+def stream_chat_with_genai(user_input):
+    """Stream the reply from Google Generative AI as it is generated."""
+    try:
+        chat = get_session_manager().get_chat(conversation_id)
+
+        # The chat session records the turn once the stream is fully consumed
+        reply = ""
+        for text in iter_text(chat.send_message(user_input, stream=True)):
+            reply += text
+            yield text
+        get_session_manager().record(conversation_id, user_input, reply)
+
+    except Exception as e:
+        yield f"Error communicating with Google GenAI: {str(e)}"
+
 # Streamlit UI Layout
 st.title("Agentic Study Plan Chatbot (Powered by Google GenAI)")
 st.sidebar.header("Hello! I am your Frienldy Study Planner.")
@@ -53,23 +80,39 @@ Simply tell me about your study goals, subjects, or any other preferences, and I
 
 Let's get started by asking your study-related questions or describing your needs!
 """)
+
+# Stream the reply as it is generated instead of waiting for the whole answer
+stream_responses = st.sidebar.checkbox("Stream responses", value=True)
+
 # Create two columns: one for chat history and one for user input
 col1, col2 = st.columns([1, 3])  # Adjusting column width (1:3 ratio)
 
 # Display chat history in the left column
 with col1:
     st.header("Chat History")
-    for message in chat_history:
-        if message["role"] == "user":
-            st.markdown(f"**You**: {message['parts']}")
-        else:
-            st.markdown(f"**Bot**: {message['parts']}")
+    history_placeholder = st.container()
 
 # Get user input in the right column
 with col2:
-    user_input = st.text_input("Ask your question or describe your study needs:")
+    user_input = submitted_text("Ask your question or describe your study needs:")
     if user_input:
         # Process the conversation and generate a study plan dynamically
-        response = chat_with_genai(user_input)
-        st.text(response)  # Display the model's response below the input field
+        if stream_responses:
+            st.write_stream(stream_chat_with_genai(user_input))
+        else:
+            response = chat_with_genai(user_input)
+            st.text(response)  # Display the model's response below the input field
+
+# Format one history entry (each message is formatted once and cached by the view)
+def format_message(turn):
+    if turn.role == "user":
+        return f"**You**: {turn.content}"
+    return f"**Bot**: {turn.content}"
+
+# Fill the history column after the turn so it includes the latest exchange; only
+# the messages on screen are read from the store
+with history_placeholder:
+    HistoryView("history_view", format_message).render_conversation(core.get_store(), conversation_id)
 
+# Rerun timing and the optional debug panel
+render_debug_panel(RUN_STARTED)
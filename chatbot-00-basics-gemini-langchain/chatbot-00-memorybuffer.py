@@ -1,17 +1,21 @@
 import os
+import sys
+import time
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-google_api_key = os.getenv("GOOGLE_API_KEY")
+# Make the shared studyplanner package importable when run with `streamlit run`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from studyplanner.sessions import ChatSessionManager, get_conversation_id, submitted_text
+from studyplanner.streaming import iter_text
+from studyplanner.memory import RollingMemory, make_summarizer
+from studyplanner.vector_memory import format_recall
+from studyplanner import core
+from studyplanner.debug_panel import render_debug_panel
 
-# Authenticate with Google Generative AI
-genai.configure(api_key=google_api_key)
+# Start of this rerun, for the debug panel's rerun timing
+RUN_STARTED = time.perf_counter()
 
-# Initialize chat history as a list of messages
-# Initialize chat history as a list of messages
+# Opening messages every chat session starts from
 chat_history = [
     {"role": "user", "parts": "Hello, act like a education counselor and study planner and teacher during this conversation."},
     {"role": "model", "parts": "Great to meet you. What would you like to know?"},
@@ -20,31 +24,134 @@ chat_history = [
 
 ]
 
-# Function to handle chat with GenAI using manual chat history
+# Keep one model client per process and one chat session per conversation,
+# seeded with the counselor instructions above (a cached prefix where Gemini can
+# hold them, so they aren't re-sent every turn); calls go through the shared gateway.
+# Turns are recorded in the shared conversation store, so a restarted server or
+# another worker process picks the conversation up where it left off
+@st.cache_resource
+def get_session_manager():
+    return ChatSessionManager("gemini-1.5-flash", history=chat_history, model_factory=core.get_generative_model,
+                              prefix_cache=core.get_prefix_cache(),
+                              store=core.get_store())
+
+conversation_id = get_conversation_id()
+
+# Model used to fold older turns into the running summary (off the request path)
+@st.cache_resource
+def get_summary_model():
+    return core.get_generative_model("gemini-1.5-flash")
+
+def summary_turns(summary):
+    """Present the running summary to Gemini as one extra exchange."""
+    return [
+        {"role": "user", "parts": f"Summary of our earlier conversation: {summary}"},
+        {"role": "model", "parts": "Thanks, I will keep that in mind."}
+    ]
+
+# Memory buffer: the counselor turns stay pinned, recent turns stay verbatim and
+# older turns are summarized so the prompt stays within the token budget
+if "memory" not in st.session_state:
+    st.session_state["memory"] = RollingMemory(
+        pinned=chat_history,
+        summarizer=make_summarizer(lambda prompt: get_summary_model().generate_content(prompt).text),
+        summary_turns=summary_turns,
+        # Token counts are cached per message text and shared across sessions
+        count_tokens=core.get_packer("gemini-1.5-flash").counter.count_text
+    )
+    st.session_state["memory_version"] = None
+    # Resume a stored conversation (e.g. after a restart) from its recent turns
+    restored = core.get_store().tail(conversation_id, 40)
+    for turn in restored:
+        st.session_state["memory"].append({"role": turn.role, "parts": turn.content})
+    # Vector-index positions are store sequence numbers; memory.folded counts from the first restored turn
+    st.session_state["turn_offset"] = restored[0].seq if restored else 0
+    st.session_state["turn_count"] = restored[-1].seq + 1 if restored else 0
+
+def recall_turns(user_input):
+    """Older turns relevant to this question, from this session's local vector index."""
+    index = core.get_conversation_index()
+    if index is None:
+        return []
+    # Only turns already folded into the summary; the recent ones are sent verbatim
+    before = st.session_state["turn_offset"] + st.session_state["memory"].folded
+    hits = index.for_thread(conversation_id).search(user_input, 3, before=before)
+    if not hits:
+        return []
+    return [
+        {"role": "user", "parts": format_recall(hits)},
+        {"role": "model", "parts": "Thanks, I will keep that in mind."}
+    ]
+
+def prepare_chat(user_input):
+    """This user's chat session, with its history brought up to date."""
+    memory = st.session_state["memory"]
+    chat = get_session_manager().get_chat(conversation_id)
+    recalled = recall_turns(user_input)
+    # Swap in the compacted history once a background summary has landed
+    # (or when an idle chat session was evicted and restarted from the seed),
+    # and whenever older turns are recalled for this question
+    if recalled or st.session_state["memory_version"] != (id(chat), memory.version):
+        history = memory.messages(recalled)
+        # When Gemini holds the counselor turns as a cached prefix the chat doesn't repeat them
+        _, seed = get_session_manager().seed()
+        if not seed:
+            history = history[len(chat_history):]
+        chat.history = history
+        st.session_state["memory_version"] = None if recalled else (id(chat), memory.version)
+    return chat
+
+def record_turns(user_input, reply):
+    """Store the exchange in the memory buffer, the conversation store and the vector index."""
+    memory = st.session_state["memory"]
+    index = core.get_conversation_index()
+    for role, text in (("user", user_input), ("model", reply)):
+        memory.append({"role": role, "parts": text})
+        if index is not None:
+            index.for_thread(conversation_id).add(text, role, position=st.session_state["turn_count"])
+        st.session_state["turn_count"] += 1
+    get_session_manager().record(conversation_id, user_input, reply)
+
+# Function to handle chat with GenAI using a per-user chat session
 def chat_with_genai(user_input):
-    """Interact with Google Generative AI using chat history stored in a list."""
+    """Interact with Google Generative AI using this user's cached chat session."""
     try:
-        # Initialize the model (using "gemini-1.5-flash")
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        # Start chat with the history (no memory buffer, just the list)
-        chat = model.start_chat(history=chat_history)
-        
+        chat = prepare_chat(user_input)
+
         # Send the user's message and get the response
         response = chat.send_message(user_input)
-        
-        # Store the user input and model response in the chat history
-        chat_history.append({"role": "user", "parts": user_input})
-        chat_history.append({"role": "model", "parts": response.text})
-        
+
+        # Store the user input and model response in the memory buffer
+        record_turns(user_input, response.text)
+
         return response.text
 
     except Exception as e:
         return f"Error communicating with Google GenAI: {str(e)}"
 
+# Streaming variant of chat_with_genai: yields the reply piece by piece
+def stream_chat_with_genai(user_input):
+    """Stream the reply from Google Generative AI, recording it once complete."""
+    try:
+        chat = prepare_chat(user_input)
+
+        # The chat session only records the turn after the stream is consumed
+        reply = ""
+        for text in iter_text(chat.send_message(user_input, stream=True)):
+            reply += text
+            yield text
+
+        record_turns(user_input, reply)
+
+    except Exception as e:
+        yield f"Error communicating with Google GenAI: {str(e)}"
+
 # Streamlit UI
 st.title("Agentic Study Plan Chatbot (Powered by Google GenAI)")
 st.sidebar.header("Chatbot Options")
+memory = st.session_state["memory"]
+memory.token_budget = st.sidebar.slider("Memory token budget", 500, 8000, memory.token_budget, step=250)
+memory.recent_turns = st.sidebar.slider("Recent turns kept verbatim", 2, 20, memory.recent_turns, step=2)
 # Add a description under the sidebar header
 st.sidebar.markdown("""
 Welcome to your personal study planner! 🎓
@@ -56,10 +163,22 @@ Simply tell me about your study goals, subjects, or any other preferences, and I
 Let's get started by asking your study-related questions or describing your needs!
 """)
 
+# Stream the reply as it is generated instead of waiting for the whole answer
+stream_responses = st.sidebar.checkbox("Stream responses", value=True)
+
 # Get user input
-user_input = st.text_input("Ask your question or describe your study needs:")
+user_input = submitted_text("Ask your question or describe your study needs:")
 
 if user_input:
     # Process the conversation and generate a study plan dynamically
-    response = chat_with_genai(user_input)
-    st.text(response)
+    if stream_responses:
+        st.session_state["last_reply"] = st.write_stream(stream_chat_with_genai(user_input))
+    else:
+        st.session_state["last_reply"] = chat_with_genai(user_input)
+        st.text(st.session_state["last_reply"])
+elif st.session_state.get("last_reply"):
+    # Other widgets rerun the script; keep showing the last answer without asking again
+    st.markdown(st.session_state["last_reply"])
+
+# Rerun timing and the optional debug panel
+render_debug_panel(RUN_STARTED)
@@ -14,11 +14,24 @@ Install the required packages.
 
 """Import the required modules."""
 
+import asyncio
+import html
 import os
+import sys
+import time
 from IPython.display import display, HTML, clear_output
 import ipywidgets as widgets
-from langchain_google_genai import ChatGoogleGenerativeAI
 import google.generativeai as genai
+
+# Shared helpers live at the repo root (in Colab, clone the repo and run from this folder)
+sys.path.append(os.path.abspath(".."))
+from studyplanner.cache import ResponseCache
+from studyplanner.client import PlannerClient, RemoteToolPlanner
+from studyplanner.gateway import shared_chat_model
+from studyplanner.messages import MessageLog
+from studyplanner.planner import ToolPlanner, areport, report
+from studyplanner.prefix_cache import GeminiPrefixBackend, PrefixCache
+from studyplanner.prompts import ALL_TOOLS, TOOLS
 print("Nodules imported successfully!")
 
 class NotebookStudyPlanner:
@@ -26,15 +39,27 @@ class NotebookStudyPlanner:
         # Configure API
         os.environ["GOOGLE_API_KEY"] = api_key
         genai.configure(api_key=api_key)
-        self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+        self.model_name = "gemini-1.5-flash"
+        # Shared client behind the gateway: rate limit, retries, coalescing
+        self.llm = shared_chat_model(self.model_name)
+
+        # Repeated requests are answered from disk without an API call
+        self.cache = ResponseCache()
+        # The tool instructions are registered once as a prefix (cached by Gemini once they are large enough)
+        self.prefixes = PrefixCache(GeminiPrefixBackend())
+        self.planner = ToolPlanner(self.llm, self.model_name, self.cache, self.prefixes)
 
-        # Initialize chat history
-        self.history = []
+        # With a planner service running, the notebook is just a client of it
+        if os.getenv("STUDYPLANNER_SERVICE_URL"):
+            self.planner = RemoteToolPlanner(PlannerClient(os.getenv("STUDYPLANNER_SERVICE_URL")))
+
+        # Initialize chat history (compact, append-only)
+        self.history = MessageLog()
 
         # Create widgets
+        # "All tools" asks every tool at once and merges the answers into one report
         self.tool_dropdown = widgets.Dropdown(
-            options=['Create Study Schedule', 'Subject Analysis',
-                    'Time Management Tips', 'Resource Recommendations'],
+            options=TOOLS + [ALL_TOOLS],
             description='Tool:',
             style={'description_width': 'initial'}
         )
@@ -51,8 +76,20 @@ class NotebookStudyPlanner:
             button_style='primary'
         )
 
+        # Async mode streams answers into the output area without blocking the
+        # kernel, and several requests (e.g. one per tool) can run at once
+        self.async_mode = widgets.Checkbox(
+            value=True,
+            description='Stream in the background',
+            style={'description_width': 'initial'}
+        )
+
         self.output_area = widgets.Output()
 
+        # Requests still streaming, by request number
+        self.pending = {}
+        self.request_count = 0
+
         # Set up button click handler
         self.submit_button.on_click(self.handle_submit)
 
@@ -68,13 +105,19 @@ class NotebookStudyPlanner:
             widgets.HTML('<h4>Select a tool and enter your request:</h4>'),
             self.tool_dropdown,
             widgets.HBox([self.input_text, self.submit_button]),
+            self.async_mode,
             self.output_area
         ]))
 
+    def print_message(self, message):
+        if message["role"] == "user":
+            print(f"🙋 You: {message['content']}\n")
+        else:
+            print(f"🤖 Assistant: {message['content']}\n")
+        print("-" * 80 + "\n")
+
     def handle_submit(self, button):
         with self.output_area:
-            clear_output()
-
             # Get input values
             tool = self.tool_dropdown.value
             user_input = self.input_text.value
@@ -83,35 +126,137 @@ class NotebookStudyPlanner:
                 print("Please enter a request.")
                 return
 
-            # Create prompt
-            prompt = f"""Tool selected: {tool}
-User request: {user_input}
-
-As a study planning assistant, provide specific, actionable advice relevant to the selected tool.
-If creating a schedule, include specific time blocks.
-If analyzing a subject, break down key concepts and learning approaches.
-If providing time management tips, include concrete techniques.
-If recommending resources, suggest specific types of materials."""
-
-            # Get response
-            response = self.llm.invoke(prompt)
+            if self.async_mode.value:
+                if tool == ALL_TOOLS:
+                    self.start_report(user_input)
+                else:
+                    self.start_request(tool, user_input)
+                self.input_text.value = ''
+                return
 
-            # Add to history
-            self.history.append({"role": "user", "content": f"Tool: {tool}\nRequest: {user_input}"})
-            self.history.append({"role": "assistant", "content": response.content})
+            # Get response, from the cache when this tool/request was seen before
+            if tool == ALL_TOOLS:
+                content = report(self.planner, user_input, concurrency=len(TOOLS)).to_text()
+            else:
+                content = self.planner.submit(tool, user_input)
 
-            # Display chat history
-            print("💬 Chat History:\n")
-            for message in self.history:
-                if message["role"] == "user":
-                    print(f"🙋 You: {message['content']}\n")
-                else:
-                    print(f"🤖 Assistant: {message['content']}\n")
-                print("-" * 80 + "\n")
+            # The output area keeps earlier turns, so only the new exchange is printed
+            self.begin_output()
+            self.request_count += 1
+            new_messages = [
+                {"role": "user", "content": f"Tool: {tool}\nRequest: {user_input}"},
+                {"role": "assistant", "content": content},
+            ]
+            self.history.extend(new_messages)
+            for message in new_messages:
+                self.print_message(message)
 
             # Clear input
             self.input_text.value = ''
 
+    def begin_output(self):
+        # Clear the placeholder output before the first request only
+        if not self.request_count:
+            with self.output_area:
+                clear_output()
+                print("💬 Chat History:\n")
+
+    def start_request(self, tool, user_input):
+        """Schedule one request on the kernel's event loop, with its own panel."""
+        self.begin_output()
+        self.request_count += 1
+        number = self.request_count
+        header = widgets.HTML(f"<b>#{number} {html.escape(tool)}</b>: {html.escape(user_input)}")
+        status = widgets.HTML("⏳ Waiting for the model...")
+        progress = widgets.IntProgress(value=0, min=0, max=1, bar_style='info',
+                                       layout=widgets.Layout(width='30%'))
+        cancel_button = widgets.Button(description='Cancel', button_style='warning',
+                                       layout=widgets.Layout(width='auto'))
+        answer = widgets.HTML()
+        panel = widgets.VBox([header, widgets.HBox([progress, status, cancel_button]), answer])
+
+        with self.output_area:
+            display(panel)
+
+        # The kernel runs widget callbacks on its own event loop, so the task
+        # runs between cell executions and callbacks without blocking them
+        task = asyncio.ensure_future(self.stream_request(tool, user_input, status, progress, answer))
+        self.pending[number] = task
+        cancel_button.on_click(lambda _: task.cancel())
+
+        def finished(task):
+            self.pending.pop(number, None)
+            cancel_button.disabled = True
+            progress.max = progress.value = 1
+            if task.cancelled():
+                progress.bar_style = 'warning'
+                status.value = "⏹️ Cancelled"
+            elif task.exception() is not None:
+                progress.bar_style = 'danger'
+                status.value = f"❌ {html.escape(str(task.exception()))}"
+            else:
+                progress.bar_style = 'success'
+        task.add_done_callback(finished)
+        return task
+
+    async def stream_request(self, tool, user_input, status, progress, answer):
+        started = time.perf_counter()
+        pieces = []
+        last_render = 0.0
+        async for text in self.planner.astream(tool, user_input):
+            pieces.append(text)
+            # The bar can't know the final length, so it tracks chunks received
+            progress.max = len(pieces) + 1
+            progress.value = len(pieces)
+            now = time.perf_counter()
+            # Re-rendering the whole answer on every chunk is wasted work; a few times a second is enough
+            if now - last_render > 0.1:
+                last_render = now
+                answer.value = self.render_answer(pieces)
+                status.value = f"⏳ {now - started:.1f} s, {sum(map(len, pieces))} characters"
+        content = "".join(pieces)
+        answer.value = self.render_answer(pieces)
+        status.value = f"✅ Done in {time.perf_counter() - started:.1f} s"
+        self.history.extend([
+            {"role": "user", "content": f"Tool: {tool}\nRequest: {user_input}"},
+            {"role": "assistant", "content": content},
+        ])
+        return content
+
+    def start_report(self, user_input):
+        """Run every tool on the request at once; each gets a status line as it finishes."""
+        self.begin_output()
+        self.request_count += 1
+        header = widgets.HTML(f"<b>#{self.request_count} {html.escape(ALL_TOOLS)}</b>: {html.escape(user_input)}")
+        statuses = {tool: widgets.HTML(f"⏳ {html.escape(tool)}") for tool in TOOLS}
+        answer = widgets.HTML()
+        with self.output_area:
+            display(widgets.VBox([header, *statuses.values(), answer]))
+
+        def tool_done(result):
+            mark = "❌" if result.error else "✅"
+            note = "cached" if result.cache_hit else f"{result.seconds:.1f} s"
+            statuses[result.tool].value = f"{mark} {html.escape(result.tool)} ({note})"
+
+        async def run():
+            result = await areport(self.planner, user_input, concurrency=len(TOOLS), on_result=tool_done)
+            content = result.to_text()
+            answer.value = self.render_answer([content])
+            self.history.extend([
+                {"role": "user", "content": f"Tool: {ALL_TOOLS}\nRequest: {user_input}"},
+                {"role": "assistant", "content": content},
+            ])
+            return result
+
+        task = asyncio.ensure_future(run())
+        self.pending[self.request_count] = task
+        task.add_done_callback(lambda _, number=self.request_count: self.pending.pop(number, None))
+        return task
+
+    @staticmethod
+    def render_answer(pieces):
+        return f"<pre style='white-space: pre-wrap'>{html.escape(''.join(pieces))}</pre>"
+
 """Add Google API key."""
 
 from google.colab import userdata
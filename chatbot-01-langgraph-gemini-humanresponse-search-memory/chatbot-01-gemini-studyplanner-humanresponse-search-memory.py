@@ -1,185 +1,184 @@
 import os
+import sys
+import time
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
-from typing import TypedDict, Annotated
-from langgraph.graph.message import add_messages
-from dotenv import load_dotenv
 from langchain_core.messages import ToolMessage
 
-# Load environment variables
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
-TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+# Make the shared studyplanner package importable when run with `streamlit run`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from studyplanner import core
+from studyplanner.memory import RollingMemory, make_summarizer
+from studyplanner.history_view import HistoryView
+from studyplanner.sessions import get_conversation_id
+from studyplanner.debug_panel import render_debug_panel
 
-if not GEMINI_API_KEY:
+# Start of this rerun, for the debug panel's rerun timing
+RUN_STARTED = time.perf_counter()
+
+# Environment variables (.env is loaded once per process)
+GEMINI_API_KEY = core.env("GOOGLE_API_KEY")
+TAVILY_API_KEY = core.env("TAVILY_API_KEY")
+
+# Set STUDYPLANNER_OFFLINE=1 to run against local stand-ins without API keys
+OFFLINE = core.offline()
+# Set STUDYPLANNER_SERVICE_URL to run the graph in the planner service; this app is then a thin client
+REMOTE = bool(core.service_url())
+
+if not GEMINI_API_KEY and not OFFLINE and not REMOTE:
     st.error("Google API key not found. Please set GOOGLE_API_KEY in your environment variables.")
     st.stop()
-if not TAVILY_API_KEY:
+if not TAVILY_API_KEY and not OFFLINE and not REMOTE:
     st.error("Tavily API key not found. Please set TAVILY_API_KEY in your environment variables.")
     st.stop()
 
-# Define State for LangGraph
-class State(TypedDict):
-    messages: Annotated[list, add_messages]
-    human_requested: bool
-    human_response_ready: bool
-    human_response: str
-    search_requested: bool
-
-# Initialize LangGraph
-graph_builder = StateGraph(State)
-
-# Initialize Gemini AI Model
-llm = ChatGoogleGenerativeAI(model="gemini-pro", api_key=GEMINI_API_KEY)
-
-# Initialize Tavily Search Tool
-search_tool = TavilySearchResults(max_results=3, tavily_api_key=TAVILY_API_KEY)
-
-def ai_agent(state: State):
-    """Handles student queries and determines if human help or search is needed."""
-    user_query = state["messages"][-1]["content"].lower()
-    
-    # If the user asks for a summary, generate a history summary
-    if "what did we do today" in user_query or "summarize chat history" in user_query:
-        chat_history_text = "\n".join(
-            [f"{msg['role']}: {msg['content']}" if isinstance(msg, dict) else f"Tool: {msg.content}" for msg in state["messages"]]
-        )
-        summary_prompt = f"Summarize this conversation history:\n\n{chat_history_text}"
-        response = llm.invoke([{"role": "user", "content": summary_prompt}])
-        response_content = response.content if hasattr(response, "content") else str(response)
-        state["messages"].append({"role": "ai", "content": response_content})
-        return state
-
-    # If the user wants an online search, trigger it
-    if "search online" in user_query or "find on the internet" in user_query:
-        state["search_requested"] = True
-        return state
-    
-    # Otherwise, continue with normal AI response
-    response = llm.invoke(state["messages"])
-    response_content = response.content if hasattr(response, "content") else str(response)
-    
-    if "human assistance" in response_content.lower():
-        state["human_requested"] = True
-    
-    state["messages"].append({"role": "ai", "content": response_content})
-    return state
-
-graph_builder.add_node("ai_agent", ai_agent)
-
-def search_online(state: State):
-    """Fetches search results using Tavily API."""
-    search_query = state["messages"][-1]["content"]
-    results = search_tool.invoke(search_query)
-    
-    if not results:
-        search_response = ToolMessage(content="No relevant search results found.", tool_call_id="search_tool_1", name="Tavily_Search")
-    else:
-        formatted_results = "\n\n".join(
-            [f"{res.get('url', 'No URL')}\n{res.get('content', 'No Content')}" for res in results]
-        )
-        search_response = ToolMessage(content=formatted_results, tool_call_id="search_tool_1", name="Tavily_Search")
-    
-    state["messages"].append(search_response)
-    return state
-
-graph_builder.add_node("search", search_online)
-
-def human_assist(state: State):
-    """Fetches human assistance when required."""
-    state["human_response_ready"] = True
-    return state
-
-graph_builder.add_node("human_assist", human_assist)
-
-def route_logic(state: State):
-    if state["human_requested"]:
-        return "human_assist"
-    if state["search_requested"]:
-        return "search"
-    return END
-
-graph_builder.add_conditional_edges("ai_agent", route_logic, {"human_assist": "human_assist", "search": "search", END: END})
+# Per-thread conversation state is checkpointed here and survives reruns
+CHECKPOINT_PATH = core.env("STUDYPLANNER_CHECKPOINTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints.sqlite3"))
 
-graph_builder.add_edge(START, "ai_agent")
-graph_builder.add_edge("human_assist", "ai_agent")
-graph_builder.add_edge("search", "ai_agent")
-
-graph = graph_builder.compile()
+# The Gemini models (a fast/strong cascade unless STUDYPLANNER_MODEL names one,
+# behind the rate-limited gateway), the multi-query Tavily
+# search and the compiled graph are built on the first run of this process and
+# reused by every rerun after that
+MODEL_NAME = core.env("STUDYPLANNER_MODEL", core.CASCADE)
+llm = None if REMOTE else core.get_llm(MODEL_NAME)
+runner = core.get_graph_runner(MODEL_NAME, CHECKPOINT_PATH)
+# Counselor requests wait here, not in this session; replies come back through the graph
+escalations = core.get_escalations()
 
 # Streamlit UI
 st.set_page_config(layout="wide")
 st.title("📚 AI Study Planner & Student Counselor")
 
 # Initialize session states
-if "chat_history" not in st.session_state:
-    st.session_state["chat_history"] = []
-if "human_response_ready" not in st.session_state:
-    st.session_state["human_response_ready"] = False
-if "human_response" not in st.session_state:
-    st.session_state["human_response"] = ""
-if "human_requested" not in st.session_state:
-    st.session_state["human_requested"] = False
-if "search_requested" not in st.session_state:
-    st.session_state["search_requested"] = False
+if "thread_id" not in st.session_state:
+    # Identifies this conversation's checkpoints; kept in the page URL so a reload,
+    # a restarted server or another worker process resumes the same conversation
+    st.session_state["thread_id"] = get_conversation_id()
+
+thread_id = st.session_state["thread_id"]
+
+# Resume from the checkpoint instead of rebuilding the conversation on every rerun
+state = runner.get_state(thread_id)
+
+if "memory" not in st.session_state:
+    # Keeps recent turns verbatim and summarizes older ones in the background
+    # (as a service client there is no local model, so older turns are dropped instead)
+    summarizer = None if llm is None else make_summarizer(lambda prompt: llm.invoke(prompt).content)
+    st.session_state["memory"] = RollingMemory(summarizer=summarizer, count_tokens=core.get_packer(MODEL_NAME).counter.count_text)
+    # A checkpointed conversation carries on from its stored summary and recent turns
+    st.session_state["memory"].summary = state.get("summary") or ""
+    st.session_state["memory"].folded = state.get("summary_upto") or 0
+    # Checkpointed messages the memory has been given so far
+    st.session_state["synced"] = st.session_state["memory"].folded
+
+memory = st.session_state["memory"]
+
+def sync_memory(messages):
+    """Give the memory the checkpointed messages it has not seen yet: this
+    turn's, or a counselor reply delivered since the last rerun."""
+    for message in messages[st.session_state["synced"]:]:
+        memory.append(message)
+    st.session_state["synced"] = len(messages)
+
+sync_memory(state.get("messages", []))
+
+def format_message(msg):
+    """Sidebar line for one message (formatted once and cached by the view)."""
+    if isinstance(msg, ToolMessage):
+        role = "🛠 Tool"
+    elif msg.type == "human":
+        role = "👤 User"
+    else:
+        role = "👨‍🏫 Human Assistant" if msg.name == "counselor" else "🤖 AI"
+    return f"{role}: {msg.content}"
 
 # Sidebar with chat history
 with st.sidebar:
     st.header("🗂️ Chat History")
-    for msg in st.session_state["chat_history"]:
-        if isinstance(msg, ToolMessage):
-            role = "🛠 Tool"
-            content = msg.content  # Correctly access `ToolMessage` content
-        else:
-            role = "👤 User" if msg["role"] == "user" else "🤖 AI" if msg["role"] == "ai" else "👨‍🏫 Human Assistant"
-            content = msg["content"]
-        st.write(f"{role}: {content}")
+    # Filled at the end of the run so this turn's messages are included
+    history_pane = st.container()
     
+    # Stream replies as they are generated instead of waiting for the whole answer
+    st.checkbox("Stream responses", value=True, key="stream_responses")
+
     st.header("📖 How to Use")
     st.markdown("""
     - 💬 Ask a study-related question.
     - 🤖 AI will respond.
-    - 🌍 Write "search online" to trigger an internet search.
-    - 👨‍🏫 Write "human assistance" and then click "Fetch Human Response" if AI is needed to take human help (It will simulate it by creating a text field.).
+    - 🌍 Write "search online" (or ask for online resources) to trigger an internet search.
+    - 👨‍🏫 Write "human assistance" (or ask to talk to a counselor) if AI is needed to take human help; the request joins the counselors' queue and their reply appears here. Answer it from the "Counselor console" below (or with `python -m studyplanner.escalation --counselor NAME`).
     - ✨ Your conversation history is saved. You can use it by using prompts having: a) What did we do today b) Summarize chat history
     """)
 
+    # Stands in for the counselors' side: claim the oldest waiting request and reply
+    with st.expander("👨‍🏫 Counselor console"):
+        counts = escalations.stats()
+        st.caption(f"Waiting: {counts['pending']} · Being answered: {counts['claimed']} · "
+                   f"Oldest waiting: {counts['oldest_pending_seconds']:.0f}s")
+        counselor = st.text_input("Counselor name", value="counselor")
+        claimed = st.session_state.get("claimed_escalation")
+        if claimed is None:
+            if st.button("Claim next request"):
+                st.session_state["claimed_escalation"] = escalations.claim(counselor)
+                if st.session_state["claimed_escalation"] is None:
+                    st.write("No students are waiting.")
+                else:
+                    st.rerun()
+        else:
+            st.write(f"Student: {claimed.question}")
+            human_response = st.text_area("Enter human response here:")
+            if st.button("Submit Human Response") and human_response:
+                if not escalations.answer(claimed.id, claimed.counselor, human_response):
+                    st.warning("Your claim expired and another counselor took this request.")
+                st.session_state["claimed_escalation"] = None
+                st.rerun()
+            if st.button("Put back in queue"):
+                escalations.release(claimed.id, claimed.counselor)
+                st.session_state["claimed_escalation"] = None
+                st.rerun()
+
 # Main Chat Interface
 user_input = st.text_input("Ask a study-related question:")
 if st.button("Submit AI Query") and user_input:
-    state = {
-        "messages": st.session_state["chat_history"] + [{"role": "user", "content": user_input}],
-        "human_requested": False,
-        "search_requested": False,
-        "human_response_ready": st.session_state["human_response_ready"],
-        "human_response": st.session_state["human_response"]
-    }
-    state = ai_agent(state)
-    st.session_state["chat_history"].append(state["messages"][-1])
-    st.write("💡 AI Response:", state["messages"][-1]["content"])
-    st.session_state["human_requested"] = state["human_requested"]
-    st.session_state["search_requested"] = state["search_requested"]
-
-# Handle Search Requests
-if st.session_state["search_requested"]:
-    state = search_online(state)
-    st.session_state["chat_history"].append(state["messages"][-1])
-    st.write("🌍 Internet Search Results:", state["messages"][-1].content)
-    st.session_state["search_requested"] = False
-
-# Handle Human Assistance Requests
-if st.session_state["human_requested"] and not st.session_state["human_response_ready"]:
-    if st.button("Fetch Human Response"):
-        st.session_state["human_response_ready"] = True
-
-if st.session_state["human_response_ready"]:
-    human_response = st.text_area("Enter human response here:", value=st.session_state["human_response"])
-    if st.button("Submit Human Response"):
-        st.session_state["human_response"] = human_response
-        st.session_state["chat_history"].append({"role": "human", "content": human_response})
-        st.session_state["human_response_ready"] = False
-        st.session_state["human_requested"] = False
-        st.write("👨‍🏫 Human Assistant:", human_response)
+    # The graph routes between the AI agent, search and human assistance itself
+    placeholder, reply = st.empty(), ""
+    for kind, node, payload in runner.stream_turn(thread_id, user_input, memory.summary, memory.folded):
+        if kind == "token" and st.session_state["stream_responses"]:
+            reply += payload
+            placeholder.write(f"💡 AI Response: {reply}")
+            continue
+        if kind != "message":
+            continue
+        if isinstance(payload, ToolMessage):
+            st.write("🌍 Internet Search Results:", payload.content)
+        elif not reply:
+            placeholder.write(f"💡 AI Response: {payload.content}")
+        # The next AI reply (e.g. after a search) gets its own placeholder
+        placeholder, reply = st.empty(), ""
+    state = runner.get_state(thread_id)
+    sync_memory(state.get("messages", []))
+
+# The thread is paused until a counselor replies; the student's session isn't
+if escalations.open_for(thread_id) is not None:
+    st.info("👨‍🏫 A counselor has your question and will reply here. You can keep asking the AI meanwhile.")
+    _fragment = getattr(st, "fragment", None)
+    if _fragment is not None:
+        # Poll in a fragment so only this check reruns until the reply lands
+        @_fragment(run_every=5)
+        def wait_for_counselor():
+            if escalations.open_for(thread_id) is None:
+                st.rerun()
+
+        wait_for_counselor()
+    else:
+        st.button("Check for a counselor reply")
+else:
+    last = (state.get("messages") or [None])[-1]
+    if getattr(last, "name", None) == "counselor":
+        st.write("👨‍🏫 Human Assistant:", last.content)
+
+# Show the newest messages from the checkpointed state
+with history_pane:
+    HistoryView("history_view", format_message).render(state.get("messages", []))
+
+# Rerun timing and the optional debug panel
+render_debug_panel(RUN_STARTED)
@@ -0,0 +1,6 @@
+"""Shared building blocks for the study planner chatbots.
+
+The Streamlit scripts in the ``chatbot-*`` folders import from this package so
+that clients, sessions and helpers are created once per process instead of on
+every rerun.
+"""
@@ -0,0 +1,167 @@
+"""Headless batch runner for the NotebookStudyPlanner tools.
+
+Reads student requests from a JSON-lines file, one object per line::
+
+    {"id": "s-001", "tool": "Create Study Schedule", "request": "Math exam in 2 weeks, 3h a day"}
+
+``tool`` is one of ``prompts.TOOLS`` (default: the first one) and ``id``
+defaults to the line number. Requests go through the same ``ToolPlanner``
+path as ``handle_submit``, on a bounded pool of async workers with a
+requests-per-second limit. Each result is appended to the output file as
+soon as it finishes, so an interrupted run can be started again with the same
+arguments and only redoes rows without an ``"ok"`` result::
+
+    python -m studyplanner.batch class-10a.jsonl plans-10a.jsonl --concurrency 8 --rate 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .prompts import TOOLS
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+
+def load_requests(path):
+    """Parse the input file into ``{"id", "tool", "request"}`` rows."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            tool = record.get("tool", TOOLS[0])
+            if tool not in TOOLS:
+                raise ValueError(f"line {number}: unknown tool {tool!r}; expected one of {TOOLS}")
+            rows.append({"id": str(record.get("id", number)), "tool": tool, "request": record["request"]})
+    return rows
+
+
+def completed_ids(path):
+    """Ids that already have a successful result in ``path`` (for resuming)."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interruption; that row is simply redone
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart (no limit when ``rate`` is falsy)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        # Reserve the next slot before sleeping so concurrent workers queue up
+        start = max(now, self._next)
+        self._next = start + self.interval
+        await asyncio.sleep(start - now)
+
+
+async def run_batch(planner, rows, out, concurrency=4, rate=None, retries=2, progress=None):
+    """Answer ``rows`` with ``planner.asubmit`` and write each result to ``out``.
+
+    ``concurrency`` workers pull from a shared queue; a failed row is retried
+    ``retries`` times before an ``"error"`` result is written. Returns the
+    number of rows that succeeded.
+    """
+    queue = asyncio.Queue()
+    for row in rows:
+        queue.put_nowait(row)
+    limiter = RateLimiter(rate)
+    counts = {"ok": 0, "done": 0}
+
+    async def answer(row):
+        for attempt in range(retries + 1):
+            await limiter.wait()
+            try:
+                return await planner.asubmit(row["tool"], row["request"])
+            except Exception:
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def worker():
+        while not queue.empty():
+            row = queue.get_nowait()
+            start = time.perf_counter()
+            result = dict(row)
+            try:
+                result.update(status="ok", response=await answer(row))
+                counts["ok"] += 1
+            except Exception as exc:
+                result.update(status="error", error=f"{type(exc).__name__}: {exc}")
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            counts["done"] += 1
+            if progress:
+                progress(counts["done"], len(rows), result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return counts["ok"]
+
+
+def make_llm(model, offline=False):
+    if offline:
+        from .fakes import FakeChatModel
+
+        return FakeChatModel(model=model, latency=0.2, tokens_per_second=200)
+    from .gateway import shared_chat_model
+
+    return shared_chat_model(model)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON-lines file of student requests")
+    parser.add_argument("output", help="JSON-lines results file; appended to and used to resume")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, default=1.0, help="max requests started per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=2, help="retries per failed request")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--cache", action="store_true", help="answer repeated requests from the response cache")
+    parser.add_argument("--offline", action="store_true", help="use the fake model instead of Gemini")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    from .cache import ResponseCache
+    from .planner import ToolPlanner
+
+    load_dotenv()
+    rows = load_requests(args.input)
+    done = completed_ids(args.output)
+    pending = [row for row in rows if row["id"] not in done]
+    print(f"{len(rows)} requests, {len(rows) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+
+    planner = ToolPlanner(make_llm(args.model, args.offline), args.model, ResponseCache() if args.cache else None)
+
+    def progress(done_count, total, result):
+        print(f"[{done_count}/{total}] {result['id']} {result['status']} {result['seconds']:.1f}s", file=sys.stderr)
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        ok = asyncio.run(run_batch(planner, pending, out, args.concurrency, args.rate, args.retries, progress))
+    print(f"{ok}/{len(pending)} succeeded", file=sys.stderr)
+    return 0 if ok == len(pending) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Per-turn latency benchmark that runs offline against the fake backends.
+
+Replays a recorded transcript (JSON lines with ``user`` and optionally
+``tool``) through the same code paths the apps use and reports p50/p95/p99
+per-turn latency and throughput::
+
+    python -m studyplanner.bench benchmarks/transcripts/study_session.jsonl \\
+        --latency 0.3 --tokens-per-second 80 --sessions 8
+
+Targets:
+  ai_agent         StudyPlannerAgent.ai_agent (chatbot-01), one state per session
+  search_online    StudyPlannerAgent.search_online over MultiQuerySearch
+  chat_with_genai  a ChatSessionManager chat per session (chatbot-00 apps)
+  handle_submit    ToolPlanner.submit (NotebookStudyPlanner.handle_submit)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+from .cache import ResponseCache
+from .fakes import FakeChatModel, FakeGenerativeModel, FakeSearchTool
+from .graph import StudyPlannerAgent
+from .loop import BackgroundLoop
+from .planner import ToolPlanner
+from .prompts import TOOLS
+from .search import MultiQuerySearch, TavilyBackend
+from .sessions import ChatSessionManager
+
+TARGETS = ["ai_agent", "search_online", "chat_with_genai", "handle_submit"]
+
+
+def load_transcript(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(name, latencies, errors, wall_seconds):
+    ordered = sorted(latencies)
+    turns = len(latencies) + errors
+    return {
+        "target": name,
+        "turns": turns,
+        "errors": errors,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "throughput": turns / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+class Backends:
+    """Fake clients shared by every session of one benchmark run."""
+
+    def __init__(self, args):
+        fake = dict(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                    failure_rate=args.failure_rate, seed=args.seed)
+        self.llm = FakeChatModel(**fake)
+        self.search = MultiQuerySearch(TavilyBackend(FakeSearchTool(
+            latency=args.search_latency, failure_rate=args.failure_rate, seed=args.seed)))
+        self.agent = StudyPlannerAgent(self.llm, self.search)
+        self.sessions = ChatSessionManager(
+            history=[{"role": "user", "parts": "Hello!"}, {"role": "model", "parts": "Hi there!"}],
+            model_factory=lambda name: FakeGenerativeModel(name, **fake),
+        )
+        self.cache_dir = tempfile.mkdtemp(prefix="studyplanner-bench-") if args.cache else None
+        self.cache = ResponseCache(os.path.join(self.cache_dir, "cache.sqlite3")) if args.cache else None
+        self.planner = ToolPlanner(self.llm, "fake-gemini", self.cache)
+        self.loop = BackgroundLoop()
+
+    def close(self):
+        self.loop.close()
+        if self.cache is not None:
+            self.cache.close()
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def make_turn(target, backends, session_id):
+    """Return ``turn(record)`` for one session of ``target``."""
+    if target == "ai_agent":
+        state = {"messages": [], "summary": "", "summary_upto": 0}
+
+        def turn(record):
+            state["messages"].append(HumanMessage(content=record["user"]))
+            update = backends.loop.run(backends.agent.ai_agent(state))
+            state["messages"].extend(update.get("messages", []))
+        return turn
+
+    if target == "search_online":
+        def turn(record):
+            state = {"messages": [HumanMessage(content=record["user"])]}
+            backends.loop.run(backends.agent.search_online(state))
+        return turn
+
+    if target == "chat_with_genai":
+        def turn(record):
+            chat = backends.sessions.get_chat(session_id)
+            chat.send_message(record["user"]).text
+        return turn
+
+    if target == "handle_submit":
+        def turn(record):
+            backends.planner.submit(record.get("tool", TOOLS[0]), record["user"])
+        return turn
+
+    raise ValueError(f"unknown target {target!r}")
+
+
+def run_target(target, transcript, backends, sessions):
+    """Replay ``transcript`` in ``sessions`` concurrent sessions of ``target``."""
+    def run_session(index):
+        turn = make_turn(target, backends, f"{target}-{index}")
+        latencies, errors = [], 0
+        for record in transcript:
+            start = time.perf_counter()
+            try:
+                turn(record)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(run_session, range(sessions)))
+    wall = time.perf_counter() - start
+    latencies = [value for session, _ in results for value in session]
+    return summarize(target, latencies, sum(errors for _, errors in results), wall)
+
+
+def format_table(rows):
+    lines = [f"{'target':<16}{'turns':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'turns/s':>10}"]
+    for row in rows:
+        lines.append(
+            f"{row['target']:<16}{row['turns']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}"
+            f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['throughput']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcript", help="JSON-lines transcript with 'user' (and optional 'tool') fields")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument("--sessions", type=int, default=1, help="concurrent sessions replaying the transcript")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model first-token latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="fake model token rate")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="fake search latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability of an injected 429/503")
+    parser.add_argument("--cache", action="store_true", help="put a fresh response cache in front of handle_submit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    transcript = load_transcript(args.transcript)
+    backends = Backends(args)
+    try:
+        rows = [run_target(target, transcript, backends, args.sessions) for target in args.targets]
+    finally:
+        backends.close()
+    print(format_table(rows))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Disk-backed LLM response cache.
+
+Entries are keyed on the model name, a hash of the instruction/template text
+and the user's input. Every response is stored under two keys: one for the
+exact input and one for a normalized form (case, Unicode form, whitespace and
+trailing punctuation folded), so "Make me a study plan for math!" and "make me
+a study plan for math" share an answer. Punctuation inside the question is
+kept: "study plan for C++" and "study plan for C#" are different questions. Entries expire after ``ttl_seconds`` and the least
+recently used ones are evicted once the cache holds more than ``max_entries``.
+
+``TTLCache`` is the in-process counterpart for short-lived results such as web
+search hits.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "studyplanner")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    """Fold case, Unicode form, whitespace and trailing punctuation so
+    near-identical questions match."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _WHITESPACE.sub(" ", text).strip().rstrip(" .,;:!?")
+
+
+def normalize_words(text):
+    """Like ``normalize_prompt`` but with all punctuation turned into spaces,
+    for comparing the words of two texts."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL, LRU eviction and hit/miss counters."""
+
+    def __init__(self, path=None, ttl_seconds=7 * 24 * 3600, max_entries=10000):
+        if path is None:
+            cache_dir = os.getenv("STUDYPLANNER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "responses.sqlite3")
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def keys(model, template, user_input):
+        """Return the (exact, normalized) cache keys for one request."""
+        prefix = f"{model}\0{text_hash(template)}\0"
+        return (
+            text_hash(prefix + "exact\0" + user_input),
+            # "v2": entries stored under the old, punctuation-stripping form
+            # ("c++" -> "c") must not answer the new keys
+            text_hash(prefix + "normalized-v2\0" + normalize_prompt(user_input)),
+        )
+
+    def get(self, model, template, user_input):
+        """Return the cached response, or ``None`` on a miss."""
+        now = time.time()
+        with self._lock:
+            for key in self.keys(model, template, user_input):
+                row = self._conn.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                if now - row[1] > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._entries -= 1
+                    continue
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, model, template, user_input, response):
+        """Store a response under both its exact and normalized keys."""
+        now = time.time()
+        with self._lock:
+            for key in set(self.keys(model, template, user_input)):
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now)
+                ).rowcount
+                if inserted:
+                    self._entries += 1
+                else:
+                    self._conn.execute(
+                        "UPDATE responses SET response = ?, created = ?, last_used = ? WHERE key = ?",
+                        (response, now, now, key),
+                    )
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._entries = 0
+
+    def close(self):
+        self._conn.close()
+
+    def _evict(self):
+        # Drop expired rows first, then trim the least recently used tenth so
+        # eviction runs once per batch of inserts rather than on every one
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        target = int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_used LIMIT max(0, (SELECT COUNT(*) FROM responses) - ?))",
+            (target,),
+        )
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and LRU eviction."""
+
+    def __init__(self, ttl_seconds=3600, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
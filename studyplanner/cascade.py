@@ -0,0 +1,207 @@
+"""Route each request to a fast or a strong model, with failover.
+
+Greetings, clarifications and quick tips don't need the strongest model, but
+multi-week schedules and conversation summaries do. ``ModelCascade`` sits in
+front of two LangChain chat models: ``classify_tier`` picks ``FAST`` or
+``STRONG`` from the student's message, and the cascade sends the request
+there unless that model is currently unhealthy (too many recent errors, or
+its rolling median latency is over budget), in which case the other one
+serves it (an unhealthy model is still probed now and then, so it can
+recover). A call that fails on its first model is retried on the other one;
+a stream fails over only if no chunk has been yielded yet.
+
+It has the same ``invoke``/``ainvoke``/``stream``/``astream`` surface as the
+wrapped models, so it drops in wherever a chat model is used. Pass
+``query=`` when the prompt wraps the student's message in long instructions,
+so the instructions don't decide the tier.
+"""
+
+import re
+import statistics
+import threading
+import time
+from collections import deque
+
+from .memory import message_text
+
+FAST = "fast"
+STRONG = "strong"
+
+# Requests that need the strong model: plans spanning weeks, schedules, summaries
+# (plurals included: "schedules", "months", "study plans")
+STRONG_PATTERNS = re.compile(
+    r"\b(summar(y|ies|ize[sd]?|ise[sd]?)|recaps?|schedul(e|es|ed|ing)|timetables?|study plans?"
+    r"|(\d+|multi|several|few|two|three|four|six)[- ]?(weeks?|months?)|semesters?|trimesters?"
+    r"|term plans?|months?|monthly|school year|academic year|exam plans?|revision plans?"
+    r"|week[- ]by[- ]week|day[- ]by[- ]day|month[- ]by[- ]month|every day)\b",
+    re.IGNORECASE,
+)
+# Longer messages usually carry enough detail to deserve the strong model
+STRONG_MIN_WORDS = 60
+
+
+def query_text(input):
+    """The text a routing decision is based on: a string, or the last message."""
+    if isinstance(input, str):
+        return input
+    messages = list(input)
+    return message_text(messages[-1]) if messages else ""
+
+
+def classify_tier(text):
+    if STRONG_PATTERNS.search(text) or len(text.split()) >= STRONG_MIN_WORDS:
+        return STRONG
+    return FAST
+
+
+class ModelStats:
+    """Rolling latency and error rate over a model's last ``window`` calls."""
+
+    def __init__(self, window=50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(seconds)
+
+    @property
+    def calls(self):
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def p50(self):
+        with self._lock:
+            return statistics.median(self.latencies) if self.latencies else 0.0
+
+
+class ModelCascade:
+    """Fast/strong model routing with rolling health stats and failover."""
+
+    def __init__(self, fast, strong, fast_name="fast", strong_name="strong", classify=classify_tier,
+                 max_error_rate=0.5, latency_budget=None, min_calls=5, window=50, probe_seconds=30.0):
+        self.models = {FAST: fast, STRONG: strong}
+        self.names = {FAST: fast_name, STRONG: strong_name}
+        self.classify = classify
+        self.max_error_rate = max_error_rate
+        # Median seconds per call above which a model is treated as degraded
+        # (None: latency never triggers failover)
+        self.latency_budget = latency_budget
+        self.min_calls = min_calls
+        # An unhealthy model still gets one request per ``probe_seconds`` so
+        # its stats can recover once it does
+        self.probe_seconds = probe_seconds
+        self._next_probe = {FAST: 0.0, STRONG: 0.0}
+        self.stats = {FAST: ModelStats(window), STRONG: ModelStats(window)}
+        self.routed = {FAST: 0, STRONG: 0}
+        self.failovers = 0
+
+    def healthy(self, tier):
+        stats = self.stats[tier]
+        if stats.calls < self.min_calls:
+            return True
+        if stats.error_rate > self.max_error_rate:
+            return False
+        return self.latency_budget is None or stats.p50 <= self.latency_budget
+
+    def order(self, input, query=None):
+        """Tiers to try, preferred first: the classified tier unless it is unhealthy."""
+        tier = self.classify(query if query is not None else query_text(input))
+        other = STRONG if tier == FAST else FAST
+        if not self.healthy(tier) and self.healthy(other):
+            now = time.monotonic()
+            if now >= self._next_probe[tier]:
+                self._next_probe[tier] = now + self.probe_seconds
+            else:
+                tier, other = other, tier
+        self.routed[tier] += 1
+        return [tier, other]
+
+    def _attempts(self, input, query):
+        """``(tier, is_last_attempt)`` pairs: the preferred model, then the other."""
+        first, second = self.order(input, query)
+        return [(first, False), (second, True)]
+
+    def invoke(self, input, config=None, query=None, **kwargs):
+        for tier, last in self._attempts(input, query):
+            start = time.perf_counter()
+            try:
+                response = self.models[tier].invoke(input, config, **kwargs)
+            except Exception:
+                self.stats[tier].record(time.perf_counter() - start, False)
+                if last:
+                    raise
+                self.failovers += 1
+                continue
+            self.stats[tier].record(time.perf_counter() - start, True)
+            return response
+
+    async def ainvoke(self, input, config=None, query=None, **kwargs):
+        for tier, last in self._attempts(input, query):
+            start = time.perf_counter()
+            try:
+                response = await self.models[tier].ainvoke(input, config, **kwargs)
+            except Exception:
+                self.stats[tier].record(time.perf_counter() - start, False)
+                if last:
+                    raise
+                self.failovers += 1
+                continue
+            self.stats[tier].record(time.perf_counter() - start, True)
+            return response
+
+    def stream(self, input, config=None, query=None, **kwargs):
+        for tier, last in self._attempts(input, query):
+            start, started = time.perf_counter(), False
+            try:
+                for chunk in self.models[tier].stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception:
+                self.stats[tier].record(time.perf_counter() - start, False)
+                # Chunks already shown can't be taken back, so only fail over before the first
+                if last or started:
+                    raise
+                self.failovers += 1
+                continue
+            self.stats[tier].record(time.perf_counter() - start, True)
+            return
+
+    async def astream(self, input, config=None, query=None, **kwargs):
+        for tier, last in self._attempts(input, query):
+            start, started = time.perf_counter(), False
+            try:
+                async for chunk in self.models[tier].astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception:
+                self.stats[tier].record(time.perf_counter() - start, False)
+                if last or started:
+                    raise
+                self.failovers += 1
+                continue
+            self.stats[tier].record(time.perf_counter() - start, True)
+            return
+
+    def summary(self):
+        """Per-model routing counts and health, e.g. for the debug panel."""
+        return [
+            {
+                "tier": tier,
+                "model": self.names[tier],
+                "routed": self.routed[tier],
+                "calls": self.stats[tier].calls,
+                "error_rate": round(self.stats[tier].error_rate, 3),
+                "p50_ms": round(self.stats[tier].p50 * 1000, 1),
+                "healthy": self.healthy(tier),
+            }
+            for tier in (FAST, STRONG)
+        ]
@@ -0,0 +1,195 @@
+"""Clients for the planner service (``service.py``).
+
+``PlannerClient`` and ``AsyncPlannerClient`` wrap the HTTP API.
+``RemoteGraphRunner`` has the same interface as ``graph.GraphRunner`` and
+``RemoteToolPlanner`` the same as ``planner.ToolPlanner`` and
+``RemoteEscalationQueue`` the same as ``escalation.EscalationQueue``, so an app switches
+to the service without changing its rendering code; ``core`` hands them out
+when ``STUDYPLANNER_SERVICE_URL`` is set.
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from .escalation import Escalation
+from .service import decode_message, decode_values, encode_values
+
+
+def _turn_body(message, summary, summary_upto):
+    body = {"message": message}
+    if summary is not None:
+        body.update(summary=summary, summary_upto=summary_upto or 0)
+    return body
+
+
+class PlannerClient:
+    """Synchronous client; one pooled connection set per instance."""
+
+    def __init__(self, base_url, timeout=120.0):
+        self.http = httpx.Client(base_url=base_url, timeout=timeout)
+
+    def turn(self, thread_id, message, summary=None, summary_upto=None):
+        """Yield the service's events for one student turn."""
+        with self.http.stream("POST", f"/threads/{thread_id}/turns",
+                              json=_turn_body(message, summary, summary_upto)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def state(self, thread_id):
+        response = self.http.get(f"/threads/{thread_id}/state")
+        response.raise_for_status()
+        return response.json()
+
+    def update_state(self, thread_id, values):
+        response = self.http.post(f"/threads/{thread_id}/state", json={"values": values})
+        response.raise_for_status()
+        return response.json()
+
+    def human_response(self, thread_id, response, counselor="counselor"):
+        self._post(f"/threads/{thread_id}/human_response", {"response": response, "counselor": counselor})
+
+    def escalation(self, thread_id):
+        response = self.http.get(f"/threads/{thread_id}/escalation")
+        response.raise_for_status()
+        return response.json()["escalation"]
+
+    def escalation_stats(self):
+        response = self.http.get("/escalations")
+        response.raise_for_status()
+        return response.json()
+
+    def claim_escalation(self, counselor):
+        return self._post("/escalations/claim", {"counselor": counselor})["escalation"]
+
+    def answer_escalation(self, escalation_id, counselor, response):
+        return self._post(f"/escalations/{escalation_id}/answer", {"counselor": counselor, "response": response})["ok"]
+
+    def release_escalation(self, escalation_id, counselor):
+        return self._post(f"/escalations/{escalation_id}/release", {"counselor": counselor})["ok"]
+
+    def _post(self, path, body):
+        response = self.http.post(path, json=body)
+        response.raise_for_status()
+        return response.json()
+
+    def ask(self, message):
+        """Yield the ``generate_instructions`` reply as it streams."""
+        with self.http.stream("POST", "/ask", json={"message": message}) as response:
+            response.raise_for_status()
+            yield from response.iter_text()
+
+    def tool(self, tool, request):
+        response = self.http.post("/tools", json={"tool": tool, "request": request})
+        response.raise_for_status()
+        return response.json()["response"]
+
+    def close(self):
+        self.http.close()
+
+
+class AsyncPlannerClient:
+    """Async counterpart of ``PlannerClient`` (used by the load test)."""
+
+    def __init__(self, base_url, timeout=120.0, max_connections=100):
+        limits = httpx.Limits(max_connections=max_connections)
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+
+    async def turn(self, thread_id, message, summary=None, summary_upto=None):
+        async with self.http.stream("POST", f"/threads/{thread_id}/turns",
+                                    json=_turn_body(message, summary, summary_upto)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def state(self, thread_id):
+        response = await self.http.get(f"/threads/{thread_id}/state")
+        response.raise_for_status()
+        return response.json()
+
+    async def ask(self, message):
+        async with self.http.stream("POST", "/ask", json={"message": message}) as response:
+            response.raise_for_status()
+            async for text in response.aiter_text():
+                yield text
+
+    async def tool(self, tool, request):
+        response = await self.http.post("/tools", json={"tool": tool, "request": request})
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+class RemoteGraphRunner:
+    """``GraphRunner`` look-alike backed by the planner service."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def stream_turn(self, thread_id, user_input, summary="", summary_upto=0):
+        for event in self.client.turn(thread_id, user_input, summary, summary_upto):
+            if event["type"] == "token":
+                yield ("token", event["node"], event["text"])
+            elif event["type"] == "message":
+                yield ("message", event["node"], decode_message(event["message"]))
+
+    def get_state(self, thread_id):
+        return decode_values(self.client.state(thread_id))
+
+    def update_state(self, thread_id, values, as_node=None):
+        self.client.update_state(thread_id, encode_values(values))
+
+
+class RemoteEscalationQueue:
+    """``EscalationQueue`` look-alike backed by the planner service's queue."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def claim(self, counselor, lease_seconds=None):
+        escalation = self.client.claim_escalation(counselor)
+        return Escalation(**escalation) if escalation is not None else None
+
+    def answer(self, escalation_id, counselor, response):
+        return self.client.answer_escalation(escalation_id, counselor, response)
+
+    def respond(self, thread_id, response, counselor="counselor"):
+        self.client.human_response(thread_id, response, counselor)
+        return True
+
+    def release(self, escalation_id, counselor):
+        return self.client.release_escalation(escalation_id, counselor)
+
+    def open_for(self, thread_id):
+        escalation = self.client.escalation(thread_id)
+        return Escalation(**escalation) if escalation is not None else None
+
+    def stats(self):
+        return self.client.escalation_stats()
+
+
+class RemoteToolPlanner:
+    """``ToolPlanner`` look-alike backed by the planner service (which caches)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, tool, user_input):
+        return self.client.tool(tool, user_input)
+
+    def answer(self, tool, user_input):
+        # The service doesn't say whether its answer came from the cache
+        return self.submit(tool, user_input), None
+
+    async def aanswer(self, tool, user_input):
+        return await asyncio.to_thread(self.answer, tool, user_input)
+
+    async def astream(self, tool, user_input):
+        # The service answers tools in one piece; fetch it off the event loop
+        yield await asyncio.to_thread(self.submit, tool, user_input)
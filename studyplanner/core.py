@@ -0,0 +1,211 @@
+"""Process-wide clients for the Streamlit apps, built once and reused.
+
+Streamlit re-executes a script on every interaction, so anything done at
+module level (``load_dotenv``, ``genai.configure``, constructing the Gemini
+and Tavily clients, compiling the LangGraph) is repeated on every click.
+The functions here do that work on first use and cache the result for the
+life of the process, so a rerun only pays for rendering. Heavy packages
+(``langgraph``, ``langchain_community``, ``langchain_google_genai``,
+``google.generativeai``) are imported inside the functions that need them,
+which also keeps them off the startup path of scripts that never use them.
+
+Set ``STUDYPLANNER_OFFLINE=1`` to get the fakes from ``fakes.py`` instead of
+the real services, and ``STUDYPLANNER_SERVICE_URL`` to run the graph in the
+planner service (``service.py``) instead of in this process.
+"""
+
+import functools
+import os
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+# Model name that selects the fast/strong cascade (cascade.py) instead of one model
+CASCADE = "cascade"
+
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """Load ``.env`` once per process."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def env(name, default=None):
+    load_env()
+    return os.getenv(name, default)
+
+
+def offline():
+    return env("STUDYPLANNER_OFFLINE") == "1"
+
+
+def service_url():
+    return env("STUDYPLANNER_SERVICE_URL")
+
+
+@functools.lru_cache(maxsize=None)
+def get_planner_client():
+    """Client for the planner service at ``STUDYPLANNER_SERVICE_URL``."""
+    from .client import PlannerClient
+
+    return PlannerClient(service_url())
+
+
+@functools.lru_cache(maxsize=None)
+def configure_genai():
+    """``genai.configure`` with ``GOOGLE_API_KEY``, once per process."""
+    import google.generativeai as genai
+
+    genai.configure(api_key=env("GOOGLE_API_KEY"))
+    return genai
+
+
+@functools.lru_cache(maxsize=None)
+def get_generative_model(model_name=DEFAULT_MODEL):
+    """Shared, gated and instrumented ``genai.GenerativeModel``; usable as a
+    ``ChatSessionManager`` model factory."""
+    from .gateway import GatedGenerativeModel, gated_generative_model, get_gateway
+    from .instrumentation import InstrumentedGenerativeModel
+
+    if offline():
+        from .fakes import FakeGenerativeModel
+
+        fake = FakeGenerativeModel(model_name, latency=0.3, tokens_per_second=60)
+        return InstrumentedGenerativeModel(GatedGenerativeModel(fake, get_gateway()))
+    configure_genai()
+    return gated_generative_model(model_name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm(model=DEFAULT_MODEL):
+    """Shared, gated and instrumented LangChain chat model.
+
+    ``get_llm(CASCADE)`` routes between ``STUDYPLANNER_FAST_MODEL`` (default
+    ``gemini-1.5-flash``) and ``STUDYPLANNER_STRONG_MODEL`` (default ``gemini-1.5-pro``).
+    """
+    from .gateway import GatedChatModel, get_gateway, shared_chat_model
+    from .instrumentation import InstrumentedChatModel
+
+    if model == CASCADE:
+        from .cascade import ModelCascade
+
+        fast = env("STUDYPLANNER_FAST_MODEL", "gemini-1.5-flash")
+        strong = env("STUDYPLANNER_STRONG_MODEL", "gemini-1.5-pro")
+        budget = env("STUDYPLANNER_LATENCY_BUDGET")
+        return ModelCascade(get_llm(fast), get_llm(strong), fast, strong,
+                            latency_budget=float(budget) if budget else None)
+    if offline():
+        from .fakes import FakeChatModel
+
+        return InstrumentedChatModel(GatedChatModel(FakeChatModel(model=model, latency=0.3, tokens_per_second=60),
+                                                    get_gateway()))
+    return shared_chat_model(model, api_key=env("GOOGLE_API_KEY"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_packer(model=DEFAULT_MODEL):
+    """Context packer sized for ``model``; its token counts are shared by every session."""
+    from .tokens import ContextPacker
+
+    return ContextPacker.for_model(model)
+
+
+@functools.lru_cache(maxsize=None)
+def get_condenser(model=DEFAULT_MODEL):
+    """Search-result condenser; ``STUDYPLANNER_SEARCH_TOKENS`` sets its budget (default 800)."""
+    from .rerank import ResultCondenser
+
+    return ResultCondenser(int(env("STUDYPLANNER_SEARCH_TOKENS", "800")),
+                           count_tokens=get_packer(model).counter.count_text)
+
+
+@functools.lru_cache(maxsize=None)
+def get_prefix_cache():
+    """Fixed prompt prefixes registered once per process. Prefixes of at least
+    ``STUDYPLANNER_PREFIX_MIN_TOKENS`` (default 32768) use Gemini's context
+    caching; shorter ones, and every prefix offline, are sent inline."""
+    from .prefix_cache import DEFAULT_MIN_TOKENS, GeminiPrefixBackend, PrefixCache
+
+    backend = None
+    if not offline():
+        configure_genai()
+        backend = GeminiPrefixBackend()
+    return PrefixCache(backend, min_tokens=int(env("STUDYPLANNER_PREFIX_MIN_TOKENS", str(DEFAULT_MIN_TOKENS))),
+                       count_tokens=get_packer().counter.count_text)
+
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    """The conversation store every app process shares (``STUDYPLANNER_STORE``,
+    default ``conversations.sqlite3`` in the cache directory)."""
+    from .store import ConversationStore
+
+    return ConversationStore(env("STUDYPLANNER_STORE"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_conversation_index():
+    """Per-thread vector memory for recalling old turns (``STUDYPLANNER_RECALL=0`` disables it)."""
+    if env("STUDYPLANNER_RECALL", "1") == "0":
+        return None
+    from .vector_memory import ConversationIndex
+
+    return ConversationIndex()
+
+
+@functools.lru_cache(maxsize=None)
+def get_escalations():
+    """The counselor request queue (``STUDYPLANNER_ESCALATIONS``, default
+    ``escalations.sqlite3`` in the cache directory; at most
+    ``STUDYPLANNER_MAX_ESCALATIONS`` waiting, default 200), or the planner
+    service's when one is configured."""
+    if service_url():
+        from .client import RemoteEscalationQueue
+
+        return RemoteEscalationQueue(get_planner_client())
+    from .escalation import EscalationQueue
+
+    return EscalationQueue(env("STUDYPLANNER_ESCALATIONS"), max_pending=int(env("STUDYPLANNER_MAX_ESCALATIONS", "200")))
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_tool(max_results=3):
+    """Multi-query search over Tavily (or the fake search tool when offline)."""
+    from .search import MultiQuerySearch, TavilyBackend
+
+    if offline():
+        from .fakes import FakeSearchTool
+
+        return MultiQuerySearch(TavilyBackend(FakeSearchTool(max_results=max_results, latency=0.5)))
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    tool = TavilySearchResults(max_results=max_results, tavily_api_key=env("TAVILY_API_KEY"))
+    return MultiQuerySearch(TavilyBackend(tool))
+
+
+@functools.lru_cache(maxsize=None)
+def get_graph_runner(model=DEFAULT_MODEL, checkpoint_path=None):
+    """The chatbot-01 graph, compiled once with a SQLite checkpointer and run on
+    a persistent background loop, or the planner service's when one is configured.
+
+    Counselor replies posted to ``get_escalations()`` are delivered to their
+    threads by a dispatcher on the same loop.
+    """
+    if service_url():
+        from .client import RemoteGraphRunner
+
+        return RemoteGraphRunner(get_planner_client())
+    from .escalation import EscalationDispatcher
+    from .graph import GraphRunner, StudyPlannerAgent, open_checkpointer
+    from .loop import BackgroundLoop
+
+    loop = BackgroundLoop()
+    checkpointer = loop.run(open_checkpointer(checkpoint_path or env("STUDYPLANNER_CHECKPOINTS", "checkpoints.sqlite3")))
+    agent = StudyPlannerAgent(get_llm(model), get_search_tool(), packer=get_packer(model),
+                              recall=get_conversation_index(), condenser=get_condenser(model),
+                              escalations=get_escalations())
+    graph = agent.build(checkpointer=checkpointer)
+    runner = GraphRunner(graph, loop)
+    runner.dispatcher = EscalationDispatcher(get_escalations(), runner.adeliver)
+    loop.submit(runner.dispatcher.run())
+    return runner
@@ -0,0 +1,52 @@
+"""Optional sidebar panel showing where the app's time goes.
+
+Call ``render_debug_panel(run_started)`` as the last line of a Streamlit
+script, with ``run_started = time.perf_counter()`` taken at the top. It records
+the rerun itself as a ``rerun`` span and, when "Show debug panel" is ticked,
+shows per-span rolling p50/p95, token and cache-hit totals, and a latency
+histogram of the recent calls of one span. The panel is drawn in an
+``st.fragment`` when available, so its widgets rerun only the panel and not
+the app (and its model calls).
+"""
+
+import time
+
+import streamlit as st
+
+from .instrumentation import get_metrics
+
+# st.fragment (1.37+) lets the panel's widgets rerun just the panel
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+def render_debug_panel(run_started=None, metrics=None):
+    metrics = metrics or get_metrics()
+    if run_started is not None:
+        metrics.observe("rerun", "streamlit", time.perf_counter() - run_started)
+
+    # A fragment may only draw into its own container, so open it in the sidebar
+    with st.sidebar:
+        if _fragment is not None:
+            _fragment(_render_panel)(metrics)
+        else:
+            _render_panel(metrics)
+
+
+def _render_panel(metrics):
+    if not st.checkbox("Show debug panel", key="debug_panel"):
+        return
+    with st.expander("⏱️ Timing and tokens", expanded=True):
+        rows = metrics.summary()
+        if not rows:
+            st.caption("Nothing recorded yet.")
+            return
+        st.dataframe(rows, hide_index=True)
+        name = st.selectbox("Latency histogram for", [row["span"] for row in rows], key="debug_panel_span")
+        # Only needed once the panel is open, so apps don't import it on every rerun
+        import numpy as np
+
+        recent_ms = np.asarray(metrics.recent(name)) * 1000
+        counts, edges = np.histogram(recent_ms, bins=min(10, max(1, len(recent_ms))))
+        st.bar_chart({"latency_ms": [f"{edge:.1f}" for edge in edges[:-1]], "calls": counts.tolist()},
+                     x="latency_ms", y="calls")
+        st.caption(f"Last {len(recent_ms)} calls, bucketed by latency (ms, lower bound)")
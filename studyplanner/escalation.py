@@ -0,0 +1,299 @@
+"""Human-escalation queue shared by the counselors.
+
+When a student asks for a counselor, chatbot-01's ``human_assist`` node used
+to flip a flag and leave the Streamlit script waiting on a text field in the
+student's own session. Now the node puts the request on ``EscalationQueue``
+and pauses its graph thread with ``interrupt``; the pause is checkpointed, so
+no worker thread or session is held while the request waits.
+
+The queue is a SQLite table in WAL mode, so every app and service process
+(and every counselor) shares it. Counselors ``claim`` the oldest pending
+request, which leases it to them for ``lease_seconds``; a lease that runs out
+(a counselor who closed their console) puts the request back in line.
+``answer`` posts the reply, and ``EscalationDispatcher`` resumes the paused
+thread with it and then ``ack``s the request, so an answer whose delivery
+fails or whose process dies is delivered again. At most ``max_pending``
+requests wait at once; past that ``enqueue`` raises ``QueueFull`` and the
+student is told the counselors are busy, instead of the backlog growing
+without bound during a burst.
+
+A counselor console for the terminal::
+
+    python -m studyplanner.escalation --counselor alice
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from .cache import DEFAULT_CACHE_DIR
+from .instrumentation import get_metrics
+
+PENDING = "pending"        # waiting for a counselor
+CLAIMED = "claimed"        # leased to a counselor who is writing the reply
+ANSWERED = "answered"      # reply posted, not yet delivered to the student
+DELIVERING = "delivering"  # leased to a dispatcher that is resuming the thread
+DONE = "done"              # delivered and acknowledged
+OPEN = (PENDING, CLAIMED, ANSWERED, DELIVERING)
+
+
+class QueueFull(Exception):
+    """Raised by ``enqueue`` when ``max_pending`` requests are already waiting."""
+
+
+class Escalation(NamedTuple):
+    id: int
+    thread_id: str
+    question: str
+    status: str
+    counselor: Optional[str]
+    response: Optional[str]
+    created: float
+
+
+_COLUMNS = "id, thread_id, question, status, counselor, response, created"
+
+
+class EscalationQueue:
+    """Persistent work queue of student requests for a human counselor."""
+
+    def __init__(self, path=None, max_pending=200, lease_seconds=600.0, delivery_seconds=60.0):
+        if path is None:
+            cache_dir = os.getenv("STUDYPLANNER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "escalations.sqlite3")
+        self.path = path
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        # How long a dispatcher may take to resume a thread before another one retries
+        self.delivery_seconds = delivery_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS escalations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id TEXT NOT NULL, question TEXT NOT NULL, "
+            "status TEXT NOT NULL, counselor TEXT, response TEXT, lease_until REAL NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS escalations_status ON escalations (status, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS escalations_thread ON escalations (thread_id, status)")
+
+    def _transaction(self, fn):
+        # IMMEDIATE takes the write lock up front, so two processes can't
+        # claim the same request
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn, time.time())
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def enqueue(self, thread_id, question):
+        """Queue a request for ``thread_id``, or return the one it already has open.
+
+        Raises ``QueueFull`` when ``max_pending`` requests are waiting for a counselor.
+        """
+        def run(conn, now):
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM escalations WHERE thread_id = ? AND status IN (?, ?, ?, ?) "
+                "ORDER BY id LIMIT 1", (thread_id, *OPEN),
+            ).fetchone()
+            if row:
+                return Escalation(*row)
+            waiting = conn.execute(
+                "SELECT COUNT(*) FROM escalations WHERE status IN (?, ?)", (PENDING, CLAIMED)
+            ).fetchone()[0]
+            if waiting >= self.max_pending:
+                raise QueueFull(f"{waiting} requests are already waiting for a counselor")
+            cursor = conn.execute(
+                "INSERT INTO escalations (thread_id, question, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (thread_id, question, PENDING, now, now),
+            )
+            return Escalation(cursor.lastrowid, thread_id, question, PENDING, None, None, now)
+        return self._transaction(run)
+
+    def _lease(self, status, leased_status, owner, seconds, limit):
+        """Lease up to ``limit`` of the oldest ``status`` requests (or expired
+        ``leased_status`` leases) to ``owner``."""
+        def run(conn, now):
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM escalations WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY id LIMIT ?", (status, leased_status, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE escalations SET status = ?, counselor = COALESCE(?, counselor), lease_until = ?, "
+                "updated = ? WHERE id = ?",
+                [(leased_status, owner, now + seconds, now, row[0]) for row in rows],
+            )
+            return [Escalation(*row)._replace(status=leased_status, counselor=owner or row[4]) for row in rows]
+        return self._transaction(run)
+
+    def claim(self, counselor, lease_seconds=None):
+        """Lease the oldest waiting request to ``counselor``; None if there is none."""
+        claimed = self._lease(PENDING, CLAIMED, counselor, lease_seconds or self.lease_seconds, 1)
+        return claimed[0] if claimed else None
+
+    def answer(self, escalation_id, counselor, response):
+        """Post ``counselor``'s reply; False if their lease ran out and someone else has it."""
+        def run(conn, now):
+            return conn.execute(
+                "UPDATE escalations SET status = ?, response = ?, updated = ? "
+                "WHERE id = ? AND status = ? AND counselor = ?",
+                (ANSWERED, response, now, escalation_id, CLAIMED, counselor),
+            ).rowcount == 1
+        return self._transaction(run)
+
+    def respond(self, thread_id, response, counselor="counselor"):
+        """Answer ``thread_id``'s open request without claiming it first (e.g. a
+        reply posted through the service API); False if it has none."""
+        def run(conn, now):
+            return conn.execute(
+                "UPDATE escalations SET status = ?, response = ?, counselor = ?, updated = ? "
+                "WHERE thread_id = ? AND status IN (?, ?)",
+                (ANSWERED, response, counselor, now, thread_id, PENDING, CLAIMED),
+            ).rowcount > 0
+        return self._transaction(run)
+
+    def release(self, escalation_id, counselor):
+        """Give a claimed request back to the queue unanswered."""
+        def run(conn, now):
+            return conn.execute(
+                "UPDATE escalations SET status = ?, lease_until = 0, updated = ? "
+                "WHERE id = ? AND status = ? AND counselor = ?",
+                (PENDING, now, escalation_id, CLAIMED, counselor),
+            ).rowcount == 1
+        return self._transaction(run)
+
+    def deliveries(self, limit=20):
+        """Lease up to ``limit`` answered requests for delivery; ``ack`` each once delivered."""
+        # Every worker polls this; only take the write lock when something is due
+        due = self._query(
+            "SELECT 1 FROM escalations WHERE status = ? OR (status = ? AND lease_until < ?) LIMIT 1",
+            (ANSWERED, DELIVERING, time.time()),
+        )
+        if not due:
+            return []
+        return self._lease(ANSWERED, DELIVERING, None, self.delivery_seconds, limit)
+
+    def ack(self, escalation_id):
+        def run(conn, now):
+            conn.execute("UPDATE escalations SET status = ?, updated = ? WHERE id = ?", (DONE, now, escalation_id))
+        self._transaction(run)
+
+    def open_for(self, thread_id):
+        """``thread_id``'s open request, if it has one."""
+        rows = self._query(
+            f"SELECT {_COLUMNS} FROM escalations WHERE thread_id = ? AND status IN (?, ?, ?, ?) ORDER BY id LIMIT 1",
+            (thread_id, *OPEN),
+        )
+        return Escalation(*rows[0]) if rows else None
+
+    def stats(self):
+        """Request counts by status and the age in seconds of the oldest waiting one."""
+        counts = dict(self._query("SELECT status, COUNT(*) FROM escalations GROUP BY status"))
+        oldest = self._query("SELECT MIN(created) FROM escalations WHERE status = ?", (PENDING,))[0][0]
+        stats = {status: counts.get(status, 0) for status in (*OPEN, DONE)}
+        stats["oldest_pending_seconds"] = round(time.time() - oldest, 1) if oldest else 0.0
+        return stats
+
+    def close(self):
+        self._conn.close()
+
+
+class EscalationDispatcher:
+    """Polls for answered requests and hands each reply to ``deliver(thread_id, response)``.
+
+    Runs as a task on the event loop that owns the graph, so a burst of
+    replies is delivered by one coroutine rather than by waiting sessions.
+    While nothing is answered the poll interval doubles up to
+    ``max_poll_seconds``, and drops back to ``poll_seconds`` after a delivery.
+    """
+
+    def __init__(self, queue, deliver, poll_seconds=1.0, batch_size=20, max_poll_seconds=8.0):
+        self.queue = queue
+        self.deliver = deliver
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.batch_size = batch_size
+        self.delivered = 0
+        self.failed = 0
+
+    async def dispatch_once(self):
+        """Deliver the replies answered so far; returns how many were delivered."""
+        delivered = 0
+        for escalation in await asyncio.to_thread(self.queue.deliveries, self.batch_size):
+            try:
+                with get_metrics().span("escalation_delivery", "call", thread=escalation.thread_id):
+                    await self.deliver(escalation.thread_id, escalation.response)
+            except Exception:
+                # Left leased; it is retried once the delivery lease runs out
+                self.failed += 1
+                continue
+            await asyncio.to_thread(self.queue.ack, escalation.id)
+            delivered += 1
+        self.delivered += delivered
+        return delivered
+
+    async def run(self):
+        delay = self.poll_seconds
+        while True:
+            # Keep draining while a burst of replies is coming in
+            if await self.dispatch_once():
+                delay = self.poll_seconds
+                continue
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_seconds)
+
+
+def console(queue, counselor):
+    """Claim requests one at a time and type replies; an empty reply releases it."""
+    while True:
+        escalation = queue.claim(counselor)
+        if escalation is None:
+            print(f"No students waiting ({queue.stats()['pending']} pending). Checking again in 5s; Ctrl-C to quit.")
+            time.sleep(5)
+            continue
+        print(f"\n[{escalation.id}] thread {escalation.thread_id}\nStudent: {escalation.question}")
+        try:
+            reply = input("Reply (empty to put it back): ").strip()
+        except (EOFError, KeyboardInterrupt):
+            queue.release(escalation.id, counselor)
+            return
+        if not reply:
+            queue.release(escalation.id, counselor)
+        elif not queue.answer(escalation.id, counselor, reply):
+            print("Your claim expired and another counselor took this request.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer students waiting for a counselor.")
+    parser.add_argument("--counselor", required=True, help="your name, recorded with each reply")
+    parser.add_argument("--path", default=os.getenv("STUDYPLANNER_ESCALATIONS"), help="queue database")
+    parser.add_argument("--stats", action="store_true", help="print queue counts and exit")
+    args = parser.parse_args(argv)
+
+    queue = EscalationQueue(args.path)
+    if args.stats:
+        print(queue.stats())
+        return
+    try:
+        console(queue, args.counselor)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Offline stand-ins for Gemini and Tavily.
+
+``FakeChatModel`` replaces ``ChatGoogleGenerativeAI``, ``FakeGenerativeModel``
+and ``FakeChatSession`` replace ``genai.GenerativeModel``/``ChatSession``, and
+``FakeSearchTool`` replaces ``TavilySearchResults``. Each one can be given a
+first-token latency, a token rate and a failure rate, so apps, benchmarks and
+load tests can run without API keys or quota.
+"""
+
+import asyncio
+import hashlib
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TIPS = [
+    "Break each subject into short 25-minute sessions with 5-minute breaks.",
+    "Review yesterday's notes for ten minutes before starting something new.",
+    "Put the hardest subject at the time of day you feel most focused.",
+    "Test yourself with practice questions instead of only re-reading.",
+    "Plan one lighter day each week to catch up and rest.",
+    "Write down three goals before each study session.",
+]
+
+
+class FakeServiceError(Exception):
+    """Injected failure carrying an HTTP-like status ``code`` (429 or 503)."""
+
+    def __init__(self, code):
+        super().__init__(f"fake backend error {code}")
+        self.code = code
+
+
+def fake_reply(prompt, words=60):
+    """Deterministic study-planner style reply for ``prompt``."""
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    parts = ["Here is a plan that should help."]
+    while sum(len(p.split()) for p in parts) < words:
+        parts.append(rng.choice(_TIPS))
+    # Keep the app's "human assistance" routing exercisable offline
+    if "human assistance" in prompt.lower():
+        parts.append("This needs human assistance from a counselor.")
+    return " ".join(parts)
+
+
+class FakeBehavior:
+    """Latency, token rate and failure injection shared by the fakes."""
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+
+    def maybe_fail(self):
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise FakeServiceError(self._rng.choice([429, 503]))
+
+    def token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def total_delay(self, tokens):
+        return self.latency + self.token_delay() * len(tokens)
+
+
+def _tokens(text):
+    # Whitespace-preserving split, one "token" per word
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + [words[-1]]
+
+
+def _prompt_text(messages):
+    return "\n".join(str(getattr(m, "content", m)) for m in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """Drop-in for ``ChatGoogleGenerativeAI`` (invoke/ainvoke/stream/astream)."""
+
+    model: str = "fake-gemini"
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    failure_rate: float = 0.0
+    reply_words: int = 60
+    seed: Optional[int] = None
+    behavior: Any = None
+
+    def model_post_init(self, __context):
+        self.behavior = FakeBehavior(self.latency, self.tokens_per_second, self.failure_rate, self.seed)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _reply(self, messages):
+        self.behavior.maybe_fail()
+        return fake_reply(_prompt_text(messages), self.reply_words)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        time.sleep(self.behavior.total_delay(_tokens(reply)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        await asyncio.sleep(self.behavior.total_delay(_tokens(reply)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        time.sleep(self.behavior.latency)
+        for token in _tokens(reply):
+            time.sleep(self.behavior.token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        await asyncio.sleep(self.behavior.latency)
+        for token in _tokens(reply):
+            await asyncio.sleep(self.behavior.token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def _content(role, text):
+    # Mirrors the shape of google.generativeai's Content protos
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)])
+
+
+def _to_content(item):
+    if isinstance(item, dict):
+        parts = item.get("parts", "")
+        text = parts if isinstance(parts, str) else " ".join(str(p) for p in parts)
+        return _content(item.get("role", "user"), text)
+    return item
+
+
+class FakeResponse:
+    """Stands in for ``GenerateContentResponse``; iterate it when streamed."""
+
+    def __init__(self, text, chunks=None, on_done=None):
+        self.text = text
+        self._chunks = chunks
+        self._on_done = on_done
+
+    def __iter__(self):
+        for piece in self._chunks or [self.text]:
+            yield SimpleNamespace(text=piece)
+        if self._on_done is not None:
+            self._on_done()
+            self._on_done = None
+
+
+class FakeChatSession:
+    """Drop-in for ``genai.ChatSession``."""
+
+    def __init__(self, model, history=None):
+        self.model = model
+        self._history = [_to_content(item) for item in history or []]
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = [_to_content(item) for item in history]
+
+    def send_message(self, content, stream=False):
+        behavior = self.model.behavior
+        behavior.maybe_fail()
+        prompt = "\n".join(c.parts[0].text for c in self._history) + "\n" + content
+        reply = fake_reply(prompt, self.model.reply_words)
+        tokens = _tokens(reply)
+
+        def record():
+            self._history += [_content("user", content), _content("model", reply)]
+
+        if not stream:
+            time.sleep(behavior.total_delay(tokens))
+            record()
+            return FakeResponse(reply)
+
+        def chunks():
+            time.sleep(behavior.latency)
+            for token in tokens:
+                time.sleep(behavior.token_delay())
+                yield token
+
+        return FakeResponse(reply, chunks(), on_done=record)
+
+
+class FakeGenerativeModel:
+    """Drop-in for ``genai.GenerativeModel``."""
+
+    def __init__(self, model_name="fake-gemini", latency=0.0, tokens_per_second=0.0,
+                 failure_rate=0.0, reply_words=60, seed=None):
+        self.model_name = model_name
+        self.reply_words = reply_words
+        self.behavior = FakeBehavior(latency, tokens_per_second, failure_rate, seed)
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    def generate_content(self, prompt):
+        self.behavior.maybe_fail()
+        reply = fake_reply(str(prompt), self.reply_words)
+        time.sleep(self.behavior.total_delay(_tokens(reply)))
+        return FakeResponse(reply)
+
+
+class FakeSearchTool:
+    """Drop-in for ``TavilySearchResults`` returning synthetic study resources."""
+
+    def __init__(self, max_results=3, latency=0.0, failure_rate=0.0, seed=None):
+        self.max_results = max_results
+        self.behavior = FakeBehavior(latency, 0.0, failure_rate, seed)
+
+    def _results(self, query):
+        self.behavior.maybe_fail()
+        slug = "-".join(query.lower().split())[:60] or "study"
+        return [
+            {
+                "url": f"https://example.org/{slug}/{i}",
+                "content": f"Resource {i + 1} about {query}. " + fake_reply(f"{query} {i}", 40),
+            }
+            for i in range(self.max_results)
+        ]
+
+    def invoke(self, query):
+        results = self._results(query)
+        time.sleep(self.behavior.latency)
+        return results
+
+    async def ainvoke(self, query):
+        results = self._results(query)
+        await asyncio.sleep(self.behavior.latency)
+        return results
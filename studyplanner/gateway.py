@@ -0,0 +1,373 @@
+"""One process-wide gateway for every Gemini call.
+
+Each app used to call Gemini directly, with no retry, so concurrent sessions
+asking the same thing each paid for their own call and a burst of traffic
+ran straight into quota errors. ``LLMGateway`` puts every call behind:
+
+- a token bucket sized to the per-minute quota,
+- a bounded number of calls in flight,
+- jittered exponential backoff on 429/5xx errors, and
+- singleflight coalescing: identical prompts already in flight share one call.
+
+``GatedChatModel`` (LangChain chat models) and ``GatedGenerativeModel``
+(``genai.GenerativeModel`` and its chat sessions) wrap a client so existing
+code keeps calling ``invoke``/``stream``/``send_message`` as before.
+``shared_chat_model`` and ``gated_generative_model`` hand out one wrapped
+client per model and process, so Streamlit reruns and sessions reuse the same
+connection pool instead of building a client each time. Those clients are
+also instrumented, so their spans include time spent queued or retrying.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+from .cache import text_hash
+from .instrumentation import InstrumentedChatModel, InstrumentedGenerativeModel
+
+# HTTP statuses worth retrying, and the google.api_core / HTTP client
+# exception names that carry them without a numeric code
+RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+RETRYABLE_ERRORS = frozenset({
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "RateLimitError",
+})
+
+
+def status_code(exc):
+    """The HTTP status carried by ``exc``, if any."""
+    for attribute in ("code", "status_code"):
+        value = getattr(exc, attribute, None)
+        # grpc errors expose code() as a method; those are matched by name instead
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc):
+    return status_code(exc) in RETRYABLE_CODES or type(exc).__name__ in RETRYABLE_ERRORS
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``reserve`` returns how long to wait for a token."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going negative queues callers up behind each other
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def aacquire(self):
+        await asyncio.sleep(self.reserve())
+
+
+class SingleFlight:
+    """Share one in-flight call among callers asking for the same key."""
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key, coro_fn):
+        # Only touched from event-loop threads; the key includes the loop so
+        # futures never cross loops
+        key = (id(asyncio.get_running_loop()), key)
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield so a cancelled follower does not cancel the leader's call
+            return await asyncio.shield(future)
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark it retrieved so an uncoalesced failure is not logged twice
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+
+
+class LLMGateway:
+    """Rate limit, concurrency cap, retry and coalescing around LLM calls.
+
+    ``max_concurrency`` bounds calls in flight from threads, and separately
+    from each event loop.
+    """
+
+    def __init__(self, requests_per_minute=60, burst=None, max_concurrency=8, max_retries=4,
+                 base_delay=1.0, max_delay=30.0):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst or max(1, requests_per_minute // 6))
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.singleflight = SingleFlight()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self.calls = 0
+        self.retries = 0
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for retry number ``attempt`` (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _async_slot(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_slots:
+            self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._async_slots[loop]
+
+    def _should_retry(self, exc, attempt):
+        if attempt >= self.max_retries or not is_retryable(exc):
+            return False
+        self.retries += 1
+        return True
+
+    def call(self, fn, key=None):
+        """Run ``fn()`` through the gateway; calls with the same ``key`` coalesce."""
+        if key is None:
+            return self._call(fn)
+        return self.singleflight.do(key, lambda: self._call(fn))
+
+    def _call(self, fn):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                with self._slots:
+                    self.calls += 1
+                    return fn()
+            except Exception as exc:
+                if not self._should_retry(exc, attempt):
+                    raise
+            time.sleep(self.backoff(attempt))
+
+    async def acall(self, coro_fn, key=None):
+        """Async ``call``: ``coro_fn()`` returns the coroutine to await."""
+        if key is None:
+            return await self._acall(coro_fn)
+        return await self.singleflight.ado(key, lambda: self._acall(coro_fn))
+
+    async def _acall(self, coro_fn):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.aacquire()
+            try:
+                async with self._async_slot():
+                    self.calls += 1
+                    return await coro_fn()
+            except Exception as exc:
+                if not self._should_retry(exc, attempt):
+                    raise
+            await asyncio.sleep(self.backoff(attempt))
+
+    def stream(self, make_stream):
+        """Iterate ``make_stream()``; retried only until the first chunk arrives."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self._slots:
+                self.calls += 1
+                chunks = iter(make_stream())
+                try:
+                    first = next(chunks)
+                except StopIteration:
+                    return
+                except Exception as exc:
+                    if not self._should_retry(exc, attempt):
+                        raise
+                else:
+                    yield first
+                    yield from chunks
+                    return
+            time.sleep(self.backoff(attempt))
+
+    async def astream(self, make_stream):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.aacquire()
+            async with self._async_slot():
+                self.calls += 1
+                chunks = make_stream().__aiter__()
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as exc:
+                    if not self._should_retry(exc, attempt):
+                        raise
+                else:
+                    yield first
+                    async for chunk in chunks:
+                        yield chunk
+                    return
+            await asyncio.sleep(self.backoff(attempt))
+
+    def stats(self):
+        return {"calls": self.calls, "retries": self.retries, "coalesced": self.singleflight.coalesced}
+
+
+def prompt_key(model, prompt, config=None, **kwargs):
+    """Coalescing key for a prompt (a string or a list of messages) and the
+    call options that can change the answer (e.g. ``cached_content``)."""
+    if isinstance(prompt, str):
+        text = prompt
+    else:
+        text = "\n".join(f"{getattr(m, 'type', '')}:{getattr(m, 'content', m)}" for m in prompt)
+    # Callbacks, tags and run names don't change the answer; configurable fields may
+    options = dict(kwargs, configurable=(config or {}).get("configurable"))
+    return text_hash(f"{model}\n{json.dumps(options, sort_keys=True, default=repr)}\n{text}")
+
+
+class GatedChatModel:
+    """A LangChain chat model whose calls go through an ``LLMGateway``.
+
+    Callbacks ride along in the caller's context, so LangGraph still sees the
+    streamed tokens of a gated ``ainvoke``.
+    """
+
+    def __init__(self, llm, gateway):
+        self.llm = llm
+        self.gateway = gateway
+        self.model = getattr(llm, "model", type(llm).__name__)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.gateway.call(
+            lambda: self.llm.invoke(input, config, **kwargs), key=prompt_key(self.model, input, config, **kwargs)
+        )
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.gateway.acall(
+            lambda: self.llm.ainvoke(input, config, **kwargs), key=prompt_key(self.model, input, config, **kwargs)
+        )
+
+    def stream(self, input, config=None, **kwargs):
+        return self.gateway.stream(lambda: self.llm.stream(input, config, **kwargs))
+
+    def astream(self, input, config=None, **kwargs):
+        return self.gateway.astream(lambda: self.llm.astream(input, config, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+class GatedChatSession:
+    """A ``genai.ChatSession`` whose ``send_message`` goes through the gateway.
+
+    Chat turns depend on the session's history, so they are never coalesced.
+    """
+
+    def __init__(self, chat, gateway):
+        self.chat = chat
+        self.gateway = gateway
+
+    @property
+    def history(self):
+        return self.chat.history
+
+    @history.setter
+    def history(self, history):
+        self.chat.history = history
+
+    def send_message(self, content, stream=False, **kwargs):
+        return self.gateway.call(lambda: self.chat.send_message(content, stream=stream, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.chat, name)
+
+
+class GatedGenerativeModel:
+    """A ``genai.GenerativeModel`` whose chats and ``generate_content`` are gated."""
+
+    def __init__(self, model, gateway):
+        self.model = model
+        self.gateway = gateway
+
+    def start_chat(self, history=None, **kwargs):
+        return GatedChatSession(self.model.start_chat(history=history, **kwargs), self.gateway)
+
+    def generate_content(self, prompt, **kwargs):
+        key = prompt_key(getattr(self.model, "model_name", ""), str(prompt)) if not kwargs else None
+        return self.gateway.call(lambda: self.model.generate_content(prompt, **kwargs), key=key)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_gateway():
+    """The process-wide gateway, sized from ``STUDYPLANNER_RPM`` and
+    ``STUDYPLANNER_MAX_CONCURRENCY``."""
+    return LLMGateway(
+        requests_per_minute=int(os.getenv("STUDYPLANNER_RPM", "60")),
+        max_concurrency=int(os.getenv("STUDYPLANNER_MAX_CONCURRENCY", "8")),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def shared_chat_model(model, **kwargs):
+    """One gated ``ChatGoogleGenerativeAI`` client per model and settings.
+
+    The gateway does the retrying, so the client's own retries are off unless
+    ``max_retries`` is passed; otherwise the two multiply during a 429 storm.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    kwargs = {"max_retries": 0, **kwargs}
+    return InstrumentedChatModel(GatedChatModel(ChatGoogleGenerativeAI(model=model, **kwargs), get_gateway()))
+
+
+@functools.lru_cache(maxsize=None)
+def gated_generative_model(model_name):
+    """One gated ``genai.GenerativeModel`` per model; usable as a
+    ``ChatSessionManager`` model factory."""
+    import google.generativeai as genai
+
+    return InstrumentedGenerativeModel(GatedGenerativeModel(genai.GenerativeModel(model_name), get_gateway()))
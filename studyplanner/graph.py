@@ -0,0 +1,337 @@
+"""The chatbot-01 LangGraph pipeline and an async runner for it.
+
+``StudyPlannerAgent`` holds the graph nodes (``ai_agent``, ``search_online``,
+``human_assist``) and ``route_logic``. ``GraphRunner`` drives the compiled
+graph with ``astream`` on a ``BackgroundLoop`` and keeps per-thread state in a
+checkpointer, so a Streamlit rerun reads the conversation back from the
+checkpoint instead of rebuilding it from ``st.session_state``.
+
+With an ``escalation.EscalationQueue``, ``human_assist`` queues the request
+for a counselor and pauses the thread with ``interrupt``; ``GraphRunner.adeliver``
+resumes it with the counselor's reply.
+"""
+
+import asyncio
+from typing import Annotated, TypedDict
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.types import Command, interrupt
+
+from .escalation import QueueFull
+from .instrumentation import get_metrics
+from .intent import HUMAN, SEARCH, SUMMARY, default_router
+from .rerank import ResultCondenser
+from .tokens import ContextPacker
+from .vector_memory import format_recall
+
+HANDOFF_MESSAGE = "I've asked a human counselor to help with this. They will reply here shortly."
+BUSY_MESSAGE = ("All of our counselors are busy right now, so I couldn't pass this on. "
+                "Please ask for a counselor again in a little while.")
+
+
+# Define State for LangGraph
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+    human_requested: bool
+    human_response_ready: bool
+    human_response: str
+    search_requested: bool
+    # Intent label the router picked for the latest student message
+    intent: str
+    # Running summary of older turns and how many messages it covers
+    summary: str
+    summary_upto: int
+
+
+def last_user_message(messages):
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.content
+    return ""
+
+
+def counselor_update(response):
+    """State update that adds a counselor's reply and clears the request."""
+    return {
+        "messages": [AIMessage(content=response, name="counselor")],
+        "human_response": response,
+        "human_response_ready": False,
+        "human_requested": False,
+    }
+
+
+def window_start(state, recent_messages=None):
+    """Index of the first message sent verbatim: after the summarized turns and,
+    with ``recent_messages``, no further back than that many messages."""
+    start = state.get("summary_upto") or 0
+    if recent_messages is not None:
+        start = max(start, len(state["messages"]) - recent_messages)
+    return start
+
+
+def prompt_window(state, packer=None, followup=None, recalled=None, start=None):
+    """Messages for the LLM: the running summary, then the turns it does not cover.
+
+    With a ``packer`` the turns are trimmed to the model's window (the summary
+    and any ``recalled`` message are pinned); ``followup`` is appended as the
+    newest message. ``start`` overrides where the verbatim turns begin.
+    """
+    pinned = []
+    if state.get("summary"):
+        pinned.append(HumanMessage(content=f"Summary of our earlier conversation: {state['summary']}"))
+    if recalled is not None:
+        pinned.append(recalled)
+    history = state["messages"][window_start(state) if start is None else start:]
+    if followup is not None:
+        history = history + [followup]
+    if packer is not None:
+        messages = packer.pack(history, pinned=pinned).messages
+    else:
+        messages = pinned + history
+    # Search results were not produced by a model tool call, so pass them as text
+    return [
+        HumanMessage(content=f"Search results:\n{m.content}") if isinstance(m, ToolMessage) else m
+        for m in messages
+    ]
+
+
+class StudyPlannerAgent:
+    """Graph nodes and routing for the study planner."""
+
+    def __init__(self, llm, search_tool, router=None, metrics=None, packer=None,
+                 recall=None, recall_k=4, recent_messages=12, condenser=None, escalations=None):
+        self.llm = llm
+        self.search_tool = search_tool
+        self.router = router or default_router()
+        self.metrics = metrics or get_metrics()
+        self.packer = packer or ContextPacker()
+        # With a vector_memory.ConversationIndex, only the last ``recent_messages``
+        # go in verbatim and the ``recall_k`` most relevant older turns are recalled
+        self.recall = recall
+        self.recall_k = recall_k
+        self.recent_messages = recent_messages
+        # Ranks and trims search results so raw page content doesn't flood the prompt
+        self.condenser = condenser or ResultCondenser()
+        # Without a queue, human_assist only sets ``human_response_ready`` and
+        # the app collects the reply itself
+        self.escalations = escalations
+
+    async def context(self, state, config, query, followup=None):
+        """Prompt for ``query``: summary, recalled older turns, then recent turns."""
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        if self.recall is None or thread_id is None:
+            return prompt_window(state, self.packer, followup)
+        start = window_start(state, self.recent_messages)
+        memory = self.recall.for_thread(thread_id)
+        with self.metrics.span("recall", "memory") as span:
+            # Indexing and search take a file lock and do file IO; keep them off the event loop
+            hits = await asyncio.to_thread(self._recall, memory, state["messages"], query, start)
+            span.attrs["recalled"] = len(hits)
+        recalled = HumanMessage(content=format_recall(hits)) if hits else None
+        return prompt_window(state, self.packer, followup, recalled, start)
+
+    def _recall(self, memory, messages, query, before):
+        memory.add_messages(messages)
+        return memory.search(query, self.recall_k, before=before)
+
+    async def ai_agent(self, state: State, config: RunnableConfig = None):
+        """Handles student queries and determines if human help or search is needed."""
+        last = state["messages"][-1]
+
+        # Coming back from a search: answer the question using the results
+        if isinstance(last, ToolMessage):
+            question = last_user_message(state["messages"])
+            prompt = await self.context(state, config, question, HumanMessage(
+                content=f"Using the search results above, answer the student's question: {question}"
+            ))
+            response = await self.llm.ainvoke(prompt)
+            return {"messages": [AIMessage(content=response.content)]}
+
+        # Route locally before spending a model call
+        intent = self.router.classify(last.content)
+
+        # Straight to a counselor, no model call needed
+        if intent.label == HUMAN:
+            return {
+                "messages": [AIMessage(content=HANDOFF_MESSAGE)],
+                "human_requested": True,
+                "intent": HUMAN,
+            }
+
+        # If the user wants an online search, trigger it
+        if intent.label == SEARCH:
+            return {"search_requested": True, "intent": SEARCH}
+
+        # If the user asks for a summary, build it from the running summary
+        # plus the turns that have not been folded into it yet
+        if intent.label == SUMMARY:
+            recent = state["messages"][state.get("summary_upto") or 0:-1]
+            chat_history_text = "\n".join(f"{msg.type}: {msg.content}" for msg in recent)
+            summary_prompt = (
+                f"Summarize this conversation history:\n\nEarlier conversation (already summarized):\n"
+                f"{state.get('summary') or '(nothing yet)'}\n\nRecent messages:\n{chat_history_text}"
+            )
+            response = await self.llm.ainvoke([HumanMessage(content=summary_prompt)])
+            return {"messages": [AIMessage(content=response.content)], "intent": SUMMARY}
+
+        # Otherwise, continue with normal AI response
+        response = await self.llm.ainvoke(await self.context(state, config, last.content))
+        update = {"messages": [AIMessage(content=response.content)], "intent": intent.label}
+        # The router was unsure, so let the model's reply decide on a handoff
+        if intent.source == "llm" and "human assistance" in response.content.lower():
+            update["human_requested"] = True
+        return update
+
+    async def search_online(self, state: State):
+        """Fetches search results using Tavily API."""
+        search_query = last_user_message(state["messages"])
+        results = await self.search_tool.ainvoke(search_query)
+
+        content = self.condenser.condense(search_query, results) if results else ""
+        if not content:
+            content = "No relevant search results found."
+        search_response = ToolMessage(content=content, tool_call_id="search_tool_1", name="Tavily_Search")
+        return {"messages": [search_response], "search_requested": False}
+
+    async def human_assist(self, state: State, config: RunnableConfig = None):
+        """Queues the request for a counselor and pauses until one replies."""
+        if self.escalations is None:
+            return {"human_response_ready": True}
+        thread_id = config["configurable"]["thread_id"]
+        question = last_user_message(state["messages"])
+        try:
+            # On resume this node runs again; enqueue returns the open request
+            # instead of adding a second one
+            await asyncio.to_thread(self.escalations.enqueue, thread_id, question)
+        except QueueFull:
+            return {"messages": [AIMessage(content=BUSY_MESSAGE)], "human_requested": False}
+        # Checkpoints the thread and ends this run; Command(resume=reply) continues here
+        response = interrupt({"question": question})
+        return counselor_update(response)
+
+    def route_logic(self, state: State):
+        if state.get("human_requested"):
+            return "human_assist"
+        if state.get("search_requested"):
+            return "search"
+        return END
+
+    def build(self, checkpointer=None):
+        """Compile the graph, optionally with a checkpointer for per-thread state."""
+        graph_builder = StateGraph(State)
+        # Each node's wall time is recorded as a span named after the method
+        graph_builder.add_node("ai_agent", self.metrics.wrap_node("ai_agent", self.ai_agent))
+        graph_builder.add_node("search", self.metrics.wrap_node("search_online", self.search_online))
+        graph_builder.add_node("human_assist", self.metrics.wrap_node("human_assist", self.human_assist))
+        graph_builder.add_conditional_edges(
+            "ai_agent", self.route_logic, {"human_assist": "human_assist", "search": "search", END: END}
+        )
+        graph_builder.add_edge(START, "ai_agent")
+        graph_builder.add_edge("search", "ai_agent")
+        graph_builder.add_edge("human_assist", END)
+        return graph_builder.compile(checkpointer=checkpointer)
+
+
+async def open_checkpointer(path):
+    """Open an async SQLite checkpointer; call it on the loop that will use it."""
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    conn = await aiosqlite.connect(path)
+    checkpointer = AsyncSqliteSaver(conn)
+    await checkpointer.setup()
+    return checkpointer
+
+
+class GraphRunner:
+    """Runs a compiled, checkpointed graph on a persistent event loop.
+
+    The ``a``-prefixed methods are the async API for callers already on an
+    event loop (the planner service); the others drive ``loop`` from sync code.
+    """
+
+    def __init__(self, graph, loop=None):
+        self.graph = graph
+        self.loop = loop
+        # The escalation.EscalationDispatcher delivering counselor replies, if any
+        self.dispatcher = None
+
+    @staticmethod
+    def config(thread_id):
+        return {"configurable": {"thread_id": thread_id}}
+
+    def stream_turn(self, thread_id, user_input, summary="", summary_upto=0):
+        """Run one student turn, yielding ``("token", node, text)`` while the model
+        streams and ``("message", node, message)`` for every message a node adds."""
+        return self.loop.iterate(self.astream_turn(thread_id, user_input, summary, summary_upto))
+
+    async def astream_turn(self, thread_id, user_input, summary="", summary_upto=0):
+        inputs = {
+            "messages": [HumanMessage(content=user_input)],
+            "human_requested": False,
+            "human_response_ready": False,
+            "search_requested": False,
+            "summary": summary,
+            "summary_upto": summary_upto,
+        }
+        async for event in self._astream(thread_id, inputs):
+            yield event
+
+    async def _astream(self, thread_id, inputs):
+        stream = self.graph.astream(inputs, self.config(thread_id), stream_mode=["messages", "updates"])
+        async for mode, chunk in stream:
+            if mode == "messages":
+                message, metadata = chunk
+                if isinstance(message, AIMessageChunk) and isinstance(message.content, str) and message.content:
+                    yield ("token", metadata.get("langgraph_node"), message.content)
+            else:
+                for node, update in chunk.items():
+                    # ``__interrupt__`` carries a tuple of Interrupts, not a state update
+                    if not isinstance(update, dict):
+                        continue
+                    for message in update.get("messages", []):
+                        yield ("message", node, message)
+
+    def get_state(self, thread_id):
+        """Checkpointed state values for ``thread_id`` (empty for a new thread)."""
+        return self.loop.run(self.aget_state(thread_id))
+
+    async def aget_state(self, thread_id):
+        snapshot = await self.graph.aget_state(self.config(thread_id))
+        return snapshot.values
+
+    def update_state(self, thread_id, values, as_node=None):
+        self.loop.run(self.aupdate_state(thread_id, values, as_node))
+
+    async def aupdate_state(self, thread_id, values, as_node=None):
+        await self.graph.aupdate_state(self.config(thread_id), values, as_node=as_node)
+
+    def pending_question(self, thread_id):
+        return self.loop.run(self.apending_question(thread_id))
+
+    async def apending_question(self, thread_id):
+        """The question ``thread_id`` is paused on for a counselor, or None."""
+        snapshot = await self.graph.aget_state(self.config(thread_id))
+        for task in snapshot.tasks:
+            for pending in task.interrupts:
+                return pending.value.get("question", "")
+        return None
+
+    def deliver(self, thread_id, response):
+        self.loop.run(self.adeliver(thread_id, response))
+
+    async def adeliver(self, thread_id, response):
+        """Hand a counselor's reply to ``thread_id``.
+
+        A thread still paused in ``human_assist`` is resumed with it. If the
+        student has sent another message since (which starts a new run and
+        drops the pause), the reply is appended to the conversation instead.
+        """
+        if await self.apending_question(thread_id) is None:
+            await self.aupdate_state(thread_id, counselor_update(response))
+            return
+        async for _ in self._astream(thread_id, Command(resume=response)):
+            pass
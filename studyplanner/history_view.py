@@ -0,0 +1,89 @@
+"""Incremental, paginated chat-history pane for the Streamlit apps.
+
+Drawing every message with its own ``st.markdown``/``st.write`` call on every
+rerun makes long sessions slower with each turn. ``HistoryView`` formats each
+message once (the formatted fragments are cached in ``st.session_state`` and
+only new messages are formatted on later reruns), shows only the newest
+``page_size`` messages as a single markdown element, and loads older pages on
+demand. When Streamlit supports fragments, paging reruns only the pane.
+``render_conversation`` does the same for a conversation in a
+``store.ConversationStore``, reading only the messages on screen.
+"""
+
+import streamlit as st
+
+# st.fragment (1.37+) lets the "older messages" button rerun just the pane
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+class HistoryView:
+    """Render a growing message list a window at a time."""
+
+    def __init__(self, key, format_message, page_size=20):
+        self.key = key
+        self.format_message = format_message
+        self.page_size = page_size
+
+    def _state(self):
+        if self.key not in st.session_state:
+            st.session_state[self.key] = {"rendered": [], "pages": 1}
+        return st.session_state[self.key]
+
+    def _show_older(self):
+        self._state()["pages"] += 1
+
+    def render(self, messages):
+        """Draw the newest messages; safe to call on every rerun."""
+        if _fragment is not None:
+            _fragment(self._render)(messages)
+        else:
+            self._render(messages)
+
+    def _render(self, messages):
+        state = self._state()
+        rendered = state["rendered"]
+        # A shorter list means the history was replaced (e.g. a new chat)
+        if len(messages) < len(rendered):
+            rendered.clear()
+            state["pages"] = 1
+        rendered.extend(self.format_message(message) for message in messages[len(rendered):])
+
+        start = max(0, len(rendered) - self.page_size * state["pages"])
+        if start:
+            st.button(
+                f"Show {min(self.page_size, start)} older messages",
+                key=f"{self.key}_older",
+                on_click=self._show_older,
+            )
+        if rendered:
+            st.markdown("\n\n".join(rendered[start:]))
+
+    def render_conversation(self, store, conversation_id):
+        """Draw the newest messages of a stored conversation; ``format_message``
+        receives ``store.Turn`` tuples."""
+        if _fragment is not None:
+            _fragment(self._render_conversation)(store, conversation_id)
+        else:
+            self._render_conversation(store, conversation_id)
+
+    def _render_conversation(self, store, conversation_id):
+        state = self._state()
+        if state.get("conversation") != conversation_id:
+            state.update(conversation=conversation_id, by_seq={}, pages=1)
+        by_seq = state["by_seq"]
+        turns = store.tail(conversation_id, self.page_size * state["pages"])
+        fragments = []
+        for turn in turns:
+            if turn.seq not in by_seq:
+                by_seq[turn.seq] = self.format_message(turn)
+            fragments.append(by_seq[turn.seq])
+
+        # Sequence numbers start at 0, so a later first one means older messages exist
+        if turns and turns[0].seq > 0:
+            st.button(
+                f"Show {min(self.page_size, turns[0].seq)} older messages",
+                key=f"{self.key}_older",
+                on_click=self._show_older,
+            )
+        if fragments:
+            st.markdown("\n\n".join(fragments))
@@ -0,0 +1,345 @@
+"""Timing and token instrumentation for graph nodes and model calls.
+
+Every instrumented piece of work is a span with a name (``ai_agent``,
+``search_online``, ``llm.invoke``, ``chat.send_message``, ``rerun``...), a
+kind, its wall time, prompt/completion token counts and whether it was served
+from a cache. ``Metrics`` keeps a rolling window per span name for the
+Streamlit debug panel, cumulative Prometheus histograms and counters, and can
+append every span to a JSON-lines trace file.
+
+The process-wide ``get_metrics()`` is configured from the environment:
+
+- ``STUDYPLANNER_TRACE``: path of a JSON-lines trace file to append spans to;
+- ``STUDYPLANNER_METRICS_PORT``: serve ``/metrics`` in the Prometheus text
+  format on this port.
+
+Token counts come from the provider's usage metadata when it is present and
+fall back to ``memory.estimate_tokens``.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .memory import estimate_tokens
+from .streaming import chunk_text
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket bounds in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Span:
+    """One timed unit of work; fill in tokens and cache hits while it runs."""
+
+    __slots__ = ("name", "kind", "started", "seconds", "prompt_tokens", "completion_tokens",
+                 "cache_hit", "error", "attrs")
+
+    def __init__(self, name, kind, **attrs):
+        self.name = name
+        self.kind = kind
+        self.started = time.time()
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hit = False
+        self.error = None
+        self.attrs = attrs
+
+    def to_dict(self):
+        record = {slot: getattr(self, slot) for slot in self.__slots__ if slot != "attrs"}
+        record.update(self.attrs)
+        return record
+
+
+class Metrics:
+    """Rolling windows, Prometheus aggregates and an optional JSONL trace."""
+
+    def __init__(self, trace_path=None, window=500):
+        self.trace_path = trace_path
+        self.window = window
+        self._recent = defaultdict(lambda: deque(maxlen=window))  # name -> recent seconds
+        self._buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self._sum = defaultdict(float)
+        self._count = defaultdict(int)
+        self._counters = defaultdict(int)  # (metric, name) -> value
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, kind="call", **attrs):
+        """Time the body; the yielded ``Span`` can be given tokens and cache hits."""
+        span = Span(name, kind, **attrs)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            span.seconds = time.perf_counter() - start
+            self.record(span)
+
+    def observe(self, name, kind, seconds, **attrs):
+        """Record a span whose duration was measured elsewhere."""
+        span = Span(name, kind, **attrs)
+        span.started -= seconds
+        span.seconds = seconds
+        self.record(span)
+
+    def record(self, span):
+        line = json.dumps(span.to_dict(), default=str) if self.trace_path else None
+        with self._lock:
+            self._recent[span.name].append(span.seconds)
+            buckets = self._buckets[span.name]
+            for i, bound in enumerate(BUCKETS):
+                if span.seconds <= bound:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            self._sum[span.name] += span.seconds
+            self._count[span.name] += 1
+            self._counters[("prompt_tokens", span.name)] += span.prompt_tokens
+            self._counters[("completion_tokens", span.name)] += span.completion_tokens
+            self._counters[("cache_hits", span.name)] += int(span.cache_hit)
+            self._counters[("errors", span.name)] += int(span.error is not None)
+            if line is not None:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def recent(self, name):
+        """Recent durations (seconds) for span ``name``, oldest first."""
+        with self._lock:
+            return list(self._recent.get(name, ()))
+
+    def names(self):
+        with self._lock:
+            return sorted(self._count)
+
+    def summary(self):
+        """Per-span rows for the debug panel: count, rolling p50/p95 and totals."""
+        rows = []
+        for name in self.names():
+            recent = sorted(self.recent(name))
+            with self._lock:
+                rows.append({
+                    "span": name,
+                    "count": self._count[name],
+                    "p50_ms": recent[len(recent) // 2] * 1000 if recent else 0.0,
+                    "p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000 if recent else 0.0,
+                    "prompt_tokens": self._counters[("prompt_tokens", name)],
+                    "completion_tokens": self._counters[("completion_tokens", name)],
+                    "cache_hits": self._counters[("cache_hits", name)],
+                    "errors": self._counters[("errors", name)],
+                })
+        return rows
+
+    def prometheus_text(self):
+        """All aggregates in the Prometheus text exposition format."""
+        lines = [
+            "# HELP studyplanner_span_seconds Wall time of instrumented spans.",
+            "# TYPE studyplanner_span_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._count):
+                for bound, value in zip(BUCKETS, self._buckets[name]):
+                    lines.append(f'studyplanner_span_seconds_bucket{{span="{name}",le="{bound}"}} {value}')
+                lines.append(f'studyplanner_span_seconds_bucket{{span="{name}",le="+Inf"}} {self._buckets[name][-1]}')
+                lines.append(f'studyplanner_span_seconds_sum{{span="{name}"}} {self._sum[name]:.6f}')
+                lines.append(f'studyplanner_span_seconds_count{{span="{name}"}} {self._count[name]}')
+            for metric in ("prompt_tokens", "completion_tokens", "cache_hits", "errors"):
+                lines.append(f"# TYPE studyplanner_{metric}_total counter")
+                for (counter, name), value in sorted(self._counters.items()):
+                    if counter == metric:
+                        lines.append(f'studyplanner_{metric}_total{{span="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serve ``/metrics`` on a daemon thread; returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="studyplanner-metrics", daemon=True).start()
+        return server
+
+    def wrap_node(self, name, fn):
+        """Time a LangGraph node function (sync or async) as span ``name``.
+
+        The wrapper keeps ``fn``'s signature, so LangGraph still passes
+        ``config`` to nodes that take it.
+        """
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def node(state, **kwargs):
+                with self.span(name, "node"):
+                    return await fn(state, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def node(state, **kwargs):
+                with self.span(name, "node"):
+                    return fn(state, **kwargs)
+        return node
+
+
+@functools.lru_cache(maxsize=None)
+def get_metrics():
+    """Process-wide metrics, configured from the environment on first use.
+
+    With several worker processes only the first one to start gets
+    ``STUDYPLANNER_METRICS_PORT``; the others keep recording without serving
+    (the planner service's ``/metrics`` route works in every worker).
+    """
+    metrics = Metrics(trace_path=os.getenv("STUDYPLANNER_TRACE") or None)
+    port = os.getenv("STUDYPLANNER_METRICS_PORT")
+    if port:
+        try:
+            metrics.serve(int(port))
+        except OSError as exc:
+            # Usually another worker already serves this port; metrics still work here
+            logger.warning("not serving metrics on port %s: %s", port, exc)
+    return metrics
+
+
+def _prompt_tokens(prompt):
+    if isinstance(prompt, str):
+        return estimate_tokens(prompt)
+    return sum(estimate_tokens(str(getattr(m, "content", m))) for m in prompt)
+
+
+def _record_usage(span, prompt, message, text):
+    """Prefer the provider's usage numbers (LangChain or genai), else estimate."""
+    usage = getattr(message, "usage_metadata", None)
+    if isinstance(usage, dict) and usage.get("input_tokens"):
+        span.prompt_tokens = usage["input_tokens"]
+        span.completion_tokens = usage.get("output_tokens", 0)
+    elif getattr(usage, "prompt_token_count", 0):
+        span.prompt_tokens = usage.prompt_token_count
+        span.completion_tokens = getattr(usage, "candidates_token_count", 0)
+    else:
+        span.prompt_tokens = _prompt_tokens(prompt)
+        span.completion_tokens = estimate_tokens(text) if text else 0
+
+
+class InstrumentedChatModel:
+    """Records a span for every ``invoke``/``ainvoke``/``stream``/``astream``."""
+
+    def __init__(self, llm, metrics=None, name="llm"):
+        self.llm = llm
+        self.metrics = metrics or get_metrics()
+        self.name = name
+
+    def invoke(self, input, config=None, **kwargs):
+        with self.metrics.span(f"{self.name}.invoke", "llm") as span:
+            response = self.llm.invoke(input, config, **kwargs)
+            _record_usage(span, input, response, chunk_text(response))
+        return response
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        with self.metrics.span(f"{self.name}.invoke", "llm") as span:
+            response = await self.llm.ainvoke(input, config, **kwargs)
+            _record_usage(span, input, response, chunk_text(response))
+        return response
+
+    def stream(self, input, config=None, **kwargs):
+        with self.metrics.span(f"{self.name}.stream", "llm") as span:
+            pieces, last = [], None
+            for chunk in self.llm.stream(input, config, **kwargs):
+                if not pieces:
+                    span.attrs["first_token_seconds"] = time.time() - span.started
+                pieces.append(chunk_text(chunk))
+                last = chunk
+                yield chunk
+            _record_usage(span, input, last, "".join(pieces))
+
+    async def astream(self, input, config=None, **kwargs):
+        with self.metrics.span(f"{self.name}.stream", "llm") as span:
+            pieces, last = [], None
+            async for chunk in self.llm.astream(input, config, **kwargs):
+                if not pieces:
+                    span.attrs["first_token_seconds"] = time.time() - span.started
+                pieces.append(chunk_text(chunk))
+                last = chunk
+                yield chunk
+            _record_usage(span, input, last, "".join(pieces))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+class InstrumentedChatSession:
+    """Records a span for every ``send_message`` of a genai chat session.
+
+    Streamed replies are timed until the caller has consumed the stream.
+    """
+
+    def __init__(self, chat, metrics):
+        self.chat = chat
+        self.metrics = metrics
+
+    @property
+    def history(self):
+        return self.chat.history
+
+    @history.setter
+    def history(self, history):
+        self.chat.history = history
+
+    def send_message(self, content, stream=False, **kwargs):
+        if stream:
+            return self._stream(content, **kwargs)
+        with self.metrics.span("chat.send_message", "llm") as span:
+            response = self.chat.send_message(content, **kwargs)
+            _record_usage(span, content, response, chunk_text(response))
+        return response
+
+    def _stream(self, content, **kwargs):
+        with self.metrics.span("chat.send_message.stream", "llm") as span:
+            pieces, last = [], None
+            for chunk in self.chat.send_message(content, stream=True, **kwargs):
+                if not pieces:
+                    span.attrs["first_token_seconds"] = time.time() - span.started
+                pieces.append(chunk_text(chunk))
+                last = chunk
+                yield chunk
+            _record_usage(span, content, last, "".join(pieces))
+
+    def __getattr__(self, name):
+        return getattr(self.chat, name)
+
+
+class InstrumentedGenerativeModel:
+    """Instruments ``generate_content`` and every chat started from the model."""
+
+    def __init__(self, model, metrics=None):
+        self.model = model
+        self.metrics = metrics or get_metrics()
+
+    def start_chat(self, history=None, **kwargs):
+        return InstrumentedChatSession(self.model.start_chat(history=history, **kwargs), self.metrics)
+
+    def generate_content(self, prompt, **kwargs):
+        with self.metrics.span("model.generate_content", "llm") as span:
+            response = self.model.generate_content(prompt, **kwargs)
+            _record_usage(span, str(prompt), response, chunk_text(response))
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
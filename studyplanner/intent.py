@@ -0,0 +1,190 @@
+"""Local intent routing for the chatbot-01 agent.
+
+``ai_agent`` used to pick summary or search with substring checks and only
+found out a student wanted a counselor by scanning the model's reply for
+"human assistance", which cost a full Gemini call first. ``IntentRouter``
+decides before any LLM call, in microseconds:
+
+1. keyword patterns (one compiled alternation per intent) catch the explicit
+   trigger phrases with full confidence;
+2. otherwise a small multinomial naive Bayes model over word unigrams and
+   bigrams, trained once on ``EXAMPLES``, scores the query.
+
+Searching, handing a turn to a counselor or summarizing the chat all skip
+Gemini, so every routed intent comes only from an explicit trigger phrase:
+the model, trained on a few dozen examples, is far too confident to be
+trusted with them ("I need help with math" is not a request for a human,
+"what are the best study techniques for exams" is not a request for a web
+search). By default it routes nothing on its own (``MODEL_INTENTS`` is
+empty) and only reports its confidence; pass ``model_intents`` to let a
+better-calibrated model route. Otherwise the router returns
+``Intent(CHAT, ..., source="llm")`` and the agent asks the model as before.
+"""
+
+import functools
+import math
+import re
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+CHAT = "chat"
+SUMMARY = "summary"
+SEARCH = "search"
+HUMAN = "human"
+
+# Checked in this order; the first intent with a matching phrase wins
+KEYWORDS = {
+    SUMMARY: ("what did we do today", "summarize chat history", "summarise chat history",
+              "summarize our conversation", "summarise our conversation", "summary of our conversation",
+              "summary of our chat", "recap our chat", "recap what we discussed", "what have we covered so far"),
+    SEARCH: ("search online", "find on the internet", "search the web", "look it up online",
+             "look up online", "google it", "find online resources", "find me online resources",
+             "find me some online resources", "search the internet"),
+    HUMAN: ("human assistance", "talk to a counselor", "speak to a counselor", "speak with a counselor",
+            "talk to a human", "speak to a human", "human counselor", "connect me with a counselor"),
+}
+
+# Intents the model may return on its own; by default every routed intent
+# needs a keyword match
+MODEL_INTENTS = frozenset()
+
+# Seed data for the naive Bayes model
+EXAMPLES = [
+    (SUMMARY, "what have we covered so far"),
+    (SUMMARY, "can you recap what we discussed"),
+    (SUMMARY, "give me a summary of our conversation"),
+    (SUMMARY, "remind me what we talked about earlier"),
+    (SUMMARY, "summary of today's session please"),
+    (SUMMARY, "what did we go over in this chat"),
+    (SEARCH, "find me some online resources for calculus"),
+    (SEARCH, "look up the latest research on spaced repetition"),
+    (SEARCH, "are there any websites with free physics courses"),
+    (SEARCH, "search for practice exams for biology"),
+    (SEARCH, "find articles about memory techniques"),
+    (SEARCH, "what are the best youtube channels for chemistry"),
+    (SEARCH, "links to free online tutorials for statistics"),
+    (HUMAN, "i need to talk to someone about my stress"),
+    (HUMAN, "can a counselor help me with my anxiety"),
+    (HUMAN, "i feel overwhelmed and want to speak with a person"),
+    (HUMAN, "please connect me with a tutor or advisor"),
+    (HUMAN, "i am struggling and need real help from a human"),
+    (HUMAN, "can i get an appointment with the student counselor"),
+    (CHAT, "make me a study plan for my exams"),
+    (CHAT, "how many hours should i study for math each day"),
+    (CHAT, "help me plan my week for finals"),
+    (CHAT, "what is a good way to study for history"),
+    (CHAT, "explain the pomodoro technique"),
+    (CHAT, "how do i stay focused while studying"),
+    (CHAT, "create a revision timetable for physics and chemistry"),
+    (CHAT, "tips for remembering vocabulary"),
+    (CHAT, "should i study in the morning or at night"),
+    (CHAT, "break down my biology syllabus into weekly goals"),
+    # Study questions the model once sent to a counselor or a chat summary
+    (CHAT, "i need help with math"),
+    (CHAT, "help me with my chemistry homework"),
+    (CHAT, "i want to talk about my study plan"),
+    (CHAT, "i am stressed about exams"),
+    (CHAT, "give me a summary of the french revolution"),
+    (CHAT, "explain derivatives to me like a real person would"),
+    # ... or to a web search
+    (CHAT, "what are the best study techniques for exams"),
+    (CHAT, "are there any tricks for free recall"),
+    (CHAT, "what are the best practice exams for biology"),
+]
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def features(text):
+    """Lowercased word unigrams and bigrams."""
+    words = _WORD.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class Intent(NamedTuple):
+    label: str
+    confidence: float
+    source: str  # "keyword", "model" or "llm" (below threshold)
+
+
+class KeywordMatcher:
+    """Trigger phrases compiled into one regex per intent."""
+
+    def __init__(self, keywords=KEYWORDS):
+        self.patterns = [
+            (label, re.compile(r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b"))
+            for label, phrases in keywords.items()
+        ]
+
+    def match(self, text):
+        lowered = text.lower()
+        for label, pattern in self.patterns:
+            if pattern.search(lowered):
+                return label
+        return None
+
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes with Laplace smoothing over ``features``."""
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.log_prior = {}
+        self.log_likelihood = {}
+        self.log_unseen = {}
+
+    def fit(self, examples):
+        counts = defaultdict(Counter)
+        docs = Counter()
+        for label, text in examples:
+            docs[label] += 1
+            counts[label].update(features(text))
+        vocabulary = set().union(*counts.values())
+        total_docs = sum(docs.values())
+        for label, counter in counts.items():
+            denominator = sum(counter.values()) + self.alpha * len(vocabulary)
+            self.log_prior[label] = math.log(docs[label] / total_docs)
+            self.log_likelihood[label] = {
+                token: math.log((count + self.alpha) / denominator) for token, count in counter.items()
+            }
+            self.log_unseen[label] = math.log(self.alpha / denominator)
+        self.vocabulary = vocabulary
+        return self
+
+    def predict_proba(self, text):
+        """Posterior probability per label; tokens never seen in training are ignored."""
+        tokens = [token for token in features(text) if token in self.vocabulary]
+        scores = {
+            label: prior + sum(self.log_likelihood[label].get(token, self.log_unseen[label]) for token in tokens)
+            for label, prior in self.log_prior.items()
+        }
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+
+class IntentRouter:
+    """Keyword patterns first, then the model; below ``threshold`` defer to the LLM."""
+
+    def __init__(self, matcher=None, model=None, threshold=0.9, model_intents=MODEL_INTENTS):
+        self.matcher = matcher or KeywordMatcher()
+        self.model = model or NaiveBayesIntentModel().fit(EXAMPLES)
+        self.threshold = threshold
+        self.model_intents = frozenset(model_intents)
+
+    def classify(self, text):
+        label = self.matcher.match(text)
+        if label is not None:
+            return Intent(label, 1.0, "keyword")
+        probabilities = self.model.predict_proba(text)
+        label = max(probabilities, key=probabilities.get)
+        if label not in self.model_intents or probabilities[label] < self.threshold:
+            return Intent(CHAT, probabilities[label], "llm")
+        return Intent(label, probabilities[label], "model")
+
+
+@functools.lru_cache(maxsize=None)
+def default_router(threshold=0.9):
+    """Process-wide router, trained on first use."""
+    return IntentRouter(threshold=threshold)
@@ -0,0 +1,133 @@
+"""Load test for the planner service.
+
+Replays a transcript (the same JSON-lines format as ``bench.py``) from many
+concurrent sessions and reports per-turn latency, time to first token and
+throughput. Without ``--url`` it starts the service in-process on the fake
+backends, so it needs no API keys or quota::
+
+    python -m studyplanner.loadtest benchmarks/transcripts/study_session.jsonl --sessions 50
+    python -m studyplanner.loadtest transcript.jsonl --url http://127.0.0.1:8000 --targets tools
+
+Targets: ``turns`` (the chatbot-01 graph), ``ask`` (the generate_instructions
+flow) and ``tools`` (the notebook tools). Each session tags its messages with a
+student number so sessions do not share cached or coalesced answers; pass
+``--identical`` to send every session the same messages instead.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from .bench import format_table, load_transcript, percentile, summarize
+from .prompts import TOOLS
+
+TARGETS = ["turns", "ask", "tools"]
+
+
+def start_local_service(port):
+    """Run the service on the fakes in a background thread; returns the server."""
+    import uvicorn
+
+    os.environ["STUDYPLANNER_OFFLINE"] = "1"
+    # The fakes have no quota, so don't let the gateway's default limit shape the results
+    os.environ.setdefault("STUDYPLANNER_RPM", "1000000")
+    os.environ.setdefault("STUDYPLANNER_MAX_CONCURRENCY", "256")
+    os.environ.setdefault("STUDYPLANNER_CHECKPOINTS", os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite3"))
+    os.environ.setdefault("STUDYPLANNER_CACHE_DIR", tempfile.mkdtemp())
+
+    from .service import create_app
+
+    server = uvicorn.Server(uvicorn.Config(create_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="planner-service", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_session(client, target, transcript, tag=""):
+    """One simulated student; returns ``(latencies, first_token_latencies, errors)``."""
+    thread_id = uuid.uuid4().hex
+    latencies, first_tokens, errors = [], [], 0
+    for record in transcript:
+        message = tag + record["user"]
+        start = time.perf_counter()
+        first = None
+        try:
+            if target == "tools":
+                await client.tool(record.get("tool", TOOLS[0]), message)
+            else:
+                stream = client.ask(message) if target == "ask" else client.turn(thread_id, message)
+                async for _ in stream:
+                    if first is None:
+                        first = time.perf_counter() - start
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        if first is not None:
+            first_tokens.append(first)
+    return latencies, first_tokens, errors
+
+
+async def run_load(url, target, transcript, sessions, identical=False):
+    from .client import AsyncPlannerClient
+
+    client = AsyncPlannerClient(url, max_connections=sessions)
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            run_session(client, target, transcript, "" if identical else f"I am student {i}. ")
+            for i in range(sessions)
+        ))
+    finally:
+        await client.aclose()
+    wall = time.perf_counter() - start
+    row = summarize(target, [v for r in results for v in r[0]], sum(r[2] for r in results), wall)
+    first_tokens = sorted(v for r in results for v in r[1])
+    row["ttft_p50_ms"] = percentile(first_tokens, 50) * 1000
+    row["ttft_p95_ms"] = percentile(first_tokens, 95) * 1000
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcript", help="JSON-lines transcript with 'user' (and optional 'tool') fields")
+    parser.add_argument("--url", help="service to test; default: start one in-process on the fakes")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=["turns"])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated students")
+    parser.add_argument("--identical", action="store_true", help="send every session the same messages")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    transcript = load_transcript(args.transcript)
+    url = args.url
+    if url is None:
+        port = free_port()
+        start_local_service(port)
+        url = f"http://127.0.0.1:{port}"
+
+    rows = [asyncio.run(run_load(url, target, transcript, args.sessions, args.identical)) for target in args.targets]
+    print(format_table(rows))
+    for row in rows:
+        if row["target"] == "tools":
+            continue  # answered in one piece, so there is no first token to time
+        print(f"{row['target']}: time to first event p50 {row['ttft_p50_ms']:.1f} ms, p95 {row['ttft_p95_ms']:.1f} ms")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""A persistent asyncio event loop for synchronous callers.
+
+Streamlit scripts run on a plain thread, but the compiled LangGraph, its async
+SQLite checkpointer and the async LLM clients want to live on one long-running
+loop. ``BackgroundLoop`` runs that loop on a daemon thread; scripts submit
+coroutines with ``run`` and consume async generators with ``iterate``.
+"""
+
+import asyncio
+import queue
+import threading
+
+_DONE = object()
+
+
+class BackgroundLoop:
+    """An event loop running forever on its own daemon thread."""
+
+    def __init__(self, name="studyplanner-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """Run ``coro`` on the loop and block until it returns."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop and return a ``concurrent.futures.Future``."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def iterate(self, agen):
+        """Consume an async generator from synchronous code, item by item."""
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except BaseException as exc:
+                items.put(exc)
+                raise
+            finally:
+                items.put(_DONE)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stop the producer if the consumer gave up early (e.g. a Streamlit rerun)
+            future.cancel()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
@@ -0,0 +1,159 @@
+"""Token-budgeted rolling conversation memory.
+
+``RollingMemory`` keeps the pinned setup turns and the most recent turns
+verbatim. When the verbatim tail grows past ``recent_turns`` or the token
+budget, the oldest turns are folded into a running summary on a background
+thread, so the request path never waits on the summarizer. Until a compaction
+finishes the memory simply returns the uncompacted turns. The turns are
+kept in a ``messages.MessageLog``, whatever form they were appended in.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .messages import MessageLog
+
+# Compactions are short LLM calls; a couple of threads serve every session
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-compaction")
+
+
+def estimate_tokens(text):
+    """Cheap offline token estimate (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def message_text(message):
+    """Return the text of a dict turn (``content``/``parts``), a LangChain message
+    or a ``genai`` ``Content``."""
+    if isinstance(message, dict):
+        text = message.get("content", message.get("parts", ""))
+    elif hasattr(message, "parts"):
+        text = "".join(getattr(part, "text", "") for part in message.parts)
+    else:
+        text = getattr(message, "content", "")
+    if isinstance(text, list) and all(isinstance(part, str) for part in text):
+        return "".join(text)
+    return text if isinstance(text, str) else str(text)
+
+
+def message_role(message):
+    if isinstance(message, dict):
+        return message.get("role", "user")
+    # genai Content and messages.Message carry a role; LangChain messages a type
+    return getattr(message, "role", None) or getattr(message, "type", "tool")
+
+
+def make_summarizer(complete):
+    """Build a summarizer from ``complete(prompt) -> str`` (any LLM call)."""
+    def summarize(previous_summary, turns):
+        transcript = "\n".join(f"{message_role(m)}: {message_text(m)}" for m in turns)
+        prompt = (
+            "You maintain a running summary of a conversation between a student and a study planner.\n"
+            "Update the summary with the new messages. Keep subjects, goals, deadlines and decisions; "
+            "drop small talk. Reply with the updated summary only.\n\n"
+            f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        return complete(prompt).strip()
+    return summarize
+
+
+def default_summary_turns(summary):
+    return [{"role": "user", "content": f"Summary of our earlier conversation: {summary}"}]
+
+
+class RollingMemory:
+    """Pinned turns + running summary + the most recent turns, within a token budget."""
+
+    def __init__(self, pinned=(), token_budget=2000, recent_turns=6, summarizer=None,
+                 summary_turns=default_summary_turns, count_tokens=estimate_tokens):
+        self.pinned = list(pinned)
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summarizer = summarizer
+        self.summary_turns = summary_turns
+        self.count_tokens = count_tokens
+        self.summary = ""
+        # Bumped whenever compaction rewrites the prompt, so callers holding a
+        # copy (e.g. a ChatSession's history) know to refresh it
+        self.version = 0
+        # Number of turns folded into the summary (or dropped) so far
+        self.folded = 0
+        self._turns = MessageLog()
+        self._tokens = []
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def append(self, message):
+        """Record a turn and schedule compaction if the tail is over budget."""
+        with self._lock:
+            self._turns.append(message)
+            self._tokens.append(self.count_tokens(self._turns.contents[-1]))
+            self._maybe_compact()
+
+    def recent(self):
+        """The turns that have not been folded into the summary yet (as ``messages.Message``)."""
+        with self._lock:
+            return list(self._turns)
+
+    def messages(self, recalled=()):
+        """Prompt history: pinned turns, the summary (if any), any ``recalled``
+        older turns, then recent turns as ``genai`` turns."""
+        with self._lock:
+            summary = self.summary_turns(self.summary) if self.summary else []
+            return self.pinned + summary + list(recalled) + self._turns.view().to_genai()
+
+    def wait(self, timeout=None):
+        """Block until any in-flight compaction has finished (benchmarks/tests)."""
+        # A finished compaction may chain another one, so wait until none is left
+        pending = self._pending
+        while pending is not None:
+            pending.result(timeout)
+            if self._pending is pending:
+                break
+            pending = self._pending
+
+    def _fixed_tokens(self):
+        text = "".join(message_text(m) for m in self.pinned) + self.summary
+        return self.count_tokens(text) if text else 0
+
+    def _maybe_compact(self):
+        if self._pending is not None and not self._pending.done():
+            return
+        overflow = len(self._turns) - self.recent_turns
+        budget = self.token_budget - self._fixed_tokens()
+        tokens = sum(self._tokens)
+        # Always keep the newest exchange verbatim, even if it alone is over budget
+        cut = max(overflow, 0)
+        while tokens - sum(self._tokens[:cut]) > budget and cut < len(self._turns) - 2:
+            cut += 1
+        if cut <= 0:
+            return
+        # A copy: the summarizer runs without the lock while appends change the
+        # log's columns, and discard_before would invalidate a view
+        folded = list(self._turns[:cut])
+        if self.summarizer is None:
+            # No summarizer configured: plain truncation of the oldest turns
+            self._turns.discard_before(cut)
+            del self._tokens[:cut]
+            self.folded += cut
+            self.version += 1
+            return
+        self._pending = _executor.submit(self._compact, self.summary, folded)
+
+    def _compact(self, previous_summary, folded):
+        try:
+            summary = self.summarizer(previous_summary, folded)
+        except Exception:
+            # Keep the turns verbatim and try again after the next append
+            return
+        with self._lock:
+            # Only appends happen meanwhile, so the folded turns are still in front
+            self._turns.discard_before(len(folded))
+            del self._tokens[:len(folded)]
+            self.summary = summary
+            self.folded += len(folded)
+            self.version += 1
+            # Turns appended while we were summarizing may need another pass
+            self._pending = None
+            self._maybe_compact()
@@ -0,0 +1,159 @@
+"""Compact, append-only message log shared by the apps.
+
+A session's history used to be a list of per-turn dicts (or LangChain
+message objects), copied whenever a prompt or the history pane was built.
+With thousands of sessions in one process that per-turn overhead adds up.
+``MessageLog`` stores a conversation column-wise: roles as one byte each
+(indices into a small table of interned role names), texts in a list of the
+original strings and the rare names in a sparse dict. Slicing a log gives a
+``MessageView`` that shares the columns instead of copying them, and views
+convert to ``genai`` turns only when iterated.
+"""
+
+import sys
+from array import array
+
+# Every spelling of a role used across the apps, mapped to one canonical name
+ROLE_ALIASES = {
+    "user": "user", "human": "user",
+    "model": "model", "ai": "model", "assistant": "model", "bot": "model",
+    "tool": "tool", "function": "tool",
+    "system": "system",
+}
+ROLES = ["user", "model", "tool", "system"]
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+def role_code(role):
+    role = ROLE_ALIASES.get(role, role)
+    code = _ROLE_CODES.get(role)
+    if code is None:
+        if len(ROLES) == 256:
+            raise ValueError(f"too many distinct roles to add {role!r}")
+        code = _ROLE_CODES[role] = len(ROLES)
+        ROLES.append(sys.intern(role))
+    return code
+
+
+class Message:
+    """One turn, materialized on access."""
+
+    __slots__ = ("role", "content", "name")
+
+    def __init__(self, role, content, name=None):
+        self.role = role
+        self.content = content
+        self.name = name
+
+    def __getitem__(self, key):
+        # Lets code written for {"role", "content"} dicts keep working
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r})"
+
+
+def _parts(message):
+    """``(role, text, name)`` of a dict turn, LangChain message, genai Content or Message."""
+    from .memory import message_role, message_text
+
+    if isinstance(message, Message):
+        return message.role, message.content, message.name
+    name = message.get("name") if isinstance(message, dict) else getattr(message, "name", None)
+    return message_role(message), message_text(message), name
+
+
+class MessageView:
+    """Read-only window ``[start, stop)`` onto a ``MessageLog``; no copying."""
+
+    __slots__ = ("log", "start", "stop")
+
+    def __init__(self, log, start, stop):
+        self.log = log
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("message views only support contiguous slices")
+            return MessageView(self.log, self.start + start, self.start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message view index out of range")
+        return self.log.message(self.start + index)
+
+    def __iter__(self):
+        log = self.log
+        for i in range(self.start, self.stop):
+            yield log.message(i)
+
+    def texts(self):
+        return self.log.contents[self.start:self.stop]
+
+    def to_genai(self):
+        """``{"role", "parts"}`` turns for ``genai`` (tool output goes in as user text)."""
+        return [
+            {"role": "model" if m.role == "model" else "user", "parts": m.content}
+            for m in self
+        ]
+
+
+class MessageLog:
+    """Append-only conversation log stored as columns."""
+
+    __slots__ = ("roles", "contents", "names", "offset")
+
+    def __init__(self, messages=()):
+        self.roles = array("B")
+        self.contents = []
+        self.names = {}  # absolute index -> name, for the few named turns
+        # Turns dropped from the front by ``discard_before``; indices stay absolute
+        self.offset = 0
+        self.extend(messages)
+
+    def append(self, message):
+        """Append a dict turn, LangChain message, genai Content or ``Message``."""
+        role, content, name = _parts(message)
+        self.add(role, content, name)
+
+    def add(self, role, content, name=None):
+        self.roles.append(role_code(role))
+        self.contents.append(content)
+        if name:
+            self.names[self.offset + len(self.contents) - 1] = name
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def __len__(self):
+        return len(self.contents)
+
+    def message(self, index):
+        """The turn at position ``index`` of the retained turns."""
+        return Message(ROLES[self.roles[index]], self.contents[index], self.names.get(self.offset + index))
+
+    def view(self, start=0, stop=None):
+        return MessageView(self, start, len(self) if stop is None else stop)
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def discard_before(self, count):
+        """Drop the oldest ``count`` turns (e.g. once they are summarized).
+
+        Existing views are invalidated; take new ones afterwards.
+        """
+        del self.roles[:count], self.contents[:count]
+        self.offset += count
+        if self.names:
+            self.names = {i: name for i, name in self.names.items() if i >= self.offset}
@@ -0,0 +1,183 @@
+"""Request handling behind NotebookStudyPlanner's tools.
+
+``ToolPlanner`` is what ``NotebookStudyPlanner.handle_submit`` does once the
+widgets have been read: build the tool prompt, check the response cache and
+call the LLM on a miss. Keeping it free of widgets lets the benchmark and
+batch runners drive exactly the same path. ``astream`` is the notebook's
+non-blocking mode: it yields the answer in pieces as the model streams it.
+
+``areport`` (and its threaded twin ``report``) is the notebook's "All tools"
+mode: it asks every tool about one request at once, on a bounded pool, and
+collects the answers into a ``ToolReport``. Each tool's answer is cached on
+its own, so asking again about the same request only calls the model for
+the tools that failed or have expired.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from .instrumentation import get_metrics
+from .prompts import TOOL_INSTRUCTIONS, TOOL_PROMPT_TEMPLATE, TOOLS, build_tool_prompt, build_tool_request
+from .streaming import chunk_text
+
+
+class ToolPlanner:
+    """Answers one (tool, request) pair, with optional response caching."""
+
+    def __init__(self, llm, model_name, cache=None, prefixes=None):
+        self.llm = llm
+        self.model_name = model_name
+        self.cache = cache
+        # With a prefix_cache.PrefixCache the fixed tool instructions are a
+        # registered prefix instead of being rebuilt into every prompt
+        self.prefixes = prefixes
+
+    def prompt(self, tool, user_input):
+        """``(prompt, call kwargs)`` for one tool request."""
+        if self.prefixes is None:
+            return build_tool_prompt(tool, user_input), {}
+        handle = self.prefixes.register("tool-instructions", self.model_name, TOOL_INSTRUCTIONS)
+        return handle.prompt(build_tool_request(tool, user_input)), handle.kwargs()
+
+    @staticmethod
+    def cache_input(tool, user_input):
+        return f"{tool}\n{user_input}"
+
+    def cached(self, tool, user_input):
+        if self.cache is None:
+            return None
+        return self.cache.get(self.model_name, TOOL_PROMPT_TEMPLATE, self.cache_input(tool, user_input))
+
+    def store(self, tool, user_input, content):
+        if self.cache is not None:
+            self.cache.set(self.model_name, TOOL_PROMPT_TEMPLATE, self.cache_input(tool, user_input), content)
+
+    def submit(self, tool, user_input):
+        """Return the answer, from the cache when this tool/request was seen before."""
+        return self.answer(tool, user_input)[0]
+
+    def answer(self, tool, user_input):
+        """``(content, cache_hit)`` for one tool request."""
+        with get_metrics().span("handle_submit", "tool", tool=tool) as span:
+            content = self.cached(tool, user_input)
+            span.cache_hit = content is not None
+            if content is None:
+                prompt, kwargs = self.prompt(tool, user_input)
+                content = self.llm.invoke(prompt, **kwargs).content
+                self.store(tool, user_input, content)
+        return content, span.cache_hit
+
+    async def asubmit(self, tool, user_input):
+        return (await self.aanswer(tool, user_input))[0]
+
+    async def aanswer(self, tool, user_input):
+        with get_metrics().span("handle_submit", "tool", tool=tool) as span:
+            content = self.cached(tool, user_input)
+            span.cache_hit = content is not None
+            if content is None:
+                prompt, kwargs = self.prompt(tool, user_input)
+                content = (await self.llm.ainvoke(prompt, **kwargs)).content
+                self.store(tool, user_input, content)
+        return content, span.cache_hit
+
+    async def astream(self, tool, user_input):
+        """Yield the answer as it streams (in one piece on a cache hit).
+
+        Only a completed answer is cached, so a cancelled request leaves no trace.
+        """
+        with get_metrics().span("handle_submit", "tool", tool=tool) as span:
+            content = self.cached(tool, user_input)
+            span.cache_hit = content is not None
+            if content is not None:
+                yield content
+                return
+            pieces = []
+            prompt, kwargs = self.prompt(tool, user_input)
+            async for chunk in self.llm.astream(prompt, **kwargs):
+                text = chunk_text(chunk)
+                if text:
+                    pieces.append(text)
+                    yield text
+            self.store(tool, user_input, "".join(pieces))
+
+
+class ToolResult(NamedTuple):
+    tool: str
+    content: Optional[str]
+    seconds: float
+    # None when the planner can't tell (e.g. the planner service)
+    cache_hit: Optional[bool] = None
+    error: Optional[str] = None
+
+
+class ToolReport(NamedTuple):
+    """Every tool's answer to one request, in ``TOOLS`` order."""
+
+    request: str
+    results: list
+    seconds: float
+
+    @property
+    def failed(self):
+        return [result.tool for result in self.results if result.error is not None]
+
+    def to_dict(self):
+        return {"request": self.request, "seconds": round(self.seconds, 3),
+                "results": [result._asdict() for result in self.results]}
+
+    def to_text(self):
+        """The report as one message: a section per tool with its timing."""
+        lines = [f"Advisory report ({len(self.results)} tools, {self.seconds:.1f} s)"]
+        for result in self.results:
+            note = "cached" if result.cache_hit else f"{result.seconds:.1f} s"
+            lines.append(f"\n## {result.tool} ({note})")
+            lines.append(result.content if result.error is None else f"Not available: {result.error}")
+        return "\n".join(lines)
+
+
+def _failed(tool, started, exc):
+    return ToolResult(tool, None, time.perf_counter() - started, error=f"{type(exc).__name__}: {exc}")
+
+
+def report(planner, user_input, tools=TOOLS, concurrency=4):
+    """Ask every tool in ``tools`` about ``user_input`` on a pool of ``concurrency`` threads."""
+    def run(tool):
+        started = time.perf_counter()
+        try:
+            content, cache_hit = planner.answer(tool, user_input)
+        except Exception as exc:
+            return _failed(tool, started, exc)
+        return ToolResult(tool, content, time.perf_counter() - started, cache_hit)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, tools))
+    return ToolReport(user_input, results, time.perf_counter() - started)
+
+
+async def areport(planner, user_input, tools=TOOLS, concurrency=4, on_result=None):
+    """Async ``report``; ``on_result(result)`` is called as each tool finishes.
+
+    A failing tool becomes a result with ``error`` set, so the others still
+    make it into the report.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(tool):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                content, cache_hit = await planner.aanswer(tool, user_input)
+            except Exception as exc:
+                result = _failed(tool, started, exc)
+            else:
+                result = ToolResult(tool, content, time.perf_counter() - started, cache_hit)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run(tool) for tool in tools))
+    return ToolReport(user_input, list(results), time.perf_counter() - started)
@@ -0,0 +1,229 @@
+"""Register the fixed instruction blocks once and refer to them by handle.
+
+Several calls start with the same block of text: the study assistant
+instructions, the counselor seed turns of the chat apps and the notebook's
+tool instructions. ``PrefixCache.register`` turns such a prefix into a
+``PrefixHandle``, and a call then sends only what follows it:
+
+- ``GeminiPrefixBackend`` stores the prefix with Gemini's context caching
+  (``google.generativeai.caching.CachedContent``), so it is neither re-sent
+  nor re-billed at the full input rate on later calls. Gemini only caches
+  contents above a minimum size (``STUDYPLANNER_PREFIX_MIN_TOKENS``, default
+  32768), and a cached content belongs to one model.
+- ``LocalPrefixBackend`` is the stand-in for everything else (short
+  prefixes, the model cascade, offline runs): the prefix is sent inline, but
+  built and token-counted once and always byte-identical at the front of the
+  prompt, which is what the provider's implicit prefix caching matches on.
+
+Handles expire after ``ttl_seconds``; ``register`` is cheap to call on every
+turn and extends a provider cache that is within ``refresh_seconds`` of
+expiring. If the prefix text changes (an edited instruction block), a new
+cached content is created under the same name. The old one is not deleted:
+other workers find cached contents by display name and may still be using
+it, so it is left to expire through its TTL.
+"""
+
+import datetime
+import json
+import threading
+import time
+
+from .cache import text_hash
+from .instrumentation import get_metrics
+from .memory import estimate_tokens, message_role, message_text
+from .messages import ROLE_ALIASES
+
+DEFAULT_TTL = 3600.0
+# Gemini 1.5's minimum size for an explicit cache
+DEFAULT_MIN_TOKENS = 32768
+
+
+def _turns(prefix):
+    """A prefix as ``{"role", "parts"}`` turns: a string is one user turn."""
+    if isinstance(prefix, str):
+        return [{"role": "user", "parts": prefix}]
+    return [
+        {"role": "model" if ROLE_ALIASES.get(message_role(m)) == "model" else "user", "parts": message_text(m)}
+        for m in prefix
+    ]
+
+
+class PrefixHandle:
+    """A registered prefix; ``cached_content`` names the provider's copy, if any."""
+
+    def __init__(self, name, model, key, turns, tokens, expires, cached_content=None):
+        self.name = name
+        self.model = model
+        self.key = key
+        self.turns = turns
+        self.text = "\n".join(turn["parts"] for turn in turns)
+        self.tokens = tokens
+        self.expires = expires
+        self.cached_content = cached_content
+
+    def prompt(self, text):
+        """String prompt for ``text``: the prefix and ``text``, or just ``text``
+        when the provider holds the prefix."""
+        return text if self.cached_content else f"{self.text}\n{text}"
+
+    def kwargs(self):
+        """Extra keyword arguments for a LangChain call made with ``prompt``."""
+        return {"cached_content": self.cached_content} if self.cached_content else {}
+
+    def history(self):
+        """Seed turns for a ``genai`` chat: none when the provider holds them."""
+        return [] if self.cached_content else [dict(turn) for turn in self.turns]
+
+    def __repr__(self):
+        where = self.cached_content or "local"
+        return f"PrefixHandle({self.name!r}, {self.model!r}, {self.tokens} tokens, {where})"
+
+
+class LocalPrefixBackend:
+    """Keeps nothing remotely; every handle is sent inline."""
+
+    def create(self, model, display_name, turns, ttl_seconds):
+        return None
+
+    def refresh(self, cached_content, ttl_seconds):
+        pass
+
+    def delete(self, cached_content):
+        pass
+
+
+class GeminiPrefixBackend:
+    """Gemini context caching through ``google.generativeai``."""
+
+    def __init__(self):
+        from google.generativeai import caching
+
+        self.caching = caching
+
+    def create(self, model, display_name, turns, ttl_seconds):
+        ttl = datetime.timedelta(seconds=ttl_seconds)
+        # Another worker may already have cached the same prefix; reuse it
+        for cached in self.caching.CachedContent.list():
+            if cached.display_name == display_name:
+                cached.update(ttl=ttl)
+                return cached.name
+        model_path = model if model.startswith("models/") else f"models/{model}"
+        return self.caching.CachedContent.create(
+            model=model_path, display_name=display_name, contents=turns, ttl=ttl
+        ).name
+
+    def refresh(self, cached_content, ttl_seconds):
+        self.caching.CachedContent.get(cached_content).update(ttl=datetime.timedelta(seconds=ttl_seconds))
+
+    def delete(self, cached_content):
+        self.caching.CachedContent.get(cached_content).delete()
+
+    def generative_model(self, cached_content):
+        """A gated ``genai.GenerativeModel`` that answers on top of the cached prefix."""
+        import google.generativeai as genai
+
+        from .gateway import GatedGenerativeModel, get_gateway
+        from .instrumentation import InstrumentedGenerativeModel
+
+        cached = self.caching.CachedContent.get(cached_content)
+        return InstrumentedGenerativeModel(
+            GatedGenerativeModel(genai.GenerativeModel.from_cached_content(cached_content=cached), get_gateway())
+        )
+
+
+class PrefixCache:
+    """Named prefixes per model, with TTL refresh and invalidation on change."""
+
+    def __init__(self, backend=None, ttl_seconds=DEFAULT_TTL, refresh_seconds=300.0,
+                 min_tokens=DEFAULT_MIN_TOKENS, count_tokens=estimate_tokens):
+        self.backend = backend or LocalPrefixBackend()
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self.min_tokens = min_tokens
+        self.count_tokens = count_tokens
+        self._handles = {}  # (name, model) -> PrefixHandle
+        self._models = {}  # cached_content -> generative model
+        self._lock = threading.Lock()
+
+    def register(self, name, model, prefix):
+        """The handle for ``prefix`` (a string or chat turns) under ``name``.
+
+        Returns the existing handle while the text is unchanged, extending its
+        provider cache when it is about to expire.
+        """
+        turns = _turns(prefix)
+        key = text_hash(f"{model}\n{json.dumps(turns, sort_keys=True)}")
+        now = time.time()
+        with self._lock:
+            handle = self._handles.get((name, model))
+            if handle is not None and handle.key == key:
+                if handle.expires - now < self.refresh_seconds:
+                    self._refresh(handle, now)
+                return handle
+            if handle is not None:
+                # The prefix text changed: stop using its cached copy here
+                self._drop(handle)
+            handle = self._create(name, model, key, turns, now)
+            self._handles[(name, model)] = handle
+            return handle
+
+    def _create(self, name, model, key, turns, now):
+        tokens = sum(self.count_tokens(turn["parts"]) for turn in turns)
+        cached_content = None
+        if tokens >= self.min_tokens:
+            with get_metrics().span("prefix_cache", "cache", prefix=name) as span:
+                try:
+                    cached_content = self.backend.create(model, f"studyplanner-{key[:24]}", turns, self.ttl_seconds)
+                except Exception as exc:
+                    # Unsupported model, quota, ...: send the prefix inline instead
+                    span.attrs["fallback"] = type(exc).__name__
+        return PrefixHandle(name, model, key, turns, tokens, now + self.ttl_seconds, cached_content)
+
+    def _refresh(self, handle, now):
+        if handle.cached_content:
+            try:
+                self.backend.refresh(handle.cached_content, self.ttl_seconds)
+            except Exception:
+                # Already expired on the provider's side: start over inline
+                # and let the next register create it again
+                self._drop(handle)
+                del self._handles[(handle.name, handle.model)]
+                return
+        handle.expires = now + self.ttl_seconds
+
+    def _drop(self, handle, delete=False):
+        # Only forgets the cached copy by default; other workers that found it
+        # by display name may still be using it, and it expires on its own
+        if handle.cached_content:
+            self._models.pop(handle.cached_content, None)
+            if delete:
+                try:
+                    self.backend.delete(handle.cached_content)
+                except Exception:
+                    # It expires on its own anyway
+                    pass
+            handle.cached_content = None
+
+    def invalidate(self, name, model, delete=False):
+        """Forget ``name`` for ``model``; with ``delete``, also delete its cached
+        copy, which breaks any other worker still using it."""
+        with self._lock:
+            handle = self._handles.pop((name, model), None)
+            if handle is not None:
+                self._drop(handle, delete)
+
+    def generative_model(self, handle, model_factory):
+        """``genai`` model to chat on top of ``handle``: one bound to the cached
+        prefix when the provider holds it, else ``model_factory(handle.model)``."""
+        if not handle.cached_content:
+            return model_factory(handle.model)
+        with self._lock:
+            model = self._models.get(handle.cached_content)
+            if model is None:
+                model = self._models[handle.cached_content] = self.backend.generative_model(handle.cached_content)
+            return model
+
+    def handles(self):
+        """Registered handles, e.g. for the debug panel."""
+        with self._lock:
+            return list(self._handles.values())
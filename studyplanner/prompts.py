@@ -0,0 +1,56 @@
+"""Prompt templates shared by the study planner front-ends."""
+
+# Tools offered by NotebookStudyPlanner's dropdown
+TOOLS = [
+    "Create Study Schedule",
+    "Subject Analysis",
+    "Time Management Tips",
+    "Resource Recommendations",
+]
+# Dropdown entry that runs every tool on the request and merges the answers
+ALL_TOOLS = "All tools (full report)"
+
+# The fixed part of every tool prompt comes first, so it can be sent as a
+# cached prefix (prefix_cache.py) ahead of the tool and request
+TOOL_INSTRUCTIONS = """As a study planning assistant, provide specific, actionable advice relevant to the selected tool.
+If creating a schedule, include specific time blocks.
+If analyzing a subject, break down key concepts and learning approaches.
+If providing time management tips, include concrete techniques.
+If recommending resources, suggest specific types of materials."""
+
+TOOL_REQUEST_TEMPLATE = """Tool selected: {tool}
+User request: {user_input}"""
+
+# Joined with a newline, like a prefix handle's prompt (so both send the same text)
+TOOL_PROMPT_TEMPLATE = f"{TOOL_INSTRUCTIONS}\n{TOOL_REQUEST_TEMPLATE}"
+
+
+def build_tool_request(tool, user_input):
+    """The part of a tool prompt that follows ``TOOL_INSTRUCTIONS``."""
+    return TOOL_REQUEST_TEMPLATE.format(tool=tool, user_input=user_input)
+
+
+def build_tool_prompt(tool, user_input):
+    """Prompt used by NotebookStudyPlanner.handle_submit for one tool request."""
+    return TOOL_PROMPT_TEMPLATE.format(tool=tool, user_input=user_input)
+
+
+# Instructions from chatbot-00-gemini-langchain-studyplanner's generate_instructions.
+# The text (whitespace included) is part of the response cache key, so keep it stable.
+STUDY_ASSISTANT_INSTRUCTIONS = """
+    You are an educational assistant. You can act as a teacher, study planner, or student counselor.
+    Assume the user is a middle schooler unless the user provides other context related to their education or study plan.
+    Always be patient, clear, and supportive in your responses. 
+    When offering study plans or suggestions, keep in mind that the user might not be familiar with advanced terminology.
+    """
+
+
+def build_assistant_prompt(user_input, instructions=STUDY_ASSISTANT_INSTRUCTIONS, prefix=None):
+    """Instructions followed by the student's message, as the study-planner app sends them.
+
+    With a ``prefix_cache.PrefixHandle`` for the instructions, only the message
+    is added when the provider already holds them.
+    """
+    if prefix is not None:
+        return prefix.prompt(f"User: {user_input}")
+    return f"{instructions}\nUser: {user_input}"
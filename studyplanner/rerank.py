@@ -0,0 +1,138 @@
+"""Condense web search results before they go back to the model.
+
+Raw page content is the biggest part of a search turn's prompt. ``ResultCondenser``
+splits each result into passages, scores them against the student's question
+with BM25, drops near-duplicates (the same paragraph syndicated on several
+sites, or repeated boilerplate) and keeps the best passages that fit in a
+token budget. The kept passages are grouped under their source URL, so the
+answer can still cite where things came from.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from .cache import normalize_words
+from .memory import estimate_tokens
+
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+_SENTENCES = re.compile(r"(?<=[.!?])\s+")
+
+# Words too common to say anything about relevance
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in is it me my of on or so that the this to "
+    "was what when where which who why will with you your".split()
+)
+
+
+def terms(text):
+    return [word for word in normalize_words(text).split() if word not in STOPWORDS]
+
+
+def split_passages(text, max_words=80):
+    """Split page content into paragraphs, packing sentences of long ones into
+    passages of at most about ``max_words`` words."""
+    passages = []
+    for paragraph in _PARAGRAPHS.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        current, words = [], 0
+        for sentence in _SENTENCES.split(paragraph):
+            length = len(sentence.split())
+            if current and words + length > max_words:
+                passages.append(" ".join(current))
+                current, words = [], 0
+            current.append(sentence)
+            words += length
+        if current:
+            passages.append(" ".join(current))
+    return passages
+
+
+def bm25_scores(query_terms, documents, k1=1.5, b=0.75):
+    """BM25 score of each tokenized document for ``query_terms``."""
+    if not documents:
+        return []
+    average = sum(len(doc) for doc in documents) / len(documents) or 1.0
+    frequency = Counter(term for doc in documents for term in set(doc))
+    weights = {
+        term: math.log(1 + (len(documents) - frequency[term] + 0.5) / (frequency[term] + 0.5))
+        for term in set(query_terms)
+    }
+    scores = []
+    for doc in documents:
+        counts = Counter(doc)
+        norm = k1 * (1 - b + b * len(doc) / average)
+        scores.append(sum(
+            weight * counts[term] * (k1 + 1) / (counts[term] + norm)
+            for term, weight in weights.items() if counts[term]
+        ))
+    return scores
+
+
+def shingles(words, size=3):
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class Passage(NamedTuple):
+    url: str
+    text: str
+    score: float
+
+
+class ResultCondenser:
+    """BM25-ranked, deduplicated passages from search results, within a token budget."""
+
+    def __init__(self, token_budget=800, max_words=80, duplicate_threshold=0.6, count_tokens=estimate_tokens):
+        self.token_budget = token_budget
+        self.max_words = max_words
+        self.duplicate_threshold = duplicate_threshold
+        self.count_tokens = count_tokens
+
+    def select(self, question, results):
+        """The passages to keep, best first."""
+        candidates = []
+        for result in results:
+            url = result.get("url", "No URL")
+            for text in split_passages(result.get("content") or "", self.max_words):
+                candidates.append((url, text, terms(text)))
+        scores = bm25_scores(terms(question), [words for _, _, words in candidates])
+        ranked = sorted(zip(scores, range(len(candidates))), key=lambda item: (-item[0], item[1]))
+
+        # Passages sharing no term with the question are dropped, unless none
+        # do (e.g. a question in other words), in which case page order decides
+        relevant = any(score > 0 for score in scores)
+        kept, kept_shingles, used = [], [], 0
+        for score, i in ranked:
+            if relevant and score <= 0:
+                break
+            url, text, words = candidates[i]
+            signature = shingles(words)
+            if any(jaccard(signature, other) >= self.duplicate_threshold for other in kept_shingles):
+                continue
+            cost = self.count_tokens(text)
+            if used + cost > self.token_budget:
+                # A shorter passage further down may still fit
+                continue
+            kept.append(Passage(url, text, score))
+            kept_shingles.append(signature)
+            used += cost
+        return kept
+
+    def condense(self, question, results):
+        """Tool-message text: kept passages grouped by source, best source first."""
+        by_url = {}
+        for passage in self.select(question, results):
+            by_url.setdefault(passage.url, []).append(passage.text)
+        return "\n\n".join(
+            f"Source: {url}\n" + "\n".join(f"- {text}" for text in passages)
+            for url, passages in by_url.items()
+        )
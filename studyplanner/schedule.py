@@ -0,0 +1,170 @@
+"""Deterministic study timetable engine (no LLM call needed).
+
+Every day's available hours are split across subjects in proportion to a
+priority score, which is the optimum of maximizing
+``sum(priority * log(hours))`` per day: diminishing returns from cramming one
+subject, with more weight on subjects that matter more or whose exam is close.
+
+    priority[s, d] = weight[s] / (days_until_exam[s, d] + 1) ** urgency_power
+
+Each day focuses on a few top-priority subjects and subjects get no time after
+their exam. Subjects that have waited longer are pulled forward, so they
+rotate. Spaced repetition: a subject whose last session was exactly one of
+``review_intervals`` days ago, and that is not in today's focus, gets a
+one-slot review session. Hours are rounded to ``slot_hours`` with the
+largest-remainder method, so each day adds up exactly to the available time.
+
+All arrays carry optional leading batch axes, so ``allocate_hours`` plans a
+whole cohort (students x subjects x days) in one vectorized pass.
+"""
+
+import datetime
+
+import numpy as np
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def _ranks(score):
+    """Rank of each subject's score within its row (0 = highest)."""
+    order = np.argsort(-score, axis=-1, kind="stable")
+    return np.argsort(order, axis=-1, kind="stable")
+
+
+def _top_k(score, k):
+    """Mask of the ``k`` highest positive scores in each row; ``k`` may vary by row."""
+    return (_ranks(score) < np.expand_dims(k, -1)) & (score > 0)
+
+
+def _split(priority, slots):
+    """Split ``slots`` (...) across subjects (..., S) in proportion to ``priority``.
+
+    Largest-remainder rounding keeps each row's total exactly at ``slots``.
+    """
+    total = priority.sum(axis=-1, keepdims=True)
+    share = np.divide(priority, total, out=np.zeros_like(priority), where=total > 0)
+    raw = share * np.expand_dims(slots, -1)
+    base = np.floor(raw)
+    leftover = slots - base.sum(axis=-1)
+    return base + _top_k(np.where(share > 0, raw - base + 1e-12, 0.0), leftover)
+
+
+def allocate_hours(weights, exam_days, daily_hours, slot_hours=0.5, max_subjects_per_day=3,
+                   review_intervals=(1, 3, 7), urgency_power=0.5):
+    """Vectorized allocation of study hours.
+
+    ``weights`` and ``exam_days`` have shape (..., S); ``daily_hours`` has shape
+    (..., D). Returns ``(hours, review)`` of shape (..., S, D), where ``review``
+    marks the spaced-repetition review sessions. The loop runs over days only;
+    students and subjects are handled as whole arrays.
+    """
+    weights = np.asarray(weights, dtype=float)
+    exam_days = np.asarray(exam_days, dtype=float)
+    daily_hours = np.asarray(daily_hours, dtype=float)
+    n_days = daily_hours.shape[-1]
+    batch = np.broadcast_shapes(weights.shape, exam_days.shape, daily_hours.shape[:-1] + (1,))
+
+    slots = np.floor(daily_hours / slot_hours + 1e-9)
+    allocation = np.zeros(batch + (n_days,))
+    review = np.zeros(batch + (n_days,), dtype=bool)
+    # Days since each subject was last studied; unseen subjects start "overdue"
+    gap = np.full(batch, float(max(review_intervals, default=7)))
+    # Days since the last full (non-review) session, which schedules the reviews
+    since_main = np.full(batch, np.inf)
+    intervals = np.asarray(review_intervals, dtype=float)
+
+    for d in range(n_days):
+        remaining = exam_days - d
+        urgency = np.where(remaining > 0, weights / np.power(np.maximum(remaining, 0) + 1, urgency_power), 0.0)
+        # Rotation: the longer a subject has waited, the more it is pulled forward
+        priority = urgency * (1 + gap)
+        focus = _top_k(priority, np.full(batch[:-1], max_subjects_per_day))
+
+        # Spaced repetition: a review falls due when the last session was exactly
+        # one of `review_intervals` days ago
+        due = np.isin(since_main + 1, intervals)
+        candidates = due & ~focus & (urgency > 0)
+        # Reviews take one slot each and may use all but one of the day's slots
+        review[..., d] = _top_k(np.where(candidates, urgency, 0.0), np.maximum(slots[..., d] - 1, 0))
+
+        main = _split(priority * focus, slots[..., d] - review[..., d].sum(axis=-1))
+        allocation[..., d] = main + review[..., d]
+        gap = np.where(allocation[..., d] > 0, 0.0, gap + 1)
+        since_main = np.where(main > 0, 0.0, since_main + 1)
+
+    return allocation * slot_hours, review
+
+
+class StudySchedule:
+    """A planned timetable for one student."""
+
+    def __init__(self, subjects, hours, review, start_date):
+        self.subjects = list(subjects)
+        self.hours = hours
+        self.review = review
+        self.start_date = start_date
+
+    def totals(self):
+        """Total planned hours per subject."""
+        return dict(zip(self.subjects, self.hours.sum(axis=1).tolist()))
+
+    def days(self):
+        """Yield ``(date, [(subject, hours, is_review), ...])`` for every day."""
+        for d in range(self.hours.shape[1]):
+            date = self.start_date + datetime.timedelta(days=d)
+            sessions = [
+                (self.subjects[s], float(self.hours[s, d]), bool(self.review[s, d]))
+                for s in np.flatnonzero(self.hours[:, d])
+            ]
+            yield date, sessions
+
+    def to_text(self):
+        lines = []
+        for d, (date, sessions) in enumerate(self.days(), start=1):
+            label = f"Day {d} ({WEEKDAY_NAMES[date.weekday()]} {date.isoformat()})"
+            if not sessions:
+                lines.append(f"{label}: rest day")
+                continue
+            parts = [f"{name} {hours:g}h" + (" (review)" if review else "") for name, hours, review in sessions]
+            lines.append(f"{label}: " + ", ".join(parts))
+        return "\n".join(lines)
+
+
+def _days_until(exam_dates, start_date):
+    return [
+        (date - start_date).days if isinstance(date, datetime.date) else int(date)
+        for date in exam_dates
+    ]
+
+
+def plan_study_schedule(subjects, exam_dates, daily_hours, weights=None, start_date=None, **options):
+    """Plan one student's timetable.
+
+    ``exam_dates`` holds a ``datetime.date`` or a number of days per subject.
+    ``daily_hours`` is a number (same every day), a 7-item weekly pattern
+    starting Monday, or one value per day. Extra ``options`` go to
+    ``allocate_hours``.
+    """
+    start_date = start_date or datetime.date.today()
+    exam_days = np.asarray(_days_until(exam_dates, start_date), dtype=float)
+    horizon = max(int(exam_days.max()), 1)
+    if np.isscalar(daily_hours):
+        availability = np.full(horizon, float(daily_hours))
+    elif len(daily_hours) == 7:
+        weekly = np.asarray(daily_hours, dtype=float)
+        availability = weekly[(start_date.weekday() + np.arange(horizon)) % 7]
+    else:
+        availability = np.asarray(daily_hours, dtype=float)[:horizon]
+    weights = np.ones(len(subjects)) if weights is None else np.asarray(weights, dtype=float)
+    hours, review = allocate_hours(weights, exam_days, availability, **options)
+    return StudySchedule(subjects, hours, review, start_date)
+
+
+def plan_cohort(weights, exam_days, daily_hours, **options):
+    """Batch version for many students at once.
+
+    ``weights`` and ``exam_days`` are (students, subjects) arrays and
+    ``daily_hours`` is (students, days); returns ``(hours, review)`` arrays of
+    shape (students, subjects, days).
+    """
+    return allocate_hours(weights, exam_days, daily_hours, **options)
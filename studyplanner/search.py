@@ -0,0 +1,148 @@
+"""Multi-query web search with bounded fan-out and a TTL result cache.
+
+``MultiQuerySearch`` rewrites a student's question into a few focused queries,
+runs them concurrently against a pluggable backend, merges the results
+(deduplicated by URL) and caches each query's results for ``ttl_seconds``.
+It exposes ``invoke``/``ainvoke`` like ``TavilySearchResults``, so the graph's
+``search_online`` node can use it as its search tool.
+
+A backend is any object with ``async search(query) -> list[dict]`` where each
+result has at least ``url`` and ``content``.
+"""
+
+import asyncio
+import re
+
+from .cache import TTLCache, normalize_prompt, normalize_words
+from .instrumentation import get_metrics
+
+# Phrases that trigger a search but carry no search intent themselves
+_FILLER = re.compile(
+    r"\b(please|can you|could you|search online( for)?|find on the internet|look up|for me|about)\b",
+    re.IGNORECASE,
+)
+# "and" only separates two questions when a new question starts after it, so
+# titles like "Romeo and Juliet" or "pride and prejudice" stay in one piece
+_QUESTION_START = r"(?:what|how|where|which|who|why|when|is|are|can|could|do|does|should|find|give|show|list|recommend)"
+_SPLIT = re.compile(rf"\s*(?:;|,|\band\b(?=\s+{_QUESTION_START}\b)|\balso\b|\?)\s*", re.IGNORECASE)
+
+
+def rewrite_queries(question, max_queries=3):
+    """Turn a question into up to ``max_queries`` focused search queries.
+
+    The cleaned full question always comes first; clauses separated by commas
+    or question marks, or questions joined by "and", become extra queries of
+    their own.
+    """
+    cleaned = re.sub(r"\s+", " ", _FILLER.sub(" ", question)).strip(" .?!")
+    queries = [cleaned or question.strip()]
+    for part in _SPLIT.split(cleaned):
+        # ", and ..." leaves the conjunction on the front of the clause
+        part = re.sub(r"^and\s+", "", part.strip(" .!"), flags=re.IGNORECASE)
+        if len(part.split()) >= 2 and part.lower() not in (q.lower() for q in queries):
+            queries.append(part)
+    return queries[:max_queries]
+
+
+def llm_query_rewriter(llm, max_queries=3):
+    """Async rewriter that asks ``llm`` for focused queries (one per line)."""
+    async def rewrite(question):
+        response = await llm.ainvoke(
+            f"Rewrite this student's request into at most {max_queries} short, focused web search "
+            f"queries, one per line, with no numbering:\n\n{question}"
+        )
+        queries = [line.strip(" -*\t") for line in response.content.splitlines() if line.strip()]
+        return queries[:max_queries] or rewrite_queries(question, max_queries)
+    return rewrite
+
+
+def _url_key(url):
+    return url.split("#", 1)[0].rstrip("/").lower()
+
+
+class SearchError(RuntimeError):
+    """A backend call failed (rather than finding nothing)."""
+
+
+class TavilyBackend:
+    """Search backend around ``TavilySearchResults``."""
+
+    def __init__(self, tool):
+        self.tool = tool
+
+    async def search(self, query):
+        results = await self.tool.ainvoke(query)
+        # Tavily returns an error string instead of a list when the call fails;
+        # raise so the failure isn't cached as "no results"
+        if not isinstance(results, list):
+            raise SearchError(f"Tavily search failed for {query!r}: {results}")
+        return results
+
+
+class LocalSearchBackend:
+    """Keyword search over an in-memory document list, for tests and benchmarks."""
+
+    def __init__(self, documents, max_results=3):
+        self.documents = list(documents)
+        self.max_results = max_results
+
+    async def search(self, query):
+        words = set(normalize_words(query).split())
+        scored = []
+        for doc in self.documents:
+            overlap = len(words & set(normalize_words(doc.get("content", "")).split()))
+            if overlap:
+                scored.append((overlap, doc))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [doc for _, doc in scored[:self.max_results]]
+
+
+class MultiQuerySearch:
+    """Concurrent multi-query search over a backend, with per-query caching."""
+
+    def __init__(self, backend, rewrite=rewrite_queries, max_concurrency=3, max_results=6,
+                 ttl_seconds=3600, cache_size=1024):
+        self.backend = backend
+        self.rewrite = rewrite
+        self.max_concurrency = max_concurrency
+        self.max_results = max_results
+        self.cache = TTLCache(ttl_seconds=ttl_seconds, max_entries=cache_size)
+
+    async def ainvoke(self, question):
+        queries = self.rewrite(question)
+        if asyncio.iscoroutine(queries):
+            queries = await queries
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        per_query = await asyncio.gather(
+            *(self._search_one(query, semaphore) for query in queries), return_exceptions=True
+        )
+        # Interleave so every query's best hit ranks ahead of any query's second hit;
+        # a query that failed simply contributes nothing
+        ranked = [results for results in per_query if isinstance(results, list)]
+        merged, seen = [], set()
+        for rank in range(max((len(results) for results in ranked), default=0)):
+            for results in ranked:
+                if rank < len(results):
+                    key = _url_key(results[rank].get("url") or "")
+                    # Results without a URL can't be told apart, so keep them all
+                    if not key or key not in seen:
+                        seen.add(key)
+                        merged.append(results[rank])
+        return merged[:self.max_results]
+
+    def invoke(self, question):
+        return asyncio.run(self.ainvoke(question))
+
+    async def _search_one(self, query, semaphore):
+        key = normalize_prompt(query)
+        with get_metrics().span("search.query", "search") as span:
+            results = self.cache.get(key)
+            if results is not None:
+                span.cache_hit = True
+                return results
+            async with semaphore:
+                results = await self.backend.search(query)
+        # An empty answer may be a transient hiccup; don't pin it for the whole TTL
+        if results:
+            self.cache.set(key, results)
+        return results
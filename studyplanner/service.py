@@ -0,0 +1,323 @@
+"""The study planner as an async HTTP/WebSocket service.
+
+Runs the chatbot-01 graph (``ai_agent``, ``search_online``, ``human_assist``
+and ``route_logic``), the ``generate_instructions`` prompt flow and the
+notebook tools behind one Starlette app, so the Streamlit apps and
+``NotebookStudyPlanner`` can be thin clients (see ``client.py``) and the
+planner scales by adding workers::
+
+    python -m studyplanner.service --port 8000 --workers 4
+
+Endpoints (streams are newline-delimited JSON events or plain text)::
+
+    POST /threads/{thread_id}/turns   {"message", "summary"?, "summary_upto"?} -> event stream
+    GET  /threads/{thread_id}/state                                          -> state values
+    POST /threads/{thread_id}/state   {"values": {...}}
+    GET  /threads/{thread_id}/escalation       -> {"escalation": open counselor request or null}
+    POST /threads/{thread_id}/human_response   {"response"}  (a counselor's reply)
+    WS   /threads/{thread_id}/ws      {"message"} frames in, events out
+    GET  /escalations                 -> queue counts
+    POST /escalations/claim           {"counselor"} -> {"escalation": {...} or null}
+    POST /escalations/{id}/answer     {"counselor", "response"} -> {"ok"}
+    POST /escalations/{id}/release    {"counselor"} -> {"ok"}
+    POST /ask                         {"message"} -> streamed text
+    POST /tools                       {"tool", "request"} -> {"response"}
+    GET  /health, GET /metrics
+
+Per-session state lives in the SQLite checkpointer (``STUDYPLANNER_CHECKPOINTS``),
+which every worker opens, so a session can land on any worker. Counselor
+requests go through the shared escalation queue (``escalation.py``); each
+worker runs a dispatcher that resumes paused threads as replies come in. The model is
+``STUDYPLANNER_MODEL`` (default: the fast/strong cascade); ``STUDYPLANNER_OFFLINE=1``
+serves from the fakes.
+"""
+
+import argparse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+from . import core
+from .cache import ResponseCache
+from .cascade import ModelCascade
+from .escalation import EscalationDispatcher
+from .instrumentation import get_metrics
+from .planner import ToolPlanner
+from .prompts import STUDY_ASSISTANT_INSTRUCTIONS, TOOLS, build_assistant_prompt
+from .streaming import chunk_text
+
+DEFAULT_MODEL = core.CASCADE
+
+
+def encode_message(message):
+    return message_to_dict(message)
+
+
+def decode_message(data):
+    return messages_from_dict([data])[0]
+
+
+def encode_values(values):
+    """State values as JSON, with messages in LangChain's dict form."""
+    encoded = dict(values)
+    if "messages" in encoded:
+        encoded["messages"] = [encode_message(m) for m in encoded["messages"]]
+    return encoded
+
+
+def decode_values(values):
+    decoded = dict(values)
+    if "messages" in decoded:
+        decoded["messages"] = [decode_message(m) for m in decoded["messages"]]
+    return decoded
+
+
+class PlannerService:
+    """The planner operations, independent of the HTTP/WebSocket transport."""
+
+    def __init__(self, runner, llm, model_name, cache=None, escalations=None, prefixes=None):
+        self.runner = runner
+        self.llm = llm
+        self.model_name = model_name
+        self.cache = cache
+        self.prefixes = prefixes
+        self.planner = ToolPlanner(llm, model_name, cache, prefixes)
+        self.escalations = escalations
+        self.dispatcher = EscalationDispatcher(escalations, runner.adeliver) if escalations is not None else None
+
+    @classmethod
+    async def create(cls, model_name=None, checkpoint_path=None, cache=True):
+        """Build the graph on the running loop, with the process-wide clients."""
+        from .graph import GraphRunner, StudyPlannerAgent, open_checkpointer
+
+        model_name = model_name or core.env("STUDYPLANNER_MODEL", DEFAULT_MODEL)
+        checkpointer = await open_checkpointer(
+            checkpoint_path or core.env("STUDYPLANNER_CHECKPOINTS", "checkpoints.sqlite3")
+        )
+        llm = core.get_llm(model_name)
+        escalations = core.get_escalations()
+        agent = StudyPlannerAgent(llm, core.get_search_tool(), packer=core.get_packer(model_name),
+                                  recall=core.get_conversation_index(),
+                                  condenser=core.get_condenser(model_name), escalations=escalations)
+        graph = agent.build(checkpointer=checkpointer)
+        return cls(GraphRunner(graph), llm, model_name, ResponseCache() if cache else None, escalations,
+                   core.get_prefix_cache())
+
+    async def turn(self, thread_id, message, summary=None, summary_upto=None):
+        """Events for one student turn: tokens, messages, then ``done``.
+
+        Without an explicit ``summary`` the thread's checkpointed one is reused.
+        """
+        if summary is None or summary_upto is None:
+            state = await self.runner.aget_state(thread_id)
+            summary = state.get("summary") or ""
+            summary_upto = state.get("summary_upto") or 0
+        async for kind, node, payload in self.runner.astream_turn(thread_id, message, summary, summary_upto):
+            if kind == "token":
+                yield {"type": "token", "node": node, "text": payload}
+            else:
+                yield {"type": "message", "node": node, "message": encode_message(payload)}
+        state = await self.runner.aget_state(thread_id)
+        yield {
+            "type": "done",
+            "intent": state.get("intent"),
+            "human_response_ready": bool(state.get("human_response_ready")),
+        }
+
+    async def state(self, thread_id):
+        return encode_values(await self.runner.aget_state(thread_id))
+
+    async def update_state(self, thread_id, values):
+        await self.runner.aupdate_state(thread_id, decode_values(values))
+
+    async def human_response(self, thread_id, text, counselor="counselor"):
+        """Answer the thread's open counselor request (the dispatcher delivers
+        it), or add the reply straight away if it has none."""
+        if self.escalations is not None and await asyncio.to_thread(
+            self.escalations.respond, thread_id, text, counselor
+        ):
+            return
+        await self.runner.adeliver(thread_id, text)
+
+    async def open_escalation(self, thread_id):
+        escalation = await asyncio.to_thread(self.escalations.open_for, thread_id)
+        return escalation._asdict() if escalation is not None else None
+
+    async def escalation_stats(self):
+        return await asyncio.to_thread(self.escalations.stats)
+
+    async def claim_escalation(self, counselor):
+        escalation = await asyncio.to_thread(self.escalations.claim, counselor)
+        return escalation._asdict() if escalation is not None else None
+
+    async def answer_escalation(self, escalation_id, counselor, response):
+        return await asyncio.to_thread(self.escalations.answer, escalation_id, counselor, response)
+
+    async def release_escalation(self, escalation_id, counselor):
+        return await asyncio.to_thread(self.escalations.release, escalation_id, counselor)
+
+    async def ask(self, message):
+        """The ``generate_instructions`` flow: yields the reply as text pieces."""
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, STUDY_ASSISTANT_INSTRUCTIONS, message)
+            if cached is not None:
+                yield cached
+                return
+        pieces = []
+        # A cascade should route on the question, not on the long instructions
+        kwargs = {"query": message} if isinstance(self.llm, ModelCascade) else {}
+        prefix = None
+        if self.prefixes is not None:
+            prefix = self.prefixes.register("assistant-instructions", self.model_name, STUDY_ASSISTANT_INSTRUCTIONS)
+            kwargs.update(prefix.kwargs())
+        async for chunk in self.llm.astream(build_assistant_prompt(message, prefix=prefix), **kwargs):
+            text = chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+        if self.cache is not None:
+            self.cache.set(self.model_name, STUDY_ASSISTANT_INSTRUCTIONS, message, "".join(pieces))
+
+    async def tool(self, tool, request):
+        if tool not in TOOLS:
+            raise ValueError(f"unknown tool {tool!r}; expected one of {TOOLS}")
+        return await self.planner.asubmit(tool, request)
+
+
+def _ndjson(events):
+    async def lines():
+        async for event in events:
+            yield json.dumps(event) + "\n"
+    return lines()
+
+
+def create_app(service=None):
+    """The Starlette app; builds a ``PlannerService`` at startup unless given one."""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+    from starlette.routing import Route, WebSocketRoute
+    from starlette.websockets import WebSocketDisconnect
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.service = service or await PlannerService.create()
+        dispatcher = app.state.service.dispatcher
+        task = asyncio.create_task(dispatcher.run()) if dispatcher is not None else None
+        yield
+        if task is not None:
+            task.cancel()
+
+    def planner(request):
+        return request.app.state.service
+
+    async def turns(request):
+        body = await request.json()
+        events = planner(request).turn(
+            request.path_params["thread_id"], body["message"], body.get("summary"), body.get("summary_upto")
+        )
+        return StreamingResponse(_ndjson(events), media_type="application/x-ndjson")
+
+    async def state(request):
+        thread_id = request.path_params["thread_id"]
+        if request.method == "POST":
+            body = await request.json()
+            await planner(request).update_state(thread_id, body["values"])
+        return JSONResponse(await planner(request).state(thread_id))
+
+    async def human_response(request):
+        body = await request.json()
+        await planner(request).human_response(request.path_params["thread_id"], body["response"],
+                                               body.get("counselor", "counselor"))
+        return JSONResponse({"ok": True})
+
+    async def escalation(request):
+        return JSONResponse({"escalation": await planner(request).open_escalation(request.path_params["thread_id"])})
+
+    async def escalations(request):
+        return JSONResponse(await planner(request).escalation_stats())
+
+    async def claim(request):
+        body = await request.json()
+        return JSONResponse({"escalation": await planner(request).claim_escalation(body["counselor"])})
+
+    async def answer(request):
+        body = await request.json()
+        ok = await planner(request).answer_escalation(request.path_params["escalation_id"], body["counselor"],
+                                                      body["response"])
+        return JSONResponse({"ok": ok})
+
+    async def release(request):
+        body = await request.json()
+        ok = await planner(request).release_escalation(request.path_params["escalation_id"], body["counselor"])
+        return JSONResponse({"ok": ok})
+
+    async def ask(request):
+        body = await request.json()
+        return StreamingResponse(planner(request).ask(body["message"]), media_type="text/plain; charset=utf-8")
+
+    async def tools(request):
+        body = await request.json()
+        try:
+            response = await planner(request).tool(body.get("tool", TOOLS[0]), body["request"])
+        except ValueError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=400)
+        return JSONResponse({"response": response})
+
+    async def websocket(socket):
+        await socket.accept()
+        thread_id = socket.path_params["thread_id"]
+        service = socket.app.state.service
+        try:
+            while True:
+                body = await socket.receive_json()
+                if "human_response" in body:
+                    await service.human_response(thread_id, body["human_response"])
+                    await socket.send_json({"type": "done"})
+                    continue
+                async for event in service.turn(thread_id, body["message"], body.get("summary"),
+                                                body.get("summary_upto")):
+                    await socket.send_json(event)
+        except WebSocketDisconnect:
+            pass
+
+    async def health(request):
+        return JSONResponse({"status": "ok"})
+
+    async def metrics(request):
+        return PlainTextResponse(get_metrics().prometheus_text())
+
+    routes = [
+        Route("/threads/{thread_id}/turns", turns, methods=["POST"]),
+        Route("/threads/{thread_id}/state", state, methods=["GET", "POST"]),
+        Route("/threads/{thread_id}/escalation", escalation),
+        Route("/threads/{thread_id}/human_response", human_response, methods=["POST"]),
+        WebSocketRoute("/threads/{thread_id}/ws", websocket),
+        Route("/escalations", escalations),
+        Route("/escalations/claim", claim, methods=["POST"]),
+        Route("/escalations/{escalation_id:int}/answer", answer, methods=["POST"]),
+        Route("/escalations/{escalation_id:int}/release", release, methods=["POST"]),
+        Route("/ask", ask, methods=["POST"]),
+        Route("/tools", tools, methods=["POST"]),
+        Route("/health", health),
+        Route("/metrics", metrics),
+    ]
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    uvicorn.run("studyplanner.service:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
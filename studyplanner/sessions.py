@@ -0,0 +1,162 @@
+"""Long-lived Gemini chat sessions keyed by Streamlit session.
+
+Streamlit re-executes a script on every interaction, so building a
+``genai.GenerativeModel`` and calling ``start_chat`` inside the handler means a
+new client and a replayed transcript on every turn. ``ChatSessionManager``
+keeps one model client per process and one ``ChatSession`` per browser session,
+and evicts sessions that have been idle too long or that fall off the LRU end.
+With a ``packer`` (``tokens.ContextPacker``) a long session's history is
+trimmed to the model's window before each turn, keeping the seed turns. With
+a ``store`` (``store.ConversationStore``) turns are recorded durably and a
+session started in another process (or after a restart) resumes from the
+stored tail of its conversation. With a ``prefix_cache``
+(``prefix_cache.PrefixCache``) the seed turns are registered as a cached
+prefix, so when the provider holds them they are not re-sent with every turn.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .memory import message_role, message_text
+
+
+def get_session_id(default="local"):
+    """Return the id of the current Streamlit browser session."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return default
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else default
+
+
+def get_conversation_id(key="conversation"):
+    """Durable id of this browser's conversation.
+
+    Unlike the session id it is kept in the page URL (``?conversation=...``),
+    so a reload, a restarted server or another worker process finds the same
+    stored history.
+    """
+    import streamlit as st
+
+    if key not in st.session_state:
+        conversation_id = st.query_params.get(key)
+        if not conversation_id:
+            conversation_id = uuid.uuid4().hex
+            st.query_params[key] = conversation_id
+        st.session_state[key] = conversation_id
+    return st.session_state[key]
+
+
+def submitted_text(label, key="question"):
+    """The text the student just submitted, or "" on any other rerun.
+
+    A plain ``text_input`` keeps its value, so every rerun (a sidebar toggle,
+    a button elsewhere) would send the same question to the model again and
+    record it twice. A form with ``clear_on_submit`` reports it once, on the
+    run where it was sent.
+    """
+    import streamlit as st
+
+    with st.form(key, clear_on_submit=True):
+        text = st.text_input(label)
+        submitted = st.form_submit_button("Send")
+    return text.strip() if submitted else ""
+
+
+class ChatSessionManager:
+    """Cache of ``ChatSession`` objects with TTL and LRU eviction."""
+
+    def __init__(self, model_name="gemini-1.5-flash", history=None, ttl_seconds=1800,
+                 max_sessions=256, model_factory=None, packer=None, store=None, restore_turns=40,
+                 prefix_cache=None):
+        if model_factory is None:
+            import google.generativeai as genai
+            model_factory = genai.GenerativeModel
+        self.model_name = model_name
+        self.history = list(history or [])
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.packer = packer
+        self.store = store
+        self.restore_turns = restore_turns
+        self.model_factory = model_factory
+        self.prefix_cache = prefix_cache
+        # One client per process; every session's ChatSession shares it
+        self.model = model_factory(model_name)
+        self._sessions = OrderedDict()  # session_id -> (chat, last_used)
+        self._lock = threading.Lock()
+
+    def get_chat(self, session_id):
+        """Return the chat for ``session_id``, starting one if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                model, seed = self.seed()
+                chat = model.start_chat(history=seed + self._restore(session_id))
+            else:
+                chat = entry[0]
+                if self.packer is not None:
+                    self._fit(chat)
+            self._sessions[session_id] = (chat, now)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return chat
+
+    def seed(self):
+        """``(model, seed turns)`` to start a chat from; with a prefix cache the
+        model may carry the seed itself and the turns are then empty."""
+        if self.prefix_cache is None or not self.history:
+            return self.model, list(self.history)
+        handle = self.prefix_cache.register("chat-seed", self.model_name, self.history)
+        return self.prefix_cache.generative_model(handle, self.model_factory), handle.history()
+
+    def record(self, session_id, user_input, reply):
+        """Store one exchange (the chat session itself already holds it)."""
+        if self.store is not None:
+            self.store.extend(session_id, [("user", user_input), ("model", reply)])
+
+    def _restore(self, session_id):
+        if self.store is None:
+            return []
+        turns = self.store.tail(session_id, self.restore_turns)
+        # The tail may start mid-exchange; resume on a student turn
+        while turns and turns[0].role != "user":
+            turns = turns[1:]
+        return [{"role": turn.role, "parts": turn.content} for turn in turns]
+
+    def _fit(self, chat):
+        history = list(chat.history)
+        seed = len(self.history)
+        # Seed turns held by a cached prefix are not in the chat's history
+        if [message_text(m) for m in history[:seed]] != [message_text(m) for m in self.history]:
+            seed = 0
+        packing = self.packer.pack(history[seed:], pinned=history[:seed])
+        if not packing.dropped:
+            return
+        kept = packing.messages[seed:]
+        # Gemini expects user/model turns to alternate, so never open on a reply
+        while kept and message_role(kept[0]) == "model":
+            kept = kept[1:]
+        chat.history = history[:seed] + kept
+
+    def reset(self, session_id):
+        """Forget the chat for ``session_id`` so the next turn starts fresh."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_expired(self, now):
+        # Entries are kept in last-used order, so expired ones sit at the front
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.ttl_seconds:
+                break
+            del self._sessions[session_id]
@@ -0,0 +1,137 @@
+"""Durable conversation store shared by every app process.
+
+Chat history used to live in ``st.session_state`` or in a module-level list,
+so it was lost on restart, was invisible to other Streamlit workers, and grew
+without bound in each process. ``ConversationStore`` keeps every conversation
+in one SQLite database in WAL mode, keyed by conversation id, so any number of
+worker processes can read and append to it concurrently. Appends are buffered
+and written in one transaction per batch (at the latest before the next read,
+or after ``flush_seconds``). Readers load only the tail of a conversation and
+fetch older pages on demand.
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+from .cache import DEFAULT_CACHE_DIR
+
+
+class Turn(NamedTuple):
+    seq: int
+    role: str
+    content: str
+    created: float
+
+
+class ConversationStore:
+    """SQLite (WAL) message log with per-conversation keys and batched writes."""
+
+    def __init__(self, path=None, batch_size=32, flush_seconds=1.0):
+        if path is None:
+            cache_dir = os.getenv("STUDYPLANNER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "conversations.sqlite3")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending = []  # (conversation_id, role, content, created)
+        self._timer = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Other workers may hold the write lock briefly; wait rather than fail
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID"
+        )
+        atexit.register(self.flush)
+
+    def append(self, conversation_id, role, content):
+        """Queue one message; it is written with the next batch."""
+        self.extend(conversation_id, [(role, content)])
+
+    def extend(self, conversation_id, messages):
+        """Queue ``(role, content)`` pairs, e.g. a user turn and its reply; they
+        land in the same batch, so other writers can't interleave with them."""
+        now = time.time()
+        with self._lock:
+            self._pending.extend((conversation_id, role, content, now) for role, content in messages)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        # IMMEDIATE takes the write lock up front, so two workers appending to
+        # the same conversation can't hand out the same sequence numbers
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            next_seq = {}
+            rows = []
+            for conversation_id, role, content, created in pending:
+                if conversation_id not in next_seq:
+                    next_seq[conversation_id] = self._conn.execute(
+                        "SELECT COALESCE(MAX(seq), -1) + 1 FROM turns WHERE conversation_id = ?", (conversation_id,)
+                    ).fetchone()[0]
+                rows.append((conversation_id, next_seq[conversation_id], role, content, created))
+                next_seq[conversation_id] += 1
+            self._conn.executemany("INSERT INTO turns VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            self._pending[:0] = pending
+            raise
+
+    def _query(self, sql, args):
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(sql, args).fetchall()
+
+    def tail(self, conversation_id, limit=20):
+        """The newest ``limit`` messages, oldest first."""
+        rows = self._query(
+            "SELECT seq, role, content, created FROM turns WHERE conversation_id = ? ORDER BY seq DESC LIMIT ?",
+            (conversation_id, limit),
+        )
+        return [Turn(*row) for row in reversed(rows)]
+
+    def before(self, conversation_id, seq, limit=20):
+        """The ``limit`` messages just before ``seq``, oldest first (the next older page)."""
+        rows = self._query(
+            "SELECT seq, role, content, created FROM turns WHERE conversation_id = ? AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (conversation_id, seq, limit),
+        )
+        return [Turn(*row) for row in reversed(rows)]
+
+    def count(self, conversation_id):
+        return self._query("SELECT COUNT(*) FROM turns WHERE conversation_id = ?", (conversation_id,))[0][0]
+
+    def delete(self, conversation_id):
+        with self._lock:
+            self._pending = [item for item in self._pending if item[0] != conversation_id]
+            self._conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        self._conn.close()
@@ -0,0 +1,40 @@
+"""Helpers for streaming model output into the UIs.
+
+Both ``ChatGoogleGenerativeAI.stream`` (``AIMessageChunk`` objects with
+``.content``) and ``ChatSession.send_message(..., stream=True)`` (response
+chunks with ``.text``) are reduced to plain text pieces, which
+``st.write_stream`` or a placeholder can render as they arrive.
+"""
+
+
+def chunk_text(chunk):
+    """Text carried by one streamed chunk (LangChain or google-generativeai)."""
+    text = getattr(chunk, "content", None)
+    if text is None:
+        try:
+            text = chunk.text
+        except (AttributeError, ValueError):
+            # genai raises ValueError for chunks without text parts (e.g. safety stops)
+            return ""
+    return text if isinstance(text, str) else ""
+
+
+def iter_text(chunks):
+    """Yield the non-empty text pieces of a chunk stream."""
+    for chunk in chunks:
+        text = chunk_text(chunk)
+        if text:
+            yield text
+
+
+def stream_text(chunks, write=None):
+    """Consume a chunk stream, calling ``write(text_so_far)`` on every piece.
+
+    Returns the full reply so callers can record it in their history.
+    """
+    reply = ""
+    for text in iter_text(chunks):
+        reply += text
+        if write is not None:
+            write(reply)
+    return reply
@@ -0,0 +1,147 @@
+"""Cached token counts and context-window packing for outgoing prompts.
+
+``TokenCounter`` counts a message's tokens the first time it sees its text and
+remembers the result, so a long conversation is not re-tokenized on every
+turn. It uses Gemini's local tokenizer when ``vertexai`` is installed and the
+four-characters-per-token estimate from ``memory.py`` otherwise.
+
+``ContextPacker`` fits a prompt into a model's window minus a reserved output
+budget. The system prompt and pinned turns always go in; the latest message,
+tool results and then the other turns (newest first) fill what is left. The
+kept messages are returned in their original order.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .memory import estimate_tokens, message_role, message_text
+
+# Input windows in tokens; unknown models fall back to the smallest one
+MODEL_WINDOWS = {
+    "gemini-pro": 30720,
+    "gemini-1.0-pro": 30720,
+    "gemini-1.5-flash": 1048576,
+    "gemini-1.5-pro": 2097152,
+}
+DEFAULT_WINDOW = 30720
+DEFAULT_RESERVE_OUTPUT = 2048
+
+# Role and turn markers the API adds around every message
+MESSAGE_OVERHEAD = 4
+
+
+def model_window(model_name):
+    return MODEL_WINDOWS.get(model_name, DEFAULT_WINDOW)
+
+
+def local_tokenizer(model_name):
+    """Return ``count(text) -> int`` for Gemini's local tokenizer, or None."""
+    try:
+        from vertexai.preview import tokenization
+    except ImportError:
+        return None
+    try:
+        tokenizer = tokenization.get_tokenizer_for_model(model_name)
+    except ValueError:
+        # Model not known to the tokenizer package
+        return None
+    return lambda text: tokenizer.count_tokens(text).total_tokens
+
+
+def is_tool_result(message):
+    if isinstance(message, dict):
+        return message.get("role") in ("tool", "function")
+    return message_role(message) == "tool"
+
+
+class TokenCounter:
+    """Per-text token counts, computed once and kept in a bounded LRU."""
+
+    def __init__(self, count_tokens=None, model_name=None, max_entries=20000):
+        if count_tokens is None and model_name is not None:
+            count_tokens = local_tokenizer(model_name)
+        self.count_tokens = count_tokens or estimate_tokens
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count_text(self, text):
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+                return count
+        count = self.count_tokens(text) if text else 0
+        with self._lock:
+            self.misses += 1
+            self._counts[text] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def count(self, message):
+        """Tokens a message takes in the prompt, including the per-turn overhead."""
+        return self.count_text(message_text(message)) + MESSAGE_OVERHEAD
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class Packing(NamedTuple):
+    messages: list
+    tokens: int
+    # Number of history messages left out to fit the window
+    dropped: int
+
+
+class ContextPacker:
+    """Fits system prompt, pinned turns, tool results and recent turns into a window."""
+
+    def __init__(self, window=DEFAULT_WINDOW, reserve_output=DEFAULT_RESERVE_OUTPUT, counter=None):
+        self.window = window
+        self.reserve_output = reserve_output
+        self.counter = counter or TokenCounter()
+
+    @classmethod
+    def for_model(cls, model_name, reserve_output=DEFAULT_RESERVE_OUTPUT, counter=None):
+        return cls(model_window(model_name), reserve_output, counter or TokenCounter(model_name=model_name))
+
+    @property
+    def budget(self):
+        return self.window - self.reserve_output
+
+    def pack(self, history, pinned=(), system=()):
+        """Return ``system + pinned`` and as much of ``history`` as fits.
+
+        The newest history message (the question being answered) is always
+        kept; then tool results, then the remaining turns from newest to oldest.
+        """
+        fixed = list(system) + list(pinned)
+        tokens = sum(self.counter.count(m) for m in fixed)
+        history = list(history)
+        if not history:
+            return Packing(fixed, tokens, 0)
+
+        costs = [self.counter.count(m) for m in history]
+        last = len(history) - 1
+        keep = {last}
+        tokens += costs[last]
+        older = range(last - 1, -1, -1)
+        for i in older:
+            if is_tool_result(history[i]) and tokens + costs[i] <= self.budget:
+                keep.add(i)
+                tokens += costs[i]
+        # Conversation turns are kept as an unbroken run back from the newest
+        for i in older:
+            if i in keep:
+                continue
+            if tokens + costs[i] > self.budget:
+                break
+            keep.add(i)
+            tokens += costs[i]
+        kept = [m for i, m in enumerate(history) if i in keep]
+        return Packing(fixed + kept, tokens, len(history) - len(kept))
@@ -0,0 +1,271 @@
+"""Local vector index of a conversation, for recalling relevant old turns.
+
+A student who keeps one session for a whole term builds up far more history
+than fits in a prompt. ``VectorMemory`` embeds every turn and search result
+with a local hashing embedding (no API call) and keeps the vectors in an
+append-only float32 file that is memory-mapped at load, next to a JSON-lines
+file with the turns themselves. ``search`` returns the top-k past turns most
+similar to the current question, so the prompt carries the recent turns plus
+a few recalled ones and stays roughly the same size however long the session.
+
+``ConversationIndex`` hands out one ``VectorMemory`` per thread under
+``STUDYPLANNER_CACHE_DIR/memory``. Several processes may open the same
+thread's index: appends hold an exclusive lock on the directory's ``lock``
+file, so a vector and its turn are always written together, and every
+``add`` and ``search`` first reads what other processes appended.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from .cache import DEFAULT_CACHE_DIR
+from .intent import features
+from .memory import message_role, message_text
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_DIM = 512
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def hash_embedding(text, dim=DEFAULT_DIM):
+    """Signed feature-hashing embedding of unigrams and bigrams, L2-normalized."""
+    vector = np.zeros(dim, dtype=np.float32)
+    counts = {}
+    for feature in features(text):
+        counts[feature] = counts.get(feature, 0) + 1
+    for feature, count in counts.items():
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        sign = 1.0 if digest & 1 else -1.0
+        vector[(digest >> 1) % dim] += sign * (1.0 + math.log(count))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def message_key(message):
+    """Stable id for a turn: the LangChain message id, else a hash of role and text."""
+    key = getattr(message, "id", None)
+    if key:
+        return key
+    return hashlib.sha256(f"{message_role(message)}\n{message_text(message)}".encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _file_lock(path, shared=False):
+    """Hold a lock on ``path`` across processes (shared for readers)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+            return
+        # msvcrt has no shared locks; readers take the exclusive one too
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class VectorMemory:
+    """Append-only, memory-mapped vector index of one conversation."""
+
+    def __init__(self, directory, dim=DEFAULT_DIM, embed=hash_embedding):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.embed = embed
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.turns_path = os.path.join(directory, "turns.jsonl")
+        self.lock_path = os.path.join(directory, "lock")
+        self.records = []
+        self.keys = set()
+        self._lock = threading.Lock()
+        with _file_lock(self.lock_path):
+            self._load()
+
+    def _load(self):
+        # Called with the file lock held, so no other process is mid-append
+        good = 0
+        if os.path.exists(self.turns_path):
+            with open(self.turns_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    good += len(line)
+                    self.records.append(record)
+                    self.keys.add(record["key"])
+            # Drop a torn last line left by a crash so later appends stay readable
+            if good < os.path.getsize(self.turns_path):
+                os.truncate(self.turns_path, good)
+        # Vectors are written before their record, so a crash can leave extra
+        # rows (never missing ones); trust the records and cut the rest off
+        size = 4 * self.dim * len(self.records)
+        actual = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if actual < size:
+            raise ValueError(f"{self.vectors_path} has fewer vectors than {self.turns_path} has turns")
+        if actual > size:
+            os.truncate(self.vectors_path, size)
+        self._mapped = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.records), self.dim))
+            if self.records else np.zeros((0, self.dim), dtype=np.float32)
+        )
+        # Rows added since load, in a buffer that grows by doubling; the
+        # memmap itself is never copied into memory
+        self._extra = np.zeros((0, self.dim), dtype=np.float32)
+        self._extra_rows = 0
+        # Bytes of turns.jsonl read so far; anything past it was appended since
+        self._offset = good
+
+    @staticmethod
+    def _truncate(path, size):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def _changed(self):
+        size = os.path.getsize(self.turns_path) if os.path.exists(self.turns_path) else 0
+        return size != self._offset
+
+    def _sync(self):
+        """Read the turns (and their vectors) other processes appended since
+        the last look. Called with both locks held."""
+        if not self._changed():
+            return
+        with open(self.turns_path, "rb") as f:
+            f.seek(self._offset)
+            lines = f.read().splitlines(keepends=True)
+        start = len(self.records)
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn by a writer that crashed; add cuts it off
+                break
+            self._offset += len(line)
+            self.records.append(record)
+            self.keys.add(record["key"])
+        count = len(self.records) - start
+        if count:
+            with open(self.vectors_path, "rb") as f:
+                f.seek(4 * self.dim * start)
+                rows = np.frombuffer(f.read(4 * self.dim * count), dtype=np.float32)
+            self._append_rows(rows.reshape(count, self.dim))
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, text, role, key=None, position=None):
+        """Embed and store one turn; returns False if ``key`` is already indexed."""
+        key = key or hashlib.sha256(f"{role}\n{text}".encode("utf-8")).hexdigest()
+        vector = self.embed(text, self.dim).astype(np.float32)
+        with self._lock, _file_lock(self.lock_path):
+            # Another process may have indexed this turn, and our row number
+            # must come after theirs
+            self._sync()
+            if key in self.keys:
+                return False
+            record = {"key": key, "role": role, "text": text, "position": position}
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            # Cut off anything a crashed writer left half done, as _load does
+            self._truncate(self.turns_path, self._offset)
+            self._truncate(self.vectors_path, 4 * self.dim * len(self.records))
+            with open(self.vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self.turns_path, "ab") as f:
+                f.write(line)
+            self._offset += len(line)
+            self.records.append(record)
+            self.keys.add(key)
+            self._append_rows(vector[np.newaxis])
+        return True
+
+    def add_messages(self, messages):
+        """Index the messages not seen before; positions are list indices."""
+        added = 0
+        for position, message in enumerate(messages):
+            key = message_key(message)
+            if key in self.keys:
+                continue
+            added += self.add(message_text(message), message_role(message), key, position)
+        return added
+
+    def _append_rows(self, rows):
+        needed = self._extra_rows + len(rows)
+        if needed > len(self._extra):
+            grown = np.zeros((max(needed, 2 * len(self._extra), 64), self.dim), dtype=np.float32)
+            grown[:self._extra_rows] = self._extra[:self._extra_rows]
+            # Searches still holding the old buffer keep a consistent view of it
+            self._extra = grown
+        self._extra[self._extra_rows:needed] = rows
+        self._extra_rows = needed
+
+    def search(self, query, k=4, before=None, min_score=0.1):
+        """Top-``k`` ``(score, record)`` pairs most similar to ``query``.
+
+        ``before`` restricts the search to turns at earlier positions (e.g.
+        those no longer in the prompt window).
+        """
+        with self._lock:
+            if self._changed():
+                with _file_lock(self.lock_path, shared=True):
+                    self._sync()
+            mapped, extra = self._mapped, self._extra[:self._extra_rows]
+            records = list(self.records)
+        if not len(records) or k <= 0:
+            return []
+        # Score the memory-mapped rows and the ones added since load separately
+        vector = self.embed(query, self.dim)
+        scores = np.concatenate([mapped @ vector, extra @ vector])
+        if before is not None:
+            positions = np.array([-1 if r["position"] is None else r["position"] for r in records])
+            scores = np.where(positions < before, scores, -np.inf)
+        k = min(k, len(records))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), records[i]) for i in top if scores[i] >= min_score]
+
+
+def format_recall(hits):
+    """One prompt message's worth of recalled turns, oldest first."""
+    records = sorted((record for _, record in hits), key=lambda r: r["position"] or 0)
+    lines = [f"{record['role']}: {record['text']}" for record in records]
+    return "Relevant parts of our earlier conversation:\n" + "\n".join(lines)
+
+
+class ConversationIndex:
+    """One ``VectorMemory`` per thread, opened on first use and kept in an LRU."""
+
+    def __init__(self, root=None, dim=DEFAULT_DIM, max_open=256):
+        if root is None:
+            root = os.path.join(os.getenv("STUDYPLANNER_CACHE_DIR", DEFAULT_CACHE_DIR), "memory")
+        self.root = root
+        self.dim = dim
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def for_thread(self, thread_id):
+        with self._lock:
+            memory = self._open.get(thread_id)
+            if memory is None:
+                memory = VectorMemory(os.path.join(self.root, _UNSAFE.sub("_", thread_id)), self.dim)
+                self._open[thread_id] = memory
+            self._open.move_to_end(thread_id)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+            return memory